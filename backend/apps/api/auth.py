@@ -21,13 +21,28 @@ class AuthBearer(HttpBearer):
         token: str,
     ) -> type[User | AnonymousUser]:
         try:
-            token_data = Token.objects.get(token=token)
+            token_data = Token.objects.select_related("user").get(token=token)
             return token_data.user
 
         except Token.DoesNotExist:
             return AnonymousUser
 
 
+class AsyncAuthBearer(HttpBearer):
+    """
+    AuthBearer for async views: the token lookup never blocks the event loop.
+    Unknown tokens are rejected with 401.
+    """
+
+    async def authenticate(self, request: HttpRequest, token: str) -> User | None:
+        try:
+            token_data = await Token.objects.select_related("user").aget(token=token)
+            return token_data.user
+
+        except Token.DoesNotExist:
+            return None
+
+
 class OptionalAuthBearer(AuthBearer):
     def __call__(self, request: HttpRequest) -> Any | None:
         auth_value = request.headers.get(self.header)
@@ -1,3 +1,4 @@
+import inspect
 from functools import wraps
 
 from django.contrib.auth.models import AnonymousUser
@@ -6,54 +7,67 @@ from ninja.errors import HttpError
 from .http import HttpRequest
 
 
-def admin_required(view_func):
-    """
-    Decorator to restrict a Ninja view to admin or superuser only.
+def _guard(view_func, check):
+    """Wrap a sync or async view so `check(request)` runs before it."""
+    if inspect.iscoroutinefunction(view_func):
 
-    Assumes:
-      - The request is authenticated (e.g., via AuthBearer)
-      - request.auth is a Django User instance
-    """
+        @wraps(view_func)
+        async def async_wrapper(request: HttpRequest, *args, **kwargs):
+            check(request)
+            return await view_func(request, *args, **kwargs)
+
+        return async_wrapper
 
     @wraps(view_func)
     def wrapper(request: HttpRequest, *args, **kwargs):
-        if not hasattr(request, "auth"):
-            raise ValueError(
-                "Decorator object has no 'auth' attribute. Ensure authentication is set up correctly."
-            )
+        check(request)
+        return view_func(request, *args, **kwargs)
 
-        user = request.auth
+    return wrapper
 
-        if not hasattr(user, "is_staff") or isinstance(user, AnonymousUser):
-            raise HttpError(401, "Authentication required.")
 
-        if not (user.is_staff or user.is_superuser):
-            raise HttpError(403, "Admin access required.")
+def _check_admin(request: HttpRequest):
+    if not hasattr(request, "auth"):
+        raise ValueError(
+            "Decorator object has no 'auth' attribute. Ensure authentication is set up correctly."
+        )
 
-        return view_func(request, *args, **kwargs)
+    user = request.auth
 
-    return wrapper
+    if not hasattr(user, "is_staff") or isinstance(user, AnonymousUser):
+        raise HttpError(401, "Authentication required.")
 
+    if not (user.is_staff or user.is_superuser):
+        raise HttpError(403, "Admin access required.")
 
-def login_required(view_func):
+
+def _check_login(request: HttpRequest):
+    user = request.auth
+
+    if not hasattr(user, "is_authenticated") or isinstance(user, AnonymousUser):
+        raise HttpError(401, "Authentication required.")
+
+    if not user.is_authenticated:
+        raise HttpError(401, "Authentication required.")
+
+
+def admin_required(view_func):
     """
-    Decorator to restrict a Ninja view to authenticated users only.
+    Decorator to restrict a Ninja view (sync or async) to admin or superuser only.
 
     Assumes:
       - The request is authenticated (e.g., via AuthBearer)
       - request.auth is a Django User instance
     """
+    return _guard(view_func, _check_admin)
 
-    @wraps(view_func)
-    def wrapper(request: HttpRequest, *args, **kwargs):
-        user = request.auth
-
-        if not hasattr(user, "is_authenticated") or isinstance(user, AnonymousUser):
-            raise HttpError(401, "Authentication required.")
 
-        if not user.is_authenticated:
-            raise HttpError(401, "Authentication required.")
-
-        return view_func(request, *args, **kwargs)
+def login_required(view_func):
+    """
+    Decorator to restrict a Ninja view (sync or async) to authenticated users only.
 
-    return wrapper
+    Assumes:
+      - The request is authenticated (e.g., via AuthBearer)
+      - request.auth is a Django User instance
+    """
+    return _guard(view_func, _check_login)
@@ -0,0 +1,11 @@
+from ninja import Schema
+
+
+class CacheStatsResponse(Schema):
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    evictions: int
+    memory_entries: int
+    memory_bytes: int
+    disk_bytes: int
@@ -0,0 +1,11 @@
+from ninja import Schema
+
+
+class ConverterStatsResponse(Schema):
+    conversions: int
+    failures: int
+    timeouts: int
+    cancellations: int
+    kills: int
+    rejections: int
+    worker_starts: int
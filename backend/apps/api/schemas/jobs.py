@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import Any, Literal, Optional
+from uuid import UUID
+
+from ninja import Schema
+
+
+class JobResponse(Schema):
+    id: UUID
+    kind: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    result: Optional[Any] = None
+    result_url: Optional[str] = None
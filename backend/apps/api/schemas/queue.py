@@ -11,11 +11,14 @@ class QueueFileUpload(Schema):
 class QueueFileResponse(Schema):
     id: int
     file: str
+    filename: str
     processed: bool
     created_at: str
     user: str
     user_id: int
     page_count: Optional[int]
+    original_size: Optional[int]
+    stored_size: Optional[int]
     print_mode: Literal["single-sided", "double-sided"]
 
 
@@ -30,6 +33,16 @@ class QueueUploadResponse(Schema):
     total_charged_bdt: str
 
 
+class QueueFileError(Schema):
+    file: str
+    error: str
+
+
+class QueueUploadErrorResponse(Schema):
+    detail: str
+    errors: list[QueueFileError]
+
+
 class ProcessStatusResponse(Schema):
     id: int
     processed: bool
@@ -0,0 +1,8 @@
+from typing import Optional
+
+from ninja import Schema
+
+
+class AnyColorResponse(Schema):
+    any_color: bool
+    first_color_page: Optional[int] = None
@@ -1,2 +1,827 @@
+import json
+import os
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import fitz
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+
+from .models import Token
+from .utils.cache import AnalysisCache, get_analysis_cache
+from .utils.convert import convert_any_to_pdf
+from .utils.docx import (
+    _kill_group,
+    _limited,
+    _reset_cpu_limit,
+    _rlimits,
+    converter_stats,
+)
+from .utils.executor import (
+    _reset_cpu_executor,
+    _reset_executor,
+    get_cpu_executor,
+    get_executor,
+)
+from .utils.mapped import map_file
+from .utils.pdf import classify_pages, count_pdf_pages, first_color_page
+from .utils.xref import XrefError, fast_page_count
+
+_PAGE = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>"
+
+
+def make_pdf(page_count: int) -> bytes:
+    """Text, color text, blank and drawing pages, as PyMuPDF writes them."""
+    doc = fitz.open()
+    try:
+        for i in range(page_count):
+            page = doc.new_page()
+            if i % 4 == 0:
+                page.insert_text((72, 72), "Grayscale paragraph")
+            elif i % 4 == 1:
+                page.insert_text((72, 72), "Colored heading", color=(0.8, 0.1, 0.1))
+            elif i % 4 == 2:
+                page.draw_rect(fitz.Rect(72, 72, 400, 400), fill=(0, 1, 0))
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def labelled_pdf(*labels: str) -> bytes:
+    """One page per label, showing it; see `page_labels`."""
+    doc = fitz.open()
+    try:
+        for label in labels:
+            doc.new_page().insert_text((72, 72), label)
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def page_labels(data: bytes) -> list[str]:
+    doc = fitz.open("pdf", data)
+    try:
+        return [page.get_text().strip() for page in doc]
+    finally:
+        doc.close()
+
+
+def _text_pdf(page_count: int, color: tuple) -> bytes:
+    """`page_count` pages of text, all drawn in `color`."""
+    doc = fitz.open()
+    try:
+        for _ in range(page_count):
+            doc.new_page().insert_text((72, 72), "Paragraph", color=color)
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def _resave(data: bytes, **options) -> bytes:
+    doc = fitz.open("pdf", data)
+    try:
+        return doc.tobytes(**options)
+    finally:
+        doc.close()
+
+
+def _incremental(data: bytes) -> bytes:
+    """Append two pages as an incremental update (adds a /Prev section)."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "document.pdf"
+        path.write_bytes(data)
+        doc = fitz.open(path)
+        try:
+            doc.new_page()
+            doc.new_page()
+            doc.saveIncr()
+        finally:
+            doc.close()
+        return path.read_bytes()
+
+
+def _pypdf(data: bytes, encrypt: bool = False) -> bytes:
+    writer = PdfWriter(clone_from=BytesIO(data))
+    if encrypt:
+        writer.encrypt("", algorithm="RC4-128")
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _pypdf_count(data: bytes) -> int:
+    reader = PdfReader(BytesIO(data))
+    if reader.is_encrypted:
+        reader.decrypt("")
+    return len(reader.pages)
+
+
+def _objects(count: bytes = b"2") -> list[bytes]:
+    """A catalog and a page tree of two pages stating `count` pages."""
+    pages = b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count " + count + b" >>"
+    return [b"<< /Type /Catalog /Pages 2 0 R >>", pages, _PAGE, _PAGE]
+
+
+def _body(objects: list[bytes]) -> tuple[bytearray, list[int]]:
+    data = bytearray(b"%PDF-1.7\n")
+    offsets = []
+    for num, content in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (num, content)
+    return data, offsets
+
+
+def classic_pdf(objects: list[bytes], trailer: bytes = b"") -> bytes:
+    """`objects` numbered from 1, with an xref table and `trailer` entries."""
+    data, offsets = _body(objects)
+    start = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        data += b"%010d 00000 n \n" % offset
+    data += b"trailer\n<< /Size %d /Root 1 0 R %s >>\n" % (len(objects) + 1, trailer)
+    data += b"startxref\n%d\n%%%%EOF\n" % start
+    return bytes(data)
+
+
+def xref_stream_pdf(objects: list[bytes], entries: bytes = b"/W [1 4 1]") -> bytes:
+    """`objects` numbered from 1, with an uncompressed xref stream."""
+    data, offsets = _body(objects)
+    start = len(data)
+    num = len(objects) + 1
+    rows = b"\x00\x00\x00\x00\x00\xff" + b"".join(
+        b"\x01" + offset.to_bytes(4, "big") + b"\x00" for offset in offsets + [start]
+    )
+    data += b"%d 0 obj\n<< /Type /XRef /Size %d %s /Root 1 0 R /Length %d >>\n" % (
+        num,
+        num + 1,
+        entries,
+        len(rows),
+    )
+    data += b"stream\n%s\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n" % (rows, start)
+    return bytes(data)
+
+
+# Files whose xref data holds the wrong types, each of which once escaped
+# the fast path as a TypeError or RecursionError.
+MALFORMED = {
+    "string /Prev": classic_pdf(_objects(), b"/Prev (12)"),
+    "integer /Index": xref_stream_pdf(_objects(), b"/W [1 4 1] /Index 7"),
+    "names in /W": xref_stream_pdf(_objects(), b"/W [/a /b /c]"),
+    "nested arrays": classic_pdf(
+        _objects(), b"/Junk " + b"[" * 100_000 + b"]" * 100_000
+    ),
+}
+
+
+class CacheIsolationMixin:
+    """
+    Analysis and conversion caches and the shared counters in a temporary
+    directory, reset per test.
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            MEDIA_ROOT=directory.name,
+            PDF_CACHE_DIR=str(Path(directory.name) / "analysis-cache"),
+            PDF_CONVERSION_CACHE_DIR=str(Path(directory.name) / "conversion-cache"),
+            PDF_STATS_DIR=str(Path(directory.name) / "stats"),
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for name in ("_cache", "_conversion_cache"):
+            patcher = mock.patch(f"apps.api.utils.cache.{name}", None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class FastPageCountTests(CacheIsolationMixin, SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        base = make_pdf(20)
+        cls.corpus = {
+            "classic xref": base,
+            "garbage-collected": _resave(base, garbage=4),
+            "object streams": _resave(base, garbage=3, use_objstms=1),
+            "incremental update": _incremental(base),
+            "incremental + objstm": _incremental(_resave(base, use_objstms=1)),
+            "pypdf writer": _pypdf(base),
+            "xref stream": xref_stream_pdf(_objects()),
+        }
+
+    def test_agrees_with_pypdf(self):
+        for name, data in self.corpus.items():
+            with self.subTest(name):
+                self.assertEqual(fast_page_count(data), _pypdf_count(data))
+                self.assertEqual(count_pdf_pages(data), _pypdf_count(data))
+
+    def test_encrypted_falls_back_to_pypdf(self):
+        data = _pypdf(make_pdf(3), encrypt=True)
+        with self.assertRaises(XrefError):
+            fast_page_count(data)
+        self.assertEqual(count_pdf_pages(data), 3)
+
+    def test_malformed_xref_data(self):
+        for name, data in MALFORMED.items():
+            with self.subTest(name):
+                with self.assertRaises(XrefError):
+                    fast_page_count(data)
+                with self.assertRaises(ValueError):
+                    count_pdf_pages(data)
+
+    def test_count_checked_against_kids(self):
+        data = classic_pdf(_objects(b"1000"))
+        with self.assertRaisesMessage(XrefError, "/Count"):
+            fast_page_count(data)
+        self.assertEqual(count_pdf_pages(data), 2)
+
+    def test_repeated_kid(self):
+        objects = _objects()
+        objects[1] = b"<< /Type /Pages /Kids [3 0 R 3 0 R] /Count 2 >>"
+        with self.assertRaises(XrefError):
+            fast_page_count(classic_pdf(objects))
+
+    def test_count_pages_endpoint(self):
+        self.addCleanup(_reset_cpu_executor)
+        for name, data in {"valid": self.corpus["classic xref"], **MALFORMED}.items():
+            with self.subTest(name):
+                response = self.client.post(
+                    "/api/count/pdf/pages/count-pages",
+                    {"file": SimpleUploadedFile("document.pdf", data)},
+                )
+                if name == "valid":
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.json(), {"page_count": 20})
+                else:
+                    self.assertEqual(response.status_code, 400)
+
+
+class AnalysisCacheTests(CacheIsolationMixin, SimpleTestCase):
+    def test_repeat_upload_served_from_cache(self):
+        data = make_pdf(6)
+        first = classify_pages(data)
+        # The same content under another name: still a lookup.
+        with mock.patch("apps.api.utils.pdf._analyze_document") as analyze:
+            self.assertEqual(classify_pages(bytes(data)), first)
+            self.assertEqual(count_pdf_pages(data), 6)
+        analyze.assert_not_called()
+
+        stats = get_analysis_cache().stats()
+        self.assertGreaterEqual(stats["memory_hits"], 3)
+        self.assertEqual(stats["disk_hits"], 0)
+
+    def test_disk_tier_outlives_memory(self):
+        data = make_pdf(3)
+        expected = classify_pages(data)
+        # A fresh cache, as in another process, finds the entries on disk.
+        with (
+            mock.patch("apps.api.utils.cache._cache", None),
+            mock.patch("apps.api.utils.pdf._analyze_document") as analyze,
+        ):
+            self.assertEqual(classify_pages(data), expected)
+        analyze.assert_not_called()
+        self.assertGreater(get_analysis_cache().stats()["disk_hits"], 0)
+
+    def test_size_bounded_tiers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AnalysisCache(
+                Path(directory), memory_limit=10, disk_limit=100, stats_name="test"
+            )
+            cache.set("a" * 64, "entry", b"x" * 6)
+            cache.set("b" * 64, "entry", b"y" * 6)
+            # Only the most recent entry fits in memory; both are on disk.
+            self.assertEqual(cache.get("b" * 64, "entry"), b"y" * 6)
+            self.assertEqual(cache.get("a" * 64, "entry"), b"x" * 6)
+            self.assertEqual(cache.get("c" * 64, "entry"), None)
+            stats = cache.stats()
+            self.assertEqual(
+                (stats["memory_hits"], stats["disk_hits"], stats["misses"]), (1, 1, 1)
+            )
+
+            for name in ("d", "e", "f"):
+                cache.set(name * 64, "entry", bytes(40))
+            # Least recently used files go first, down to 90% of the limit.
+            self.assertLessEqual(cache.stats()["disk_bytes"], 90)
+            on_disk = {
+                path.parent.name[0] for path in Path(directory).glob("*/*/entry")
+            }
+            self.assertEqual(on_disk, {"e", "f"})
+
+
+class BlankDetectionTests(CacheIsolationMixin, SimpleTestCase):
+    # name: (page, is_blank)
+    CASES = {
+        "empty": (lambda p: None, True),
+        "a few characters": (lambda p: p.insert_text((72, 72), "p. 2"), True),
+        "a sentence": (lambda p: p.insert_text((72, 72), "Chapter one"), False),
+        "a line": (lambda p: p.draw_line((72, 72), (300, 72)), False),
+        "white background": (
+            lambda p: p.draw_rect(p.rect, color=None, fill=(1, 1, 1)),
+            True,
+        ),
+        "off-page drawing": (
+            lambda p: p.draw_rect(fitz.Rect(-300, -300, -100, -100), fill=(0, 0, 0)),
+            True,
+        ),
+        "image": (
+            lambda p: _insert_png(p, fitz.Rect(72, 72, 300, 300), (128, 128, 128)),
+            False,
+        ),
+    }
+
+    def test_pages(self):
+        for name, (draw, is_blank) in self.CASES.items():
+            with self.subTest(name):
+                page = classify_pages(_page_pdf(draw), color=False).pages[0]
+                self.assertEqual(page.is_blank, is_blank)
+
+    def test_text_threshold(self):
+        data = _page_pdf(lambda p: p.insert_text((72, 72), "Chapter one"))
+        for threshold, is_blank in ((10, False), (11, True)):
+            with self.subTest(threshold=threshold):
+                analysis = classify_pages(data, text_threshold=threshold, color=False)
+                self.assertEqual(analysis.pages[0].is_blank, is_blank)
+
+    async def test_filtered_pdf_keeps_page_order(self):
+        self.addCleanup(_reset_cpu_executor)
+        text = [f"Paragraph {n} of the handout" for n in range(7)]
+        data = labelled_pdf(text[0], "", "", text[3], text[4], "", text[6])
+        response = await self.async_client.post(
+            "/api/convert/nonblank/",
+            {
+                "file": SimpleUploadedFile("document.pdf", data),
+                "return_pdf": "true",
+                "mode": "summary",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(page_labels(content), [text[0], text[3], text[4], text[6]])
+
+
+def _analysis_pool_pids() -> list[int]:
+    """Start this CPU pool worker's page analysis pool; return its processes."""
+    executor, backend = get_executor()
+    executor.submit(int).result()
+    return list(executor._processes) if backend == "process" else []
+
+
+@override_settings(
+    PDF_ANALYSIS_BACKEND="process", PDF_CPU_WORKERS=1, PDF_ANALYSIS_WORKERS=2
+)
+class CpuPoolTests(SimpleTestCase):
+    def setUp(self):
+        _reset_cpu_executor()
+        self.addCleanup(_reset_cpu_executor)
+
+    def test_shutdown_stops_analysis_pools(self):
+        pids = get_cpu_executor().submit(_analysis_pool_pids).result()
+        self.assertTrue(pids)
+
+        shutdown = threading.Thread(target=get_cpu_executor().shutdown)
+        shutdown.start()
+        shutdown.join(timeout=30)
+        self.assertFalse(shutdown.is_alive(), "CPU pool shutdown hung")
+        for pid in pids:
+            with self.assertRaises(ProcessLookupError):
+                os.kill(pid, 0)
+
+
+@override_settings(PDF_CACHE_MEMORY_BYTES=0, PDF_CACHE_DISK_BYTES=0)
+class ConcurrentPdfiumTests(CacheIsolationMixin, SimpleTestCase):
+    def test_threads_share_pdfium(self):
+        documents = [make_pdf(page_count) for page_count in (5, 8, 12, 16)] * 4
+
+        def analyze(data: bytes) -> tuple:
+            pages = classify_pages(data).pages
+            return [(page.is_color, page.is_blank) for page in pages], first_color_page(
+                data
+            )
+
+        expected = [analyze(data) for data in documents]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            self.assertEqual(list(executor.map(analyze, documents)), expected)
+
+
+def make_png() -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (40, 30), (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _page_pdf(draw) -> bytes:
+    """A one-page PDF with whatever `draw(page)` puts on it."""
+    doc = fitz.open()
+    try:
+        draw(doc.new_page())
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def _show_text(page: fitz.Page, rect: fitz.Rect, size: float, at: tuple):
+    """Red text at `at` on a `size` square page, shown in `rect` as a form."""
+    source = fitz.open()
+    try:
+        source.new_page(width=size, height=size).insert_text(at, "Red", color=(1, 0, 0))
+        page.show_pdf_page(rect, source, 0)
+    finally:
+        source.close()
+
+
+def _insert_png(page: fitz.Page, rect: fitz.Rect, rgb: tuple):
+    buffer = BytesIO()
+    Image.new("RGB", (40, 30), rgb).save(buffer, "PNG")
+    page.insert_image(rect, stream=buffer.getvalue())
+
+
+class ColorDetectionTests(CacheIsolationMixin, SimpleTestCase):
+    # name: (page, is_color, whether the structural method has to render)
+    CASES = {
+        "gray text": (lambda p: p.insert_text((72, 72), "Gray"), False, False),
+        "color text": (
+            lambda p: p.insert_text((72, 72), "Red", color=(1, 0, 0)),
+            True,
+            False,
+        ),
+        "gray vector": (
+            lambda p: p.draw_rect(fitz.Rect(72, 72, 300, 300), fill=(0.5, 0.5, 0.5)),
+            False,
+            False,
+        ),
+        "color vector": (
+            lambda p: p.draw_rect(fitz.Rect(72, 72, 300, 300), fill=(0, 1, 0)),
+            True,
+            False,
+        ),
+        "RGB gray image": (
+            lambda p: _insert_png(p, fitz.Rect(72, 72, 300, 300), (128, 128, 128)),
+            False,
+            True,
+        ),
+        "RGB color image": (
+            lambda p: _insert_png(p, fitz.Rect(72, 72, 300, 300), (200, 30, 30)),
+            True,
+            True,
+        ),
+        "off-page text": (
+            lambda p: p.insert_text((-500, -500), "Red", color=(1, 0, 0)),
+            False,
+            False,
+        ),
+        "off-page vector": (
+            lambda p: p.draw_rect(fitz.Rect(-400, -400, -100, -100), fill=(0, 1, 0)),
+            False,
+            False,
+        ),
+        "off-page form": (
+            lambda p: _show_text(p, fitz.Rect(-900, -900, -400, -400), 612, (72, 72)),
+            False,
+            False,
+        ),
+        # Off the page in the form's own space, on it once the form is scaled.
+        "scaled form": (
+            lambda p: _show_text(p, fitz.Rect(0, 0, 300, 300), 2000, (1500, 1500)),
+            True,
+            False,
+        ),
+    }
+
+    def test_structure_agrees_with_render(self):
+        for name, (draw, is_color, rendered) in self.CASES.items():
+            data = _page_pdf(draw)
+            with self.subTest(name):
+                page = classify_pages(data, color_method="render").pages[0]
+                self.assertEqual(page.is_color, is_color)
+                page = classify_pages(data, color_method="structure").pages[0]
+                self.assertEqual((page.is_color, page.rendered), (is_color, rendered))
+
+
+class BatchConvertTests(CacheIsolationMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(_reset_cpu_executor)
+
+    async def convert(self, files: list[tuple[str, bytes]]) -> zipfile.ZipFile:
+        response = await self.async_client.post(
+            "/api/convert/pdf/batch",
+            {"files": [SimpleUploadedFile(name, data) for name, data in files]},
+        )
+        self.assertEqual(response.status_code, 200)
+        content = [chunk async for chunk in response.streaming_content]
+        return zipfile.ZipFile(BytesIO(b"".join(content)))
+
+    async def test_report_lists_every_file(self):
+        archive = await self.convert(
+            [
+                ("scan.pdf", make_pdf(3)),
+                ("notes.txt", b"Some notes\n" * 20),
+                ("photo.png", make_png()),
+                ("broken.png", b"\x89PNG\r\n\x1a\n" + b"\x00" * 64),
+                ("scan.pdf", make_pdf(2)),
+            ]
+        )
+        report = json.loads(archive.read("report.json"))
+        self.assertEqual(
+            [(entry["file"], entry["output"], entry["converter"]) for entry in report],
+            [
+                ("scan.pdf", "scan.pdf", "passthrough"),
+                ("notes.txt", "notes.pdf", "native"),
+                ("photo.png", "photo.pdf", "native"),
+                ("broken.png", None, None),
+                ("scan.pdf", "scan (2).pdf", "passthrough"),
+            ],
+        )
+        self.assertTrue(report[3]["error"])
+        self.assertEqual(
+            sorted(archive.namelist()),
+            ["notes.pdf", "photo.pdf", "report.json", "scan (2).pdf", "scan.pdf"],
+        )
+        self.assertEqual(_pypdf_count(archive.read("scan (2).pdf")), 2)
+
+    async def test_unexpected_error_fails_only_its_file(self):
+        def convert(uploaded_file, cancel):
+            if uploaded_file.name == "notes.txt":
+                raise RuntimeError("boom")
+            return convert_any_to_pdf(uploaded_file, cancel)
+
+        with (
+            mock.patch(
+                "apps.api.utils.convert.convert_any_to_pdf", side_effect=convert
+            ),
+            self.assertLogs("apps.api.utils.convert", "ERROR"),
+        ):
+            archive = await self.convert(
+                [("notes.txt", b"Some notes\n"), ("scan.pdf", make_pdf(1))]
+            )
+        report = json.loads(archive.read("report.json"))
+        self.assertEqual(report[0]["output"], None)
+        self.assertEqual(report[0]["error"], "PDF conversion failed")
+        self.assertEqual(report[1]["output"], "scan.pdf")
+        self.assertEqual(sorted(archive.namelist()), ["report.json", "scan.pdf"])
+
+    def test_concurrent_native_conversions(self):
+        uploads = [
+            ("notes.txt", b"Some notes\n" * 200),
+            ("photo.png", make_png()),
+        ] * 8
+
+        def convert(upload: tuple[str, bytes]) -> int:
+            output, converter, _ = convert_any_to_pdf(SimpleUploadedFile(*upload))
+            self.assertEqual(converter, "native")
+            with output.open() as pdf:
+                return _pypdf_count(pdf.read())
+
+        expected = [convert(upload) for upload in uploads]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            self.assertEqual(list(executor.map(convert, uploads)), expected)
+
+
+@override_settings(LIBREOFFICE_RLIMIT_AS_BYTES=0, LIBREOFFICE_RLIMIT_NOFILE=64)
+class ConverterLimitTests(CacheIsolationMixin, SimpleTestCase):
+    def spawn(self, *command: str, **options) -> subprocess.Popen:
+        process = subprocess.Popen(
+            _limited(list(command), _rlimits(30)), start_new_session=True, **options
+        )
+        self.addCleanup(_kill_group, process)
+        return process
+
+    def test_limits_set_before_exec(self):
+        # The shell reports the limits it started with; the CPU hard limit
+        # is left as it was.
+        process = self.spawn(
+            "sh",
+            "-c",
+            "ulimit -Sn; ulimit -Hn; ulimit -St; ulimit -Ht",
+            stdout=subprocess.PIPE,
+        )
+        output, _ = process.communicate(timeout=30)
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        self.assertEqual(
+            output.decode().split(),
+            [
+                "64",
+                "64",
+                "30",
+                "unlimited" if hard == resource.RLIM_INFINITY else str(hard),
+            ],
+        )
+
+    def test_cpu_limit_reset_for_whole_group(self):
+        process = self.spawn("sh", "-c", "sleep 30 & sleep 30")
+        children = Path(f"/proc/{process.pid}/task/{process.pid}/children")
+        while not children.read_text().split():
+            pass
+        child = int(children.read_text().split()[0])
+
+        _reset_cpu_limit(process.pid, 5)
+        for pid in (process.pid, child):
+            self.assertIn(resource.prlimit(pid, resource.RLIMIT_CPU)[0], (5, 6))
+
+    def test_cpu_limit_stops_busy_process(self):
+        process = self.spawn(sys.executable, "-c", "while True: pass")
+        _reset_cpu_limit(process.pid, 1)
+        self.assertEqual(process.wait(timeout=30), -signal.SIGXCPU)
+
+
+class SplitEndpointTests(CacheIsolationMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(_reset_cpu_executor)
+
+    async def post(self, endpoint: str, data: bytes, **fields):
+        return await self.async_client.post(
+            f"/api/split/pdf_colors/{endpoint}",
+            {"file": SimpleUploadedFile("document.pdf", data), **fields},
+        )
+
+    async def test_split(self):
+        data = make_pdf(8)
+        for endpoint, pages in (("color", 4), ("grayscale", 4)):
+            with self.subTest(endpoint):
+                response = await self.post(endpoint, data)
+                self.assertEqual(response.status_code, 200)
+                content = b"".join(
+                    [chunk async for chunk in response.streaming_content]
+                )
+                self.assertEqual(_pypdf_count(content), pages)
+
+        response = await self.post("color", data, mode="map")
+        self.assertEqual(response.json()["color_pages"], [1, 2, 5, 6])
+        response = await self.post("any_color", data)
+        self.assertEqual(response.json()["first_color_page"], 1)
+
+    async def test_split_single_kind_document(self):
+        # An empty page selection once copied the whole document.
+        for name, color in (("all gray", (0, 0, 0)), ("all color", (0.8, 0.1, 0.1))):
+            data = _text_pdf(3, color)
+            with self.subTest(name):
+                counts = {}
+                for endpoint in ("color", "grayscale"):
+                    response = await self.post(endpoint, data)
+                    self.assertEqual(response.status_code, 200)
+                    content = b"".join(
+                        [chunk async for chunk in response.streaming_content]
+                    )
+                    counts[endpoint] = _pypdf_count(content)
+
+                response = await self.post("both", data)
+                self.assertEqual(response.status_code, 200)
+                archive = zipfile.ZipFile(
+                    BytesIO(b"".join([c async for c in response.streaming_content]))
+                )
+                for endpoint in ("color", "grayscale"):
+                    self.assertEqual(
+                        _pypdf_count(archive.read(f"{endpoint}.pdf")), counts[endpoint]
+                    )
+
+                expected = (3, 0) if name == "all color" else (0, 3)
+                self.assertEqual((counts["color"], counts["grayscale"]), expected)
+
+    async def test_invalid_upload_rejected(self):
+        for endpoint, fields in (
+            ("color", {}),
+            ("color", {"mode": "map"}),
+            ("grayscale", {}),
+            ("grayscale", {"mode": "map"}),
+            ("both", {}),
+            ("any_color", {}),
+        ):
+            with self.subTest(endpoint, **fields):
+                response = await self.post(endpoint, b"junk" * 100, **fields)
+                self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PDF_CACHE_MEMORY_BYTES=0, PDF_CACHE_DISK_BYTES=0)
+def _image_pdf(seed: int) -> bytes:
+    """A page showing a noise image that does not compress."""
+    noise = Image.frombytes(
+        "RGB", (200, 200), np.random.default_rng(seed).bytes(120_000)
+    )
+    buffer = BytesIO()
+    noise.save(buffer, "PNG")
+    return _page_pdf(
+        lambda p: p.insert_image(fitz.Rect(72, 72, 272, 272), stream=buffer.getvalue())
+    )
+
+
+class MergeTests(CacheIsolationMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(_reset_cpu_executor)
+
+    async def merge(self, files: list[tuple[str, bytes]]):
+        return await self.async_client.post(
+            "/api/convert/merge/",
+            {"files": [SimpleUploadedFile(name, data) for name, data in files]},
+        )
+
+    async def content(self, response) -> bytes:
+        self.assertEqual(response.status_code, 200)
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    async def test_pages_in_upload_order(self):
+        response = await self.merge(
+            [
+                ("b.pdf", labelled_pdf("b1", "b2")),
+                ("a.pdf", labelled_pdf("a1")),
+                ("c.pdf", labelled_pdf("c1", "c2", "c3")),
+            ]
+        )
+        content = await self.content(response)
+        self.assertEqual(page_labels(content), ["b1", "b2", "a1", "c1", "c2", "c3"])
+
+    async def test_shared_image_stored_once(self):
+        image, other = _image_pdf(0), _image_pdf(1)
+        once = len(await self.content(await self.merge([("a.pdf", image)] * 2)))
+        twice = len(
+            await self.content(await self.merge([("a.pdf", image), ("b.pdf", other)]))
+        )
+        self.assertLess(once, len(image) * 1.2)
+        self.assertGreater(twice, len(image) * 1.8)
+
+    async def test_rejects_bad_input(self):
+        response = await self.merge([("a.pdf", make_pdf(1))])
+        self.assertEqual(response.status_code, 400)
+        response = await self.merge([("a.pdf", make_pdf(1)), ("b.pdf", b"junk" * 100)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("b.pdf", response.json()["detail"])
+
+
+class ShardedAnalysisTests(CacheIsolationMixin, SimpleTestCase):
+    def analyze(self, source, **settings) -> list[tuple]:
+        _reset_executor(wait=True)
+        self.addCleanup(_reset_executor, wait=True)
+        with self.settings(**settings):
+            pages = classify_pages(source).pages
+        return [(p.index, p.width, p.height, p.is_color, p.is_blank) for p in pages]
+
+    def test_shards_match_single_pass(self):
+        data = make_pdf(23)
+        expected = self.analyze(data, PDF_ANALYSIS_WORKERS=1)
+        self.assertEqual(len(expected), 23)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "document.pdf"
+            path.write_bytes(data)
+            with map_file(path) as mapped:
+                for backend in ("thread", "process"):
+                    for name, source in (
+                        ("bytes", data),
+                        ("path", str(path)),
+                        ("mapped", mapped),
+                    ):
+                        with self.subTest(backend=backend, source=name):
+                            pages = self.analyze(
+                                source,
+                                PDF_ANALYSIS_BACKEND=backend,
+                                PDF_ANALYSIS_WORKERS=3,
+                                PDF_ANALYSIS_CHUNK_SIZE=4,
+                            )
+                            self.assertEqual(pages, expected)
+
+
+class AdminStatsTests(CacheIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(_reset_cpu_executor)
+        admin = User.objects.create_user("admin", is_staff=True)
+        self.headers = {
+            "Authorization": f"Bearer {Token.objects.create(user=admin).token}"
+        }
+
+    def test_cache_stats_include_cpu_pool(self):
+        data = make_pdf(3)
+        for _ in range(2):
+            response = self.client.post(
+                "/api/count/pdf/pages/count-pages",
+                {"file": SimpleUploadedFile("document.pdf", data)},
+            )
+            self.assertEqual(response.status_code, 200)
+
+        stats = self.client.get("/api/admin/cache/", headers=self.headers).json()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["memory_hits"] + stats["disk_hits"], 1)
+        self.assertGreater(stats["disk_bytes"], 0)
+
+    def test_converter_stats_include_other_processes(self):
+        get_cpu_executor().submit(converter_stats.increment, "kills").result()
+        converter_stats.increment("kills")
+        stats = self.client.get("/api/admin/converter/", headers=self.headers).json()
+        self.assertEqual(stats["kills"], 2)
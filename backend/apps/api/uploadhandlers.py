@@ -0,0 +1,27 @@
+import hashlib
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spool every upload to a temporary file, regardless of size, and compute
+    its SHA-256 while the body is being received.
+
+    The resulting TemporaryUploadedFile carries the hex digest as `sha256`,
+    so views can pass `temporary_file_path()` to the PDF utilities and never
+    hold the whole file in memory.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.sha256 = self.hasher.hexdigest()
+        return uploaded_file
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from django.conf import settings
+
+from .counters import SharedCounters
+from .mapped import MappedFile
+from .output import OutputFile, new_temp_path
+
+
+def pdf_digest(source: Union[bytes, str, os.PathLike, MappedFile]) -> str:
+    """
+    SHA-256 of the file content, used as the cache key for a document.
+    Paths are hashed in chunks rather than read into memory.
+    """
+    if isinstance(source, (bytes, MappedFile)):
+        return hashlib.sha256(source).hexdigest()
+    with open(source, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class AnalysisCache:
+    """
+    Two-tier, content-addressed cache for per-document work.
+
+    Entries are addressed by (document digest, name) and stored as bytes:
+    an in-memory LRU in front of a directory tree on disk. Both tiers are
+    bounded by total size; a limit of 0 disables that tier. Generated files
+    skip the memory tier: they are moved into the disk tier and served from
+    there (`new_file`, `store_file`, `get_file`).
+
+    Hit, miss and eviction counts are shared by every process using the
+    cache (see SharedCounters) under `stats_name`; the memory tier is each
+    process's own.
+    """
+
+    def __init__(
+        self, directory: Path, memory_limit: int, disk_limit: int, stats_name: str
+    ):
+        self.directory = Path(directory)
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+
+        self._memory: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._memory_size = 0
+        self._disk_size: Optional[int] = None
+        self._lock = threading.Lock()
+
+        self.counters = SharedCounters(
+            stats_name, ("memory_hits", "disk_hits", "misses", "evictions")
+        )
+
+    def _path(self, digest: str, name: str) -> Path:
+        return self.directory / digest[:2] / digest / name
+
+    def get(self, digest: str, name: str) -> Optional[bytes]:
+        key = (digest, name)
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+        if value is not None:
+            self.counters.increment("memory_hits")
+            return value
+
+        if self.disk_limit > 0:
+            path = self._path(digest, name)
+            try:
+                value = path.read_bytes()
+                os.utime(path)
+            except FileNotFoundError:
+                value = None
+            if value is not None:
+                with self._lock:
+                    self._remember(key, value)
+                self.counters.increment("disk_hits")
+                return value
+
+        self.counters.increment("misses")
+        return None
+
+    def set(self, digest: str, name: str, value: bytes):
+        with self._lock:
+            self._remember((digest, name), value)
+
+        if self.disk_limit <= 0 or len(value) > self.disk_limit:
+            return
+
+        path = self._path(digest, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+        self._added_to_disk(len(value))
+
+    def new_file(self, suffix: str = "") -> str:
+        """
+        An empty file to build an entry in, on the disk tier's filesystem so
+        that storing it is a rename.
+        """
+        if self.disk_limit <= 0:
+            return new_temp_path(suffix)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=suffix)
+        os.close(fd)
+        return path
+
+    def store_file(self, digest: str, name: str, path: str) -> OutputFile:
+        """
+        Move a finished file into the disk tier without reading it. When the
+        disk tier is disabled or too small, the file stays where it is and is
+        handed back as a temporary output.
+        """
+        size = os.path.getsize(path)
+        if self.disk_limit <= 0 or size > self.disk_limit:
+            return OutputFile(path, temporary=True)
+
+        target = self._path(digest, name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+        os.close(fd)
+        try:
+            # A rename unless `path` is on another filesystem.
+            shutil.move(path, tmp_name)
+            os.replace(tmp_name, target)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+        self._added_to_disk(size)
+        return OutputFile(str(target))
+
+    def get_file(self, digest: str, name: str) -> Optional[OutputFile]:
+        """A disk-tier entry as a file, for outputs served straight from disk."""
+        if self.disk_limit > 0:
+            path = self._path(digest, name)
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            else:
+                self.counters.increment("disk_hits")
+                return OutputFile(str(path))
+
+        self.counters.increment("misses")
+        return None
+
+    def _added_to_disk(self, size: int):
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = self._scan_disk_size()
+            else:
+                self._disk_size += size
+            if self._disk_size > self.disk_limit:
+                self._evict_disk()
+
+    def get_json(self, digest: str, name: str) -> Any:
+        value = self.get(digest, name)
+        return None if value is None else json.loads(value)
+
+    def set_json(self, digest: str, name: str, value: Any):
+        self.set(digest, name, json.dumps(value, separators=(",", ":")).encode())
+
+    def _remember(self, key: tuple[str, str], value: bytes):
+        """Insert into the memory tier; caller holds the lock."""
+        if len(value) > self.memory_limit:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = value
+        self._memory_size += len(value)
+        while self._memory_size > self.memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.counters.increment("evictions")
+
+    def _disk_entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.directory.glob("*/*/*"):
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_disk_size(self) -> int:
+        return sum(size for _, size, _ in self._disk_entries())
+
+    def _evict_disk(self):
+        """Drop least recently used files until 90% of the disk limit is free."""
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_limit * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            else:
+                self.counters.increment("evictions")
+            total -= size
+            try:
+                path.parent.rmdir()
+            except OSError:
+                pass
+        self._disk_size = total
+
+    def stats(self) -> dict:
+        """
+        Counters across all processes, the memory tier of this process, and
+        the disk tier as it is now (other processes add to it too).
+        """
+        disk_bytes = self._scan_disk_size() if self.disk_limit > 0 else 0
+        with self._lock:
+            return {
+                **self.counters.snapshot(),
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_bytes": disk_bytes,
+            }
+
+
+_cache: Optional[AnalysisCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> AnalysisCache:
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnalysisCache(
+                directory=settings.PDF_CACHE_DIR,
+                memory_limit=settings.PDF_CACHE_MEMORY_BYTES,
+                disk_limit=settings.PDF_CACHE_DISK_BYTES,
+                stats_name="analysis-cache",
+            )
+        return _cache
+
+
+_conversion_cache: Optional[AnalysisCache] = None
+
+
+def get_conversion_cache() -> AnalysisCache:
+    """Converted PDFs, addressed by the digest of the uploaded document."""
+    global _conversion_cache
+
+    with _cache_lock:
+        if _conversion_cache is None:
+            _conversion_cache = AnalysisCache(
+                directory=settings.PDF_CONVERSION_CACHE_DIR,
+                memory_limit=settings.PDF_CONVERSION_CACHE_MEMORY_BYTES,
+                disk_limit=settings.PDF_CONVERSION_CACHE_DISK_BYTES,
+                stats_name="conversion-cache",
+            )
+        return _conversion_cache
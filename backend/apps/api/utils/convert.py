@@ -0,0 +1,381 @@
+import json
+import logging
+import shutil
+import struct
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO, RawIOBase
+from pathlib import Path
+from typing import Iterator, Optional
+
+import fitz
+from django.conf import settings
+from ninja.files import UploadedFile
+from PIL import Image
+
+from .cache import get_conversion_cache, pdf_digest
+from .docx import ConversionError, converter_version, doc2pdf
+from .executor import call_cpu, submit_cpu
+from .output import (
+    STREAM_CHUNK_SIZE,
+    OutputFile,
+    new_temp_path,
+    write_temp_output,
+)
+from .pdf import PdfSource, classify_pages, count_pdf_pages
+from .uploads import spooled_source
+
+logger = logging.getLogger(__name__)
+
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+)
+IMAGE_FORMATS = {name for _, name in _IMAGE_SIGNATURES}
+
+# Text in other formats (csv, html, rtf, ...) is left to LibreOffice, which
+# lays it out as a spreadsheet or rich document.
+_TEXT_EXTENSIONS = {"", ".txt", ".text", ".log", ".md"}
+
+_HEAD_SIZE = 2048
+
+
+def read_head(source: PdfSource, size: int = _HEAD_SIZE) -> bytes:
+    if isinstance(source, bytes):
+        return source[:size]
+    with open(source, "rb") as f:
+        return f.read(size)
+
+
+def _looks_like_text(head: bytes) -> bool:
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the end of the sample is fine.
+        return len(head) == _HEAD_SIZE and e.start >= len(head) - 3
+    return True
+
+
+def sniff_format(head: bytes, filename: str) -> str:
+    """
+    Classify an upload from its first bytes: "pdf", one of IMAGE_FORMATS,
+    "text", or "office" for anything that needs LibreOffice.
+    """
+    # The PDF header may follow some junk; readers accept it in the first 1 KiB.
+    if b"%PDF-" in head[:1024]:
+        return "pdf"
+    for signature, name in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return name
+    if Path(filename).suffix.lower() in _TEXT_EXTENSIONS and _looks_like_text(head):
+        return "text"
+    return "office"
+
+
+def _new_page(doc: fitz.Document, width: float, height: float) -> fitz.Page:
+    """Add an A4 page, turned to match the orientation of its content."""
+    rect = fitz.paper_rect("a4")
+    if width > height:
+        return doc.new_page(width=rect.height, height=rect.width)
+    return doc.new_page(width=rect.width, height=rect.height)
+
+
+def _embed_png(doc: fitz.Document, data: bytes) -> Optional[tuple[int, int, int]]:
+    """
+    Add an 8-bit gray or RGB PNG to `doc` as an image XObject whose stream
+    is the PNG's own IDAT data (PDF's Flate filter with the PNG predictor
+    reads it as is), skipping the decode and re-compress that insert_image
+    would do. Returns (xref, width, height), or None for PNGs this cannot
+    express (palette, alpha, interlaced, 16-bit).
+    """
+    pos = 8
+    header, chunks = None, []
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos : pos + 8])
+        body = data[pos + 8 : pos + 8 + length]
+        pos += length + 12
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif kind == b"IDAT":
+            chunks.append(body)
+        elif kind == b"IEND":
+            break
+    if header is None or not chunks:
+        return None
+
+    width, height, bit_depth, color_type, _, _, interlace = header
+    colors = {0: 1, 2: 3}.get(color_type)
+    if colors is None or bit_depth != 8 or interlace:
+        return None
+
+    xref = doc.get_new_xref()
+    doc.update_object(xref, "<<>>")
+    doc.update_stream(xref, b"".join(chunks), compress=False)
+    for key, value in (
+        ("Type", "/XObject"),
+        ("Subtype", "/Image"),
+        ("Width", str(width)),
+        ("Height", str(height)),
+        ("ColorSpace", "/DeviceGray" if colors == 1 else "/DeviceRGB"),
+        ("BitsPerComponent", "8"),
+        ("Filter", "/FlateDecode"),
+        (
+            "DecodeParms",
+            f"<</Predictor 15/Colors {colors}/BitsPerComponent 8/Columns {width}>>",
+        ),
+    ):
+        doc.xref_set_key(xref, key, value)
+    return xref, width, height
+
+
+def image_to_pdf(source: PdfSource, image_format: str) -> OutputFile:
+    """
+    Place each image (or TIFF frame) on its own A4 page, scaled to fit.
+    JPEGs are embedded as they are and simple PNGs without re-compression.
+    Raises ConversionError for unreadable images.
+    """
+    data = source if isinstance(source, bytes) else Path(source).read_bytes()
+    out = fitz.open()
+    try:
+        if image_format in ("jpeg", "png"):
+            embedded = _embed_png(out, data) if image_format == "png" else None
+            if embedded is not None:
+                xref, width, height = embedded
+                page = _new_page(out, width, height)
+                page.insert_image(page.rect, xref=xref)
+            else:
+                # Pillow reads the size from the header without decoding.
+                with Image.open(BytesIO(data)) as image:
+                    width, height = image.size
+                page = _new_page(out, width, height)
+                page.insert_image(page.rect, stream=data)
+        else:
+            frames = fitz.open(stream=data, filetype=image_format)
+            try:
+                frames_pdf = fitz.open("pdf", frames.convert_to_pdf())
+            finally:
+                frames.close()
+            try:
+                for frame in frames_pdf:
+                    page = _new_page(out, frame.rect.width, frame.rect.height)
+                    page.show_pdf_page(page.rect, frames_pdf, frame.number)
+            finally:
+                frames_pdf.close()
+        path = new_temp_path(".pdf")
+        out.save(path)
+        return OutputFile(path, temporary=True)
+    except (RuntimeError, ValueError, OSError) as e:
+        raise ConversionError(f"Unreadable image: {e}")
+    finally:
+        out.close()
+
+
+def text_to_pdf(source: PdfSource) -> OutputFile:
+    """
+    Lay out plain UTF-8 text on A4 pages with MuPDF's text reader.
+    Raises ConversionError if MuPDF cannot read it.
+    """
+    try:
+        if isinstance(source, bytes):
+            doc = fitz.open(stream=source, filetype="txt")
+        else:
+            doc = fitz.open(source, filetype="txt")
+    except (RuntimeError, ValueError) as e:
+        raise ConversionError(f"Unreadable text: {e}")
+    try:
+        doc.layout(rect=fitz.paper_rect("a4"), fontsize=11)
+        return write_temp_output(doc.convert_to_pdf(), ".pdf")
+    except (RuntimeError, ValueError) as e:
+        raise ConversionError(f"Unreadable text: {e}")
+    finally:
+        doc.close()
+
+
+def _prime_analysis(pdf: PdfSource):
+    """
+    Count and classify a converted PDF, so that uploading it to the queue or
+    the split endpoints later is served from the analysis cache. Run on the
+    CPU pool after the conversion has been returned.
+    """
+    try:
+        digest = pdf_digest(pdf)
+        count_pdf_pages(pdf, digest=digest)
+        classify_pages(pdf, digest=digest)
+    except (ValueError, OSError):
+        # Unreadable, or evicted from the conversion cache in the meantime.
+        pass
+
+
+def convert_upload_to_pdf(
+    uploaded_file: UploadedFile, cancel: Optional[threading.Event] = None
+) -> tuple[OutputFile, bool]:
+    """
+    Convert an uploaded office document to PDF through LibreOffice.
+
+    Results are cached on disk by the digest of the upload plus its extension
+    and the converter version. Returns (pdf file, whether it was a cache hit).
+    Raises ConversionError if no PDF was produced; setting `cancel` kills a
+    running conversion.
+    """
+    source, digest = spooled_source(uploaded_file)
+    digest = digest or pdf_digest(source)
+    suffix = Path(uploaded_file.name or "temp.docx").suffix.lower()
+    name = f"{suffix.lstrip('.') or 'bin'}-{converter_version()}.pdf"
+
+    cache = get_conversion_cache()
+    output = cache.get_file(digest, name)
+    if output is not None:
+        return output, True
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # A fixed stem keeps the output independent of the uploaded filename.
+        input_path = Path(temp_dir) / f"document{suffix}"
+        output_path = input_path.with_suffix(".pdf")
+        if isinstance(source, bytes):
+            input_path.write_bytes(source)
+        else:
+            shutil.copyfile(source, input_path)
+
+        doc2pdf(input_path, cancel)
+
+        if not output_path.exists():
+            raise ConversionError("PDF conversion failed")
+        pdf_path = cache.new_file(".pdf")
+        shutil.move(output_path, pdf_path)
+
+    output = cache.store_file(digest, name, pdf_path)
+    submit_cpu(_prime_analysis, output.path)
+    return output, False
+
+
+def convert_any_to_pdf(
+    uploaded_file: UploadedFile, cancel: Optional[threading.Event] = None
+) -> tuple[OutputFile, str, Optional[bool]]:
+    """
+    Convert an upload to PDF with the cheapest converter for its format:
+    PDFs pass through untouched, images and plain text are converted by
+    PyMuPDF on the CPU pool (it is not thread-safe, and this runs on request
+    and batch threads) and only office documents reach LibreOffice.
+
+    Returns (pdf file, converter name, conversion cache hit or None when
+    the conversion cache was not involved). A passed-through PDF is the
+    upload's own file. Raises ConversionError.
+    """
+    filename = uploaded_file.name or "temp.docx"
+    source, _ = spooled_source(uploaded_file)
+    kind = sniff_format(read_head(source), filename)
+
+    if kind == "pdf":
+        if isinstance(source, bytes):
+            return write_temp_output(source, ".pdf"), "passthrough", None
+        return OutputFile(str(source)), "passthrough", None
+    if kind in IMAGE_FORMATS:
+        return call_cpu(image_to_pdf, source, kind), "native", None
+    if kind == "text":
+        return call_cpu(text_to_pdf, source), "native", None
+
+    output, cache_hit = convert_upload_to_pdf(uploaded_file, cancel)
+    return output, "libreoffice", cache_hit
+
+
+class _ZipStream(RawIOBase):
+    """Write-only sink for ZipFile that hands out what was written so far."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _output_names(uploaded_files: list[UploadedFile]) -> list[str]:
+    """`<stem>.pdf` per upload, numbered when stems repeat."""
+    names, seen = [], {}
+    for uploaded_file in uploaded_files:
+        stem = Path(uploaded_file.name or "document").stem or "document"
+        seen[stem] = seen.get(stem, 0) + 1
+        names.append(f"{stem}.pdf" if seen[stem] == 1 else f"{stem} ({seen[stem]}).pdf")
+    return names
+
+
+def convert_batch_to_zip(
+    uploaded_files: list[UploadedFile], cancel: Optional[threading.Event] = None
+) -> Iterator[bytes]:
+    """
+    Convert uploads concurrently (PDF_CONVERT_BATCH_WORKERS at a time) and
+    yield a zip archive as it is written: each PDF is added as soon as its
+    conversion finishes, and a report.json listing every input, its output
+    name or its error closes the archive. A failed file does not stop the
+    batch, whatever its converter raises; closing the generator early or
+    setting `cancel` (the client went away) cancels the conversions still
+    running or queued. PDFs are copied into the archive in chunks, so none
+    is held in memory whole.
+    """
+    names = _output_names(uploaded_files)
+    report = [
+        {"file": f.name, "output": None, "converter": None, "error": None}
+        for f in uploaded_files
+    ]
+    stream = _ZipStream()
+
+    cancel = cancel or threading.Event()
+
+    # PDFs are already compressed; storing them avoids a second deflate pass.
+    archive = zipfile.ZipFile(stream, "w", zipfile.ZIP_STORED)
+    with ThreadPoolExecutor(
+        max_workers=settings.PDF_CONVERT_BATCH_WORKERS,
+        thread_name_prefix="pdf-convert",
+    ) as executor:
+        futures = {
+            executor.submit(convert_any_to_pdf, uploaded_file, cancel): index
+            for index, uploaded_file in enumerate(uploaded_files)
+        }
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    output, converter, _ = future.result()
+                except (ConversionError, OSError) as e:
+                    report[index]["error"] = str(e) or "PDF conversion failed"
+                    continue
+                except Exception:
+                    # Whatever else a converter raises fails only its file.
+                    logger.exception("Converting %r failed", report[index]["file"])
+                    report[index]["error"] = "PDF conversion failed"
+                    continue
+                with (
+                    output.open() as pdf,
+                    archive.open(names[index], "w", force_zip64=True) as entry,
+                ):
+                    while chunk := pdf.read(STREAM_CHUNK_SIZE):
+                        entry.write(chunk)
+                        yield stream.drain()
+                report[index].update(output=names[index], converter=converter)
+                yield stream.drain()
+        except GeneratorExit:
+            cancel.set()
+            executor.shutdown(cancel_futures=True)
+            # Conversions that finished but were never added to the archive.
+            for future in futures:
+                if not future.cancelled() and future.exception() is None:
+                    future.result()[0].discard()
+            raise
+
+    archive.writestr("report.json", json.dumps(report, indent=2))
+    archive.close()
+    yield stream.drain()
@@ -0,0 +1,59 @@
+import fcntl
+import os
+import struct
+from pathlib import Path
+
+from django.conf import settings
+
+
+class SharedCounters:
+    """
+    Named counters that every process adds to: web workers, CPU pool
+    workers and job workers alike, so a snapshot taken in any of them shows
+    the totals. They are kept as 64-bit integers in a file under
+    PDF_STATS_DIR and updated under an exclusive lock on that file.
+    """
+
+    def __init__(self, name: str, fields: tuple[str, ...]):
+        self.name = name
+        self.fields = fields
+        self._format = f"<{len(fields)}q"
+        self._size = struct.calcsize(self._format)
+
+    def _path(self) -> Path:
+        return Path(settings.PDF_STATS_DIR) / f"{self.name}.counters"
+
+    def _read(self, fd: int) -> list[int]:
+        # A file written with fewer fields reads as zeros for the new ones.
+        data = os.pread(fd, self._size, 0).ljust(self._size, b"\0")
+        return list(struct.unpack(self._format, data))
+
+    def increment(self, field: str, amount: int = 1):
+        index = self.fields.index(field)
+        path = self._path()
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # A lock per open file, so threads of one process exclude each
+            # other as well; closing the file releases it.
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            counts = self._read(fd)
+            counts[index] += amount
+            os.pwrite(fd, struct.pack(self._format, *counts), 0)
+        finally:
+            os.close(fd)
+
+    def snapshot(self) -> dict:
+        try:
+            fd = os.open(self._path(), os.O_RDONLY)
+        except FileNotFoundError:
+            return dict.fromkeys(self.fields, 0)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            counts = self._read(fd)
+        finally:
+            os.close(fd)
+        return dict(zip(self.fields, counts))
@@ -1,14 +1,446 @@
+import functools
+import hashlib
+import json
+import math
+import os
+import queue
+import resource
+import selectors
 import shutil
+import signal
 import subprocess
+import tempfile
+import threading
+import time
 from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+from .counters import SharedCounters
 
 LOEXE = shutil.which("soffice")
+# util-linux prlimit(1): sets resource limits, then execs the command.
+PRLIMIT = shutil.which("prlimit")
+
+BRIDGE_SCRIPT = Path(__file__).with_name("uno_bridge.py")
+
+# Bump when the conversion pipeline changes in a way that affects its output,
+# so cached conversions made by the old pipeline are not served.
+CONVERTER_REVISION = 1
+
+
+class ConversionError(Exception):
+    """LibreOffice could not convert the document."""
+
+
+class ConverterBusyError(ConversionError):
+    """Every worker is busy and the wait queue is full or timed out."""
+
+
+class ConversionTimeoutError(ConversionError):
+    """The conversion ran past LIBREOFFICE_CONVERSION_TIMEOUT and was killed."""
+
+
+class ConversionCancelledError(ConversionError):
+    """The caller gave up (e.g. the client disconnected) and it was killed."""
+
+
+# How often blocking waits wake up to check for cancellation.
+_POLL_INTERVAL = 0.25
+
+
+# Conversion counters for sizing capacity, totalled across processes.
+converter_stats = SharedCounters(
+    "converter",
+    (
+        "conversions",
+        "failures",
+        "timeouts",
+        "cancellations",
+        "kills",
+        "rejections",
+        "worker_starts",
+    ),
+)
+
+
+def _rlimits(cpu_seconds: int) -> list[tuple[int, int]]:
+    """Resource limits for a converter process; a setting of 0 skips that limit."""
+    limits = []
+    if cpu_seconds:
+        limits.append((resource.RLIMIT_CPU, cpu_seconds))
+    if settings.LIBREOFFICE_RLIMIT_AS_BYTES:
+        limits.append((resource.RLIMIT_AS, settings.LIBREOFFICE_RLIMIT_AS_BYTES))
+    if settings.LIBREOFFICE_RLIMIT_NOFILE:
+        limits.append((resource.RLIMIT_NOFILE, settings.LIBREOFFICE_RLIMIT_NOFILE))
+    return limits
+
+
+_PRLIMIT_OPTIONS = {
+    resource.RLIMIT_CPU: "--cpu",
+    resource.RLIMIT_AS: "--as",
+    resource.RLIMIT_NOFILE: "--nofile",
+}
+
+
+def _capped(kind: int, value: int) -> int:
+    """`value` capped at the current hard limit, which only root can raise."""
+    _, hard = resource.getrlimit(kind)
+    return value if hard == resource.RLIM_INFINITY else min(value, hard)
+
+
+def _limited(command: list[str], limits: list[tuple[int, int]]) -> list[str]:
+    """
+    `command` launched through prlimit(1), so `limits` are in place before it
+    executes its first instruction and every child inherits them. The CPU
+    limit is only a soft one (SIGXCPU), so that it can be moved up again for
+    a pool worker's next conversion; the conversion timeout kills a process
+    that ignores the signal.
+    """
+    if not limits:
+        return command
+    if not PRLIMIT:
+        raise EnvironmentError(
+            "prlimit not found; set LIBREOFFICE_RLIMIT_* to 0 to run without limits"
+        )
+    options = []
+    for kind, value in limits:
+        value = _capped(kind, value)
+        bounds = f"{value}:" if kind == resource.RLIMIT_CPU else f"{value}:{value}"
+        options.append(f"{_PRLIMIT_OPTIONS[kind]}={bounds}")
+    return [PRLIMIT, *options, "--", *command]
+
+
+def _reset_cpu_limit(group: int, seconds: int):
+    """
+    RLIMIT_CPU counts a process's CPU time over its whole life. Give each
+    process in process group `group` (a pool worker's bridge and soffice)
+    `seconds` more than it has used so far, so the limit applies to the
+    conversion about to start rather than to the worker's lifetime.
+    """
+    ticks = os.sysconf("SC_CLK_TCK")
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Fields after the parenthesized command name: state, ppid, pgrp, ...
+        fields = stat[stat.rindex(b")") + 2 :].split()
+        if int(fields[2]) != group:
+            continue
+        used = math.ceil((int(fields[11]) + int(fields[12])) / ticks)
+        try:
+            pid = int(entry.name)
+            _, hard = resource.prlimit(pid, resource.RLIMIT_CPU)
+            soft = used + seconds
+            if hard != resource.RLIM_INFINITY:
+                soft = min(soft, hard)
+            resource.prlimit(pid, resource.RLIMIT_CPU, (soft, hard))
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+def _kill_group(process: subprocess.Popen):
+    """SIGKILL the process group led by `process` and reap it."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    else:
+        converter_stats.increment("kills")
+    process.wait()
+
 
+class _OfficeWorker:
+    """
+    One headless soffice with its own user profile, driven through the UNO
+    bridge script. The bridge runs in its own process group so a hung or
+    crashed instance can be killed together with soffice.
+    """
 
-def doc2pdf(filein: Path):
+    def __init__(self, index: int):
+        self.index = index
+        self.profile = Path(settings.LIBREOFFICE_PROFILE_DIR) / f"worker-{index}"
+        self.process: Optional[subprocess.Popen] = None
+        self.conversions = 0
+        self.last_used = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.profile.mkdir(parents=True, exist_ok=True)
+        # Startup gets one conversion's CPU time.
+        command = _limited(
+            [
+                settings.LIBREOFFICE_PYTHON,
+                str(BRIDGE_SCRIPT),
+                "--soffice",
+                LOEXE,
+                "--profile",
+                str(self.profile),
+                "--pipe",
+                f"printing-press-{os.getpid()}-{self.index}",
+                "--startup-timeout",
+                str(settings.LIBREOFFICE_STARTUP_TIMEOUT),
+            ],
+            _rlimits(settings.LIBREOFFICE_RLIMIT_CPU_SECONDS),
+        )
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            start_new_session=True,
+        )
+        converter_stats.increment("worker_starts")
+        self.conversions = 0
+        try:
+            self._read(settings.LIBREOFFICE_STARTUP_TIMEOUT)
+        except ConversionError:
+            self.stop(graceful=False)
+            raise
+        self.last_used = time.monotonic()
+
+    def stop(self, graceful: bool = True):
+        """
+        Let the bridge shut soffice down (closing stdin), or with
+        `graceful=False` kill the whole process group right away.
+        """
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        if graceful:
+            try:
+                process.stdin.close()
+                process.wait(timeout=5)
+                return
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        _kill_group(process)
+
+    def _read(self, timeout: float, cancel: Optional[threading.Event] = None) -> dict:
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.process.stdout, selectors.EVENT_READ)
+            while not selector.select(_POLL_INTERVAL):
+                if cancel is not None and cancel.is_set():
+                    raise ConversionCancelledError("Conversion cancelled")
+                if time.monotonic() > deadline:
+                    raise ConversionTimeoutError("LibreOffice did not respond in time")
+        line = self.process.stdout.readline()
+        if not line:
+            raise ConversionError("LibreOffice worker exited")
+        return json.loads(line)
+
+    def request(
+        self, message: dict, timeout: float, cancel: Optional[threading.Event] = None
+    ) -> dict:
+        try:
+            self.process.stdin.write(json.dumps(message) + "\n")
+            self.process.stdin.flush()
+        except OSError:
+            raise ConversionError("LibreOffice worker exited")
+        reply = self._read(timeout, cancel)
+        self.last_used = time.monotonic()
+        return reply
+
+    def limit_next_conversion(self):
+        """Give the worker LIBREOFFICE_RLIMIT_CPU_SECONDS for its next job."""
+        if settings.LIBREOFFICE_RLIMIT_CPU_SECONDS:
+            _reset_cpu_limit(self.process.pid, settings.LIBREOFFICE_RLIMIT_CPU_SECONDS)
+
+    def is_healthy(self) -> bool:
+        if not self.running:
+            return False
+        try:
+            return self.request({"ping": True}, timeout=5).get("ok", False)
+        except ConversionError:
+            return False
+
+
+class OfficePool:
+    """
+    A fixed set of long-lived LibreOffice workers.
+
+    Callers wait for an idle worker in a bounded queue. Workers start on
+    first use, are pinged when they have been idle for a while and are
+    restarted after LIBREOFFICE_MAX_CONVERSIONS conversions, a crash or a
+    timeout.
+    """
+
+    def __init__(self, size: int, max_waiting: int):
+        self._idle: queue.Queue[_OfficeWorker] = queue.Queue()
+        for index in range(size):
+            self._idle.put(_OfficeWorker(index))
+        self._slots = threading.BoundedSemaphore(size + max_waiting)
+
+    def _wait_for_worker(self, cancel: Optional[threading.Event]) -> _OfficeWorker:
+        deadline = time.monotonic() + settings.LIBREOFFICE_QUEUE_TIMEOUT
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise ConversionCancelledError("Conversion cancelled")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ConverterBusyError("Timed out waiting for a converter")
+            try:
+                return self._idle.get(timeout=min(remaining, _POLL_INTERVAL))
+            except queue.Empty:
+                pass
+
+    def _checkout(self, cancel: Optional[threading.Event]) -> _OfficeWorker:
+        worker = self._wait_for_worker(cancel)
+        try:
+            idle_for = time.monotonic() - worker.last_used
+            if worker.running and idle_for > settings.LIBREOFFICE_HEALTH_INTERVAL:
+                if not worker.is_healthy():
+                    worker.stop(graceful=False)
+            if not worker.running:
+                worker.start()
+        except BaseException:
+            self._idle.put(worker)
+            raise
+        return worker
+
+    def convert(
+        self, source: Path, target: Path, cancel: Optional[threading.Event] = None
+    ):
+        """
+        Convert on the next idle worker. Setting `cancel` while waiting or
+        converting gives up, killing the worker if it was converting.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ConverterBusyError("Too many conversions waiting")
+        try:
+            worker = self._checkout(cancel)
+            try:
+                worker.limit_next_conversion()
+                reply = worker.request(
+                    {"input": str(source), "output": str(target)},
+                    timeout=settings.LIBREOFFICE_CONVERSION_TIMEOUT,
+                    cancel=cancel,
+                )
+            except ConversionError:
+                worker.stop(graceful=False)
+                raise
+            finally:
+                worker.conversions += 1
+                if worker.conversions >= settings.LIBREOFFICE_MAX_CONVERSIONS:
+                    worker.stop()
+                self._idle.put(worker)
+
+            if "error" in reply:
+                raise ConversionError(reply["error"])
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+_pool: Optional[OfficePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_office_pool() -> OfficePool:
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = OfficePool(
+                size=settings.LIBREOFFICE_POOL_SIZE,
+                max_waiting=settings.LIBREOFFICE_QUEUE_SIZE,
+            )
+        return _pool
+
+
+@functools.cache
+def converter_version() -> str:
+    """
+    Short hash of the LibreOffice build and CONVERTER_REVISION, used to key
+    cached conversions.
+    """
+    build = "unknown"
+    if LOEXE:
+        try:
+            build = subprocess.run(
+                [LOEXE, "--version"], capture_output=True, text=True, timeout=60
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            pass
+    return hashlib.sha256(f"{build}|{CONVERTER_REVISION}".encode()).hexdigest()[:12]
+
+
+def _convert_once(filein: Path, cancel: Optional[threading.Event] = None):
+    """One-off soffice process with a throwaway profile (pool disabled)."""
+    with tempfile.TemporaryDirectory() as profile:
+        cmd = [
+            LOEXE,
+            f"-env:UserInstallation={Path(profile).as_uri()}",
+            "--convert-to",
+            "pdf",
+            "--outdir",
+            str(filein.parent),
+            str(filein),
+        ]
+        process = subprocess.Popen(
+            _limited(cmd, _rlimits(settings.LIBREOFFICE_RLIMIT_CPU_SECONDS)),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        deadline = time.monotonic() + settings.LIBREOFFICE_CONVERSION_TIMEOUT
+        while True:
+            try:
+                returncode = process.wait(timeout=_POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if cancel is not None and cancel.is_set():
+                _kill_group(process)
+                raise ConversionCancelledError("Conversion cancelled")
+            if time.monotonic() > deadline:
+                _kill_group(process)
+                raise ConversionTimeoutError("LibreOffice did not finish in time")
+
+    if returncode != 0:
+        raise ConversionError(f"LibreOffice exited with code {returncode}")
+
+
+def doc2pdf(filein: Path, cancel: Optional[threading.Event] = None):
+    """
+    Convert `filein` to a PDF next to it, with the same stem. Runs under
+    the LIBREOFFICE_RLIMIT_* limits and LIBREOFFICE_CONVERSION_TIMEOUT;
+    setting `cancel` kills the conversion.
+    """
     if not LOEXE:
         raise EnvironmentError("LibreOffice not found")
 
-    cmd = [LOEXE, "--convert-to", "pdf", "--outdir", str(filein.parent), str(filein)]
-
-    subprocess.check_call(cmd, stderr=subprocess.DEVNULL)
+    converter_stats.increment("conversions")
+    try:
+        if settings.LIBREOFFICE_POOL_SIZE <= 0:
+            _convert_once(filein, cancel)
+        else:
+            get_office_pool().convert(filein, filein.with_suffix(".pdf"), cancel)
+    except ConverterBusyError:
+        converter_stats.increment("rejections")
+        raise
+    except ConversionTimeoutError:
+        converter_stats.increment("timeouts")
+        raise
+    except ConversionCancelledError:
+        converter_stats.increment("cancellations")
+        raise
+    except ConversionError:
+        converter_stats.increment("failures")
+        raise
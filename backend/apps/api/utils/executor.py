@@ -0,0 +1,307 @@
+import asyncio
+import ctypes
+import functools
+import multiprocessing.util
+import os
+import sys
+import threading
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Optional, Union
+
+import pypdfium2 as pdfium
+from django.conf import settings
+
+from .mapped import MappedFile
+
+# A range function is called as func(doc, start, stop, *args) and returns a
+# list with one entry per page in [start, stop). It must be importable at module
+# level so the process backend can pickle it by reference.
+RangeFunc = Callable[..., list]
+
+# pdfium is not thread-safe: every call into it, from opening a document to
+# closing it, holds this lock.
+PDFIUM_LOCK = threading.RLock()
+
+_executor: Optional[Executor] = None
+_executor_backend: Optional[str] = None
+_executor_lock = threading.Lock()
+
+_cpu_executor: Optional[ProcessPoolExecutor] = None
+_cpu_executor_lock = threading.Lock()
+
+# Set in CPU pool workers to their share of PDF_ANALYSIS_WORKERS, so the page
+# analysis pools they start never add up to more than the setting.
+_analysis_workers: Optional[int] = None
+
+# Worker-side cache of open documents, keyed by shared memory name or path.
+_MAX_OPEN_DOCUMENTS = 2
+_worker_documents: dict[
+    str, tuple[Optional[shared_memory.SharedMemory], Any, pdfium.PdfDocument]
+] = {}
+
+
+def _resolve_backend() -> str:
+    """
+    `auto` picks threads on a free-threaded build (no GIL) and processes
+    everywhere else.
+    """
+    backend = settings.PDF_ANALYSIS_BACKEND
+    if backend == "auto":
+        gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)()
+        return "process" if gil_enabled else "thread"
+    if backend not in ("process", "thread"):
+        raise ValueError(f"Unknown PDF_ANALYSIS_BACKEND: {backend!r}")
+    return backend
+
+
+def get_executor() -> tuple[Executor, str]:
+    """Return the shared page-analysis pool and its backend, creating it lazily."""
+    global _executor, _executor_backend
+
+    with _executor_lock:
+        if _executor is None:
+            backend = _resolve_backend()
+            workers = _analysis_worker_count()
+            if backend == "thread":
+                _executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="pdf-analysis"
+                )
+            else:
+                _executor = ProcessPoolExecutor(max_workers=workers)
+            _executor_backend = backend
+        return _executor, _executor_backend
+
+
+def _reset_executor(wait: bool = False):
+    global _executor, _executor_backend
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
+        _executor_backend = None
+
+
+def _analysis_worker_count() -> int:
+    return _analysis_workers or settings.PDF_ANALYSIS_WORKERS
+
+
+def _init_cpu_worker(analysis_workers: int):
+    global _executor, _executor_backend, _executor_lock, _analysis_workers
+
+    # A forked worker inherits the parent's pool and lock, neither usable here.
+    _executor = None
+    _executor_backend = None
+    _executor_lock = threading.Lock()
+    _analysis_workers = analysis_workers
+    # Shut down the page analysis pool this worker may start before the worker
+    # exits, which otherwise waits on (and then orphans) the pool's processes.
+    multiprocessing.util.Finalize(
+        None, _reset_executor, kwargs={"wait": True}, exitpriority=10
+    )
+
+
+def get_cpu_executor() -> ProcessPoolExecutor:
+    """
+    The pool async views hand CPU-bound PDF work to, so it runs neither on
+    the event loop nor on Django's single thread for sync code. Pdfium is
+    not thread-safe, hence processes. Each worker shards large documents
+    over its share of PDF_ANALYSIS_WORKERS.
+    """
+    global _cpu_executor
+
+    with _cpu_executor_lock:
+        if _cpu_executor is None:
+            workers = settings.PDF_CPU_WORKERS
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_cpu_worker,
+                initargs=(max(1, settings.PDF_ANALYSIS_WORKERS // workers),),
+            )
+        return _cpu_executor
+
+
+def _reset_cpu_executor():
+    global _cpu_executor
+
+    with _cpu_executor_lock:
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=False, cancel_futures=True)
+        _cpu_executor = None
+
+
+async def run_cpu(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Await `func(*args, **kwargs)` on the CPU pool. Arguments and the result
+    are pickled, so pass paths or bytes rather than uploads.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            get_cpu_executor(), functools.partial(func, *args, **kwargs)
+        )
+    except BrokenProcessPool:
+        _reset_cpu_executor()
+        raise
+
+
+def call_cpu(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """`run_cpu` for sync callers: block on `func(*args, **kwargs)` on the CPU pool."""
+    try:
+        return get_cpu_executor().submit(func, *args, **kwargs).result()
+    except BrokenProcessPool:
+        _reset_cpu_executor()
+        raise
+
+
+def submit_cpu(func: Callable[..., Any], *args, **kwargs) -> Future:
+    """
+    Start `func(*args, **kwargs)` on the CPU pool without waiting for it, for
+    work nobody is waiting on. A pool broken by an earlier call is replaced
+    rather than reported. Check the returned future for the outcome.
+    """
+    try:
+        return get_cpu_executor().submit(func, *args, **kwargs)
+    except BrokenProcessPool:
+        _reset_cpu_executor()
+        return get_cpu_executor().submit(func, *args, **kwargs)
+
+
+def map_cpu(func: Callable[..., Any], calls: list[tuple]) -> list:
+    """
+    `func(*args)` for each args tuple in `calls`, run concurrently on the CPU
+    pool and returned in order, for sync callers. An exception raised by one
+    call is returned in its place so that the others are still reported.
+    """
+    executor = get_cpu_executor()
+    futures = [executor.submit(func, *args) for args in calls]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except BrokenProcessPool:
+            _reset_cpu_executor()
+            raise
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def page_ranges(page_count: int, chunk_size: int) -> list[tuple[int, int]]:
+    """Split [0, page_count) into consecutive [start, stop) chunks."""
+    chunk_size = max(1, chunk_size)
+    return [
+        (start, min(start + chunk_size, page_count))
+        for start in range(0, page_count, chunk_size)
+    ]
+
+
+def should_parallelize(page_count: int) -> bool:
+    return (
+        _analysis_worker_count() > 1 and page_count > settings.PDF_ANALYSIS_CHUNK_SIZE
+    )
+
+
+def _open_worker_document(key: str, size: Optional[int]) -> pdfium.PdfDocument:
+    """
+    Open (once per worker) a document that lives in a shared memory segment
+    named `key` of `size` bytes, or on disk at path `key` when size is None.
+    """
+    cached = _worker_documents.get(key)
+    if cached is not None:
+        return cached[2]
+
+    while len(_worker_documents) >= _MAX_OPEN_DOCUMENTS:
+        _close_worker_document(next(iter(_worker_documents)))
+
+    if size is None:
+        segment, buffer = None, None
+        doc = pdfium.PdfDocument(key)
+    else:
+        segment = shared_memory.SharedMemory(name=key, track=False)
+        buffer = (ctypes.c_char * size).from_buffer(segment.buf)
+        doc = pdfium.PdfDocument(buffer)
+    _worker_documents[key] = (segment, buffer, doc)
+    return doc
+
+
+def _close_worker_document(key: str):
+    segment, buffer, doc = _worker_documents.pop(key)
+    doc.close()
+    del buffer
+    if segment is not None:
+        segment.close()
+
+
+def _run_in_worker(
+    key: str, size: Optional[int], func: RangeFunc, start: int, stop: int, args: tuple
+) -> list:
+    doc = _open_worker_document(key, size)
+    return func(doc, start, stop, *args)
+
+
+def _gather(futures: list) -> list:
+    try:
+        return [item for future in futures for item in future.result()]
+    except BrokenProcessPool:
+        _reset_executor()
+        raise
+
+
+def map_page_ranges(
+    doc: pdfium.PdfDocument,
+    source: Union[bytes, str, os.PathLike, MappedFile],
+    func: RangeFunc,
+    *args,
+) -> list:
+    """
+    Run `func` over every page of `doc`, sharded into chunks of
+    PDF_ANALYSIS_CHUNK_SIZE pages, and return the results in page order.
+
+    Thread workers share the already-open `doc`. Process workers open the
+    file at `source` when it is a path or a mapped file, or attach to a shared
+    memory copy of it when it is bytes, instead of receiving pickled bytes.
+    """
+    with PDFIUM_LOCK:
+        page_count = len(doc)
+    if not should_parallelize(page_count):
+        return func(doc, 0, page_count, *args)
+
+    executor, backend = get_executor()
+    ranges = page_ranges(page_count, settings.PDF_ANALYSIS_CHUNK_SIZE)
+
+    if backend == "thread":
+        return _gather(
+            [executor.submit(func, doc, start, stop, *args) for start, stop in ranges]
+        )
+
+    if not isinstance(source, bytes):
+        path = source.path if isinstance(source, MappedFile) else os.fspath(source)
+        return _gather(
+            [
+                executor.submit(_run_in_worker, path, None, func, start, stop, args)
+                for start, stop in ranges
+            ]
+        )
+
+    segment = shared_memory.SharedMemory(create=True, size=len(source))
+    try:
+        segment.buf[: len(source)] = source
+        return _gather(
+            [
+                executor.submit(
+                    _run_in_worker, segment.name, len(source), func, start, stop, args
+                )
+                for start, stop in ranges
+            ]
+        )
+    finally:
+        segment.close()
+        segment.unlink()
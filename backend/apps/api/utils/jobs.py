@@ -0,0 +1,47 @@
+from typing import Annotated, Optional
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import JsonResponse
+from ninja import Form
+from ninja.files import UploadedFile
+
+from apps.jobs.models import Job, JobInput
+
+# `async=true` on a heavy endpoint queues the work and answers 202 with a job
+# id; poll /api/jobs/{id} and fetch /api/jobs/{id}/result when it succeeded.
+AsyncFlag = Annotated[bool, Form(alias="async")]
+
+
+def enqueue_job(
+    kind: str,
+    files: list[UploadedFile],
+    params: Optional[dict] = None,
+    user: Optional[User] = None,
+) -> Job:
+    """
+    Store the uploads as the inputs of a new queued job. Spooled uploads are
+    moved into storage rather than copied, and keep their receive-time digest.
+    """
+    with transaction.atomic():
+        job = Job.objects.create(kind=kind, params=params or {}, user=user)
+        JobInput.objects.bulk_create(
+            JobInput(
+                job=job,
+                file=uploaded_file,
+                name=uploaded_file.name or "upload",
+                sha256=getattr(uploaded_file, "sha256", ""),
+            )
+            for uploaded_file in files
+        )
+    return job
+
+
+def job_accepted(job: Job) -> JsonResponse:
+    status_url = f"/api/jobs/{job.pk}"
+    response = JsonResponse(
+        {"job_id": str(job.pk), "status": job.status, "status_url": status_url},
+        status=202,
+    )
+    response["Location"] = status_url
+    return response
@@ -0,0 +1,47 @@
+"""
+Stored PDFs mapped into memory instead of read into it. A mapping is backed
+by the OS page cache, so workers analyzing the same file share one copy of
+its pages rather than each holding a private one.
+"""
+
+import ctypes
+import mmap
+import os
+from typing import Union
+
+
+class MappedFile(mmap.mmap):
+    """
+    A copy-on-write mapping of the file at `path`. pdfium and PyMuPDF need a
+    writable buffer but never write to it, so every page stays shared. It
+    pickles as its path: a CPU pool worker maps the file again rather than
+    receiving its content.
+    """
+
+    path: str
+
+    def __reduce__(self):
+        return map_file, (self.path,)
+
+    def as_ctypes(self) -> ctypes.Array:
+        """The mapping as a ctypes array, the form pdfium loads from memory."""
+        return (ctypes.c_char * len(self)).from_buffer(self)
+
+    def close(self):
+        try:
+            super().close()
+        except BufferError:
+            # A document opened on it is still alive; the mapping goes when
+            # that document is collected.
+            pass
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def map_file(path: Union[str, os.PathLike]) -> MappedFile:
+    """Map a non-empty file (writes never reach it). Close it, or use it in `with`."""
+    with open(path, "rb") as f:
+        mapped = MappedFile(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    mapped.path = os.fspath(path)
+    return mapped
@@ -0,0 +1,121 @@
+"""
+Generated files (split, filtered and converted PDFs, zips) are written to disk
+instead of being built in memory, and streamed back to the client in chunks,
+so what a request holds in memory does not grow with the document.
+"""
+
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO, Generator, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_DONE = object()
+
+
+@dataclass(frozen=True)
+class OutputFile:
+    """
+    A generated file on disk. Cached outputs are shared and left in place;
+    `temporary` ones belong to whoever receives them and are removed once
+    opened. Only the path is pickled, so the CPU pool hands back no content.
+    """
+
+    path: str
+    temporary: bool = False
+
+    def open(self) -> BinaryIO:
+        file = open(self.path, "rb")
+        if self.temporary:
+            # The open handle keeps the data readable until it is closed.
+            os.unlink(self.path)
+        return file
+
+    def discard(self):
+        if self.temporary:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def new_temp_path(suffix: str = "", directory: Optional[str] = None) -> str:
+    """An empty file to write an output to, next to the spooled uploads by default."""
+    fd, path = tempfile.mkstemp(
+        suffix=suffix, dir=directory or settings.FILE_UPLOAD_TEMP_DIR
+    )
+    os.close(fd)
+    return path
+
+
+def write_temp_output(data: bytes, suffix: str = "") -> OutputFile:
+    path = new_temp_path(suffix)
+    with open(path, "wb") as f:
+        f.write(data)
+    return OutputFile(path, temporary=True)
+
+
+async def _read_chunks(file: BinaryIO, chunk_size: int) -> AsyncIterator[bytes]:
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while chunk := await read(chunk_size):
+            yield chunk
+    finally:
+        file.close()
+
+
+async def iterate_in_thread(
+    iterator: Generator[bytes, None, None],
+    cancel: Optional[threading.Event] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Drive a blocking generator from worker threads one item at a time. The
+    ASGI handler collects synchronous iterators into a list before sending
+    anything, which would hold the whole body in memory. `cancel` is set if
+    the response stops before the generator is exhausted.
+    """
+    next_item = sync_to_async(next, thread_sensitive=False)
+    finished = False
+    try:
+        while (item := await next_item(iterator, _DONE)) is not _DONE:
+            yield item
+        finished = True
+    finally:
+        if cancel is not None and not finished:
+            cancel.set()
+        try:
+            await sync_to_async(iterator.close, thread_sensitive=False)()
+        except ValueError:
+            # Still running in a worker thread; it is closed when collected.
+            pass
+
+
+def file_response(
+    file: BinaryIO,
+    filename: str,
+    content_type: str,
+    attachment: bool = False,
+    size: Optional[int] = None,
+) -> StreamingHttpResponse:
+    """Stream an open file in STREAM_CHUNK_SIZE pieces, closing it at the end."""
+    if size is None:
+        size = os.fstat(file.fileno()).st_size
+    response = StreamingHttpResponse(
+        _read_chunks(file, STREAM_CHUNK_SIZE), content_type=content_type
+    )
+    response["Content-Length"] = str(size)
+    disposition = "attachment" if attachment else "inline"
+    response["Content-Disposition"] = f'{disposition}; filename="{filename}"'
+    return response
+
+
+def output_response(
+    output: OutputFile, filename: str, content_type: str, attachment: bool = False
+) -> StreamingHttpResponse:
+    return file_response(output.open(), filename, content_type, attachment)
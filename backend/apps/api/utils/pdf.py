@@ -1,28 +1,640 @@
-import io
+import ctypes
+import json
+import math
+import mmap
+import os
+import zipfile
+from dataclasses import dataclass
 from io import BytesIO
-from typing import Optional
+from typing import Callable, Optional, Union
 
 import fitz
+import numpy as np
 import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+from django.conf import settings
 from ninja.files import UploadedFile
-from pypdf import PdfReader, PdfWriter
+from pypdf import PdfReader
 from pypdf.errors import PdfReadError
 
+from .cache import AnalysisCache, get_analysis_cache, pdf_digest
+from .executor import PDFIUM_LOCK, map_page_ranges
+from .mapped import MappedFile
+from .output import OutputFile, new_temp_path
+from .uploads import spooled_source
+from .xref import XrefError, fast_page_count
 
-def extract_non_blank_pages(doc: fitz.Document, text_threshold: int = 10) -> list[int]:
+# Raw bytes, a path to a PDF on disk such as a spooled upload, or a stored
+# file mapped into memory (see apps.queue.storage).
+PdfSource = Union[bytes, str, os.PathLike, MappedFile]
+
+
+def _reader_input(source: PdfSource):
+    """Wrap bytes for pypdf, which otherwise expects a path or stream."""
+    if isinstance(source, MappedFile):
+        return source.path
+    return BytesIO(source) if isinstance(source, bytes) else source
+
+
+def _open_fitz(source: PdfSource) -> fitz.Document:
+    if isinstance(source, bytes):
+        return fitz.open("pdf", source)
+    if isinstance(source, MappedFile):
+        return fitz.open("pdf", memoryview(source))
+    return fitz.open(source, filetype="pdf")
+
+
+@dataclass(frozen=True)
+class PageInfo:
+    """
+    Classification of a single page.
+    `is_color` / `is_blank` are None when that check was not requested.
+    `rendered` is True when the color verdict needed rasterization.
+    """
+
+    index: int
+    width: float
+    height: float
+    is_color: Optional[bool] = None
+    is_blank: Optional[bool] = None
+    rendered: bool = False
+
+
+@dataclass(frozen=True)
+class DocumentAnalysis:
+    """Per-page classification of a whole document, as built by `classify_pages`."""
+
+    pages: list[PageInfo]
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def color_pages(self) -> list[int]:
+        return [page.index for page in self.pages if page.is_color]
+
+    @property
+    def grayscale_pages(self) -> list[int]:
+        return [page.index for page in self.pages if page.is_color is False]
+
+    @property
+    def non_blank_pages(self) -> list[int]:
+        return [page.index for page in self.pages if page.is_blank is False]
+
+    @property
+    def blank_pages(self) -> list[int]:
+        return [page.index for page in self.pages if page.is_blank]
+
+    @property
+    def rendered_pages(self) -> int:
+        """How many pages fell back to rasterization for color detection."""
+        return sum(1 for page in self.pages if page.rendered)
+
+
+# Paths painted at or above this level on every channel are treated as the
+# paper itself (e.g. white background rectangles) and do not make a page
+# non-blank.
+_PAPER_LEVEL = 250
+
+
+def _is_inked_path(path: pdfium.PdfObject) -> bool:
+    """Whether a path is filled or stroked with anything but paper white."""
+    fill_mode, stroke = ctypes.c_int(), ctypes.c_int()
+    if not pdfium_c.FPDFPath_GetDrawMode(path, fill_mode, stroke):
+        return True
+
+    getters = []
+    if fill_mode.value != pdfium_c.FPDF_FILLMODE_NONE:
+        getters.append(pdfium_c.FPDFPageObj_GetFillColor)
+    if stroke.value:
+        getters.append(pdfium_c.FPDFPageObj_GetStrokeColor)
+
+    for getter in getters:
+        red, green, blue, alpha = (ctypes.c_uint() for _ in range(4))
+        if not getter(path, red, green, blue, alpha):
+            return True  # pattern or other non-RGB paint
+        if alpha.value and min(red.value, green.value, blue.value) < _PAPER_LEVEL:
+            return True
+    return False
+
+
+def _is_blank_page(page: pdfium.PdfPage, text_threshold: int = 10) -> bool:
+    """
+    A page is non-blank if it draws an image, a shading or a non-white
+    path within the page box, or has > `text_threshold` chars of text.
+
+    Everything but the text count comes from the parsed page objects; text
+    is only extracted when text objects are all that is left to decide on.
+    """
+    left, bottom, right, top = page.get_bbox()
+    has_text = False
+    for obj in page.get_objects():
+        kind = obj.type
+        if kind == pdfium_c.FPDF_PAGEOBJ_TEXT:
+            has_text = True
+            continue
+        if kind not in (
+            pdfium_c.FPDF_PAGEOBJ_IMAGE,
+            pdfium_c.FPDF_PAGEOBJ_SHADING,
+            pdfium_c.FPDF_PAGEOBJ_PATH,
+        ):
+            continue
+        if kind == pdfium_c.FPDF_PAGEOBJ_PATH and not _is_inked_path(obj):
+            continue
+
+        try:
+            obj_left, obj_bottom, obj_right, obj_top = obj.get_bounds()
+        except pdfium.PdfiumError:
+            return False
+        if (
+            obj_left <= right
+            and obj_right >= left
+            and obj_bottom <= top
+            and obj_top >= bottom
+        ):
+            return False
+
+    if not has_text:
+        return True
+
+    textpage = page.get_textpage()
+    try:
+        text = textpage.get_text_range().strip()
+    finally:
+        textpage.close()
+    return len(text) <= text_threshold
+
+
+_GRAY_COLORSPACES = (
+    pdfium_c.FPDF_COLORSPACE_DEVICEGRAY,
+    pdfium_c.FPDF_COLORSPACE_CALGRAY,
+)
+_FILL_TEXT_MODES = (
+    pdfium_c.FPDF_TEXTRENDERMODE_FILL,
+    pdfium_c.FPDF_TEXTRENDERMODE_FILL_STROKE,
+    pdfium_c.FPDF_TEXTRENDERMODE_FILL_CLIP,
+    pdfium_c.FPDF_TEXTRENDERMODE_FILL_STROKE_CLIP,
+)
+_STROKE_TEXT_MODES = (
+    pdfium_c.FPDF_TEXTRENDERMODE_STROKE,
+    pdfium_c.FPDF_TEXTRENDERMODE_FILL_STROKE,
+    pdfium_c.FPDF_TEXTRENDERMODE_STROKE_CLIP,
+    pdfium_c.FPDF_TEXTRENDERMODE_FILL_STROKE_CLIP,
+)
+
+
+def _is_saturated(red: int, green: int, blue: int, tolerance: int) -> bool:
+    """Single-color version of the saturation rule in `_is_color_bitmap`."""
+    high = max(red, green, blue)
+    chroma = high - min(red, green, blue)
+    return chroma > 0 and chroma * 255 >= high * (tolerance + 1)
+
+
+def _object_color(obj: pdfium.PdfObject, getter, tolerance: int) -> Optional[bool]:
+    """
+    Color verdict for an object's fill or stroke color; None if pdfium cannot
+    express it as RGB (e.g. pattern color spaces).
+    """
+    red, green, blue, alpha = (ctypes.c_uint() for _ in range(4))
+    if not getter(obj, red, green, blue, alpha):
+        return None
+    return _is_saturated(red.value, green.value, blue.value, tolerance)
+
+
+def _is_gray_image(image: pdfium.PdfImage) -> bool:
+    try:
+        metadata = image.get_metadata()
+    except pdfium.PdfiumError:
+        return False
+    if metadata.colorspace in _GRAY_COLORSPACES:
+        return True
+    # ICC profiles with a single component (N=1) carry at most 16 bits/pixel.
+    return (
+        metadata.colorspace == pdfium_c.FPDF_COLORSPACE_ICCBASED
+        and 0 < metadata.bits_per_pixel <= 16
+    )
+
+
+def _has_visible_annotations(page: pdfium.PdfPage) -> bool:
+    for i in range(pdfium_c.FPDFPage_GetAnnotCount(page)):
+        annot = pdfium_c.FPDFPage_GetAnnot(page, i)
+        try:
+            if pdfium_c.FPDFAnnot_GetSubtype(annot) != pdfium_c.FPDF_ANNOT_LINK:
+                return True
+        finally:
+            pdfium_c.FPDFPage_CloseAnnot(annot)
+    return False
+
+
+def _on_page(
+    obj: pdfium.PdfObject,
+    transform: Optional[pdfium.PdfMatrix],
+    box: tuple[float, float, float, float],
+) -> Optional[bool]:
+    """
+    Whether `obj` overlaps the page `box`; None if pdfium cannot locate it.
+    Bounds are in the space of the form holding the object, which
+    `transform` maps to the page.
+    """
+    try:
+        left, bottom, right, top = obj.get_bounds()
+    except pdfium.PdfiumError:
+        return None
+    if transform is not None:
+        left, bottom, right, top = transform.on_rect(left, bottom, right, top)
+    return left < box[2] and right > box[0] and bottom < box[3] and top > box[1]
+
+
+def _structural_page_color(page: pdfium.PdfPage, tolerance: int) -> Optional[bool]:
+    """
+    Classify a page from its parsed content stream, without rendering: the
+    fill/stroke colors set by rg/k/sc/scn & co. on text and paths, and the
+    color spaces of embedded images. Objects outside the page box are never
+    rendered and are skipped.
+
+    Returns None when only rendering can tell: shadings, patterns,
+    transparency, non-gray images (which may still be neutral) or
+    annotations drawn on top of the content.
+    """
+    box = page.get_bbox()
+    # Form space to page space, by nesting level of the objects in the form.
+    transforms: dict[int, Optional[pdfium.PdfMatrix]] = {0: None}
+    ambiguous = False
+    for obj in page.get_objects():
+        kind = obj.type
+        getters = []
+
+        if kind == pdfium_c.FPDF_PAGEOBJ_FORM:
+            matrix, outer = obj.get_matrix(), transforms[obj.level]
+            transforms[obj.level + 1] = (
+                matrix if outer is None else matrix.multiply(outer)
+            )
+            continue
+        elif kind == pdfium_c.FPDF_PAGEOBJ_TEXT:
+            mode = pdfium_c.FPDFTextObj_GetTextRenderMode(obj)
+            if mode in _FILL_TEXT_MODES:
+                getters.append(pdfium_c.FPDFPageObj_GetFillColor)
+            if mode in _STROKE_TEXT_MODES:
+                getters.append(pdfium_c.FPDFPageObj_GetStrokeColor)
+        elif kind == pdfium_c.FPDF_PAGEOBJ_PATH:
+            fill_mode, stroke = ctypes.c_int(), ctypes.c_int()
+            if not pdfium_c.FPDFPath_GetDrawMode(obj, fill_mode, stroke):
+                ambiguous = True
+                continue
+            if fill_mode.value != pdfium_c.FPDF_FILLMODE_NONE:
+                getters.append(pdfium_c.FPDFPageObj_GetFillColor)
+            if stroke.value:
+                getters.append(pdfium_c.FPDFPageObj_GetStrokeColor)
+        elif kind == pdfium_c.FPDF_PAGEOBJ_IMAGE:
+            if (
+                not _is_gray_image(obj)
+                and _on_page(obj, transforms[obj.level], box) is not False
+            ):
+                ambiguous = True
+            continue
+        else:
+            ambiguous = True
+            continue
+
+        verdicts = [_object_color(obj, getter, tolerance) for getter in getters]
+        if not any(verdict is not False for verdict in verdicts):
+            continue
+        visible = _on_page(obj, transforms[obj.level], box)
+        if visible is False:
+            continue
+        if visible and True in verdicts:
+            return True
+        ambiguous = True
+
+    if ambiguous or pdfium_c.FPDFPage_HasTransparency(page):
+        return None
+    if _has_visible_annotations(page):
+        return None
+    return False
+
+
+@dataclass(frozen=True)
+class _ClassifyOptions:
+    """Per-call settings, resolved once in the caller and passed to workers."""
+
+    dpi: Optional[int]
+    tolerance: int
+    text_threshold: int
+    color: bool
+    blank: bool
+    color_method: str
+    pixel_budgets: tuple[int, ...]
+    saturation_margin: int
+
+
+def _render_scales(page: pdfium.PdfPage, options: _ClassifyOptions) -> list[float]:
+    """
+    A fixed `dpi` renders once. Otherwise each pixel budget (thumbnail first)
+    is turned into a scale for this page's size, so bitmap size does not
+    depend on page area.
+    """
+    if options.dpi:
+        return [options.dpi / 72.0]
+    width, height = page.get_size()
+    area = max(width * height, 1.0)
+    return [math.sqrt(budget / area) for budget in options.pixel_budgets]
+
+
+def _render_page_color(page: pdfium.PdfPage, options: _ClassifyOptions) -> bool:
+    """
+    Render progressively and stop as soon as the saturation is clear of the
+    tolerance threshold: zero (nothing colored at all) or above
+    tolerance + margin. Only results near the threshold, where downsampling
+    may have washed out small colored details, get a larger render.
+    """
+    with PDFIUM_LOCK:
+        scales = _render_scales(page, options)
+
+    for i, scale in enumerate(scales):
+        with PDFIUM_LOCK:
+            bitmap = page.render(scale=scale)
+        try:
+            saturation = _max_saturation(bitmap)
+        finally:
+            with PDFIUM_LOCK:
+                bitmap.close()
+
+        is_last = i == len(scales) - 1
+        if (
+            is_last
+            or saturation == 0
+            or saturation > options.tolerance + options.saturation_margin
+        ):
+            return saturation > options.tolerance
+    return False
+
+
+def _classify_page(
+    doc: pdfium.PdfDocument, index: int, options: _ClassifyOptions
+) -> PageInfo:
+    # pdfium is not thread-safe; only the NumPy color check runs unlocked.
+    with PDFIUM_LOCK:
+        page = doc[index]
+    try:
+        with PDFIUM_LOCK:
+            width, height = page.get_size()
+            is_color = None
+            if options.color and options.color_method == "structure":
+                is_color = _structural_page_color(page, options.tolerance)
+            is_blank = None
+            if options.blank:
+                is_blank = _is_blank_page(page, options.text_threshold)
+
+        rendered = options.color and is_color is None
+        if rendered:
+            is_color = _render_page_color(page, options)
+    finally:
+        with PDFIUM_LOCK:
+            page.close()
+
+    return PageInfo(
+        index=index,
+        width=width,
+        height=height,
+        is_color=is_color,
+        is_blank=is_blank,
+        rendered=rendered,
+    )
+
+
+def _classify_range(
+    doc: pdfium.PdfDocument, start: int, stop: int, options: _ClassifyOptions
+) -> list[PageInfo]:
+    """Classify pages [start, stop); called inline or from the analysis pool."""
+    return [_classify_page(doc, i, options) for i in range(start, stop)]
+
+
+def _open_pdfium(source: PdfSource) -> pdfium.PdfDocument:
+    if isinstance(source, MappedFile):
+        source = source.as_ctypes()
+    try:
+        with PDFIUM_LOCK:
+            return pdfium.PdfDocument(source)
+    except pdfium.PdfiumError as e:
+        if e.err_code == pdfium_c.FPDF_ERR_PASSWORD:
+            raise ValueError("Encrypted PDFs are not allowed.")
+        raise ValueError(f"Invalid or corrupted PDF: {str(e)}")
+
+
+def _close_pdfium(doc: pdfium.PdfDocument):
+    with PDFIUM_LOCK:
+        doc.close()
+
+
+def _analyze_document(
+    source: PdfSource,
+    options: _ClassifyOptions,
+    doc: Optional[pdfium.PdfDocument] = None,
+) -> list[PageInfo]:
+    if doc is not None:
+        return map_page_ranges(doc, source, _classify_range, options)
+    doc = _open_pdfium(source)
+    try:
+        return map_page_ranges(doc, source, _classify_range, options)
+    finally:
+        _close_pdfium(doc)
+
+
+def _color_key(color_method: str, dpi: Optional[int], tolerance: int) -> str:
+    """Identifies a color classification by everything that can change it."""
+    pixel_budgets = tuple(settings.PDF_RENDER_PIXEL_BUDGETS)
+    resolution = dpi or "px" + "-".join(map(str, pixel_budgets))
+    # v2: the structure method skips objects outside the page box.
+    return f"{color_method}-v2-{resolution}-{tolerance}"
+
+
+def classify_pages(
+    source: PdfSource,
+    dpi: Optional[int] = None,
+    tolerance: int = 5,
+    text_threshold: int = 10,
+    color: bool = True,
+    blank: bool = True,
+    digest: Optional[str] = None,
+    color_method: Optional[str] = None,
+    doc: Optional[pdfium.PdfDocument] = None,
+) -> DocumentAnalysis:
+    """
+    Open the document once and classify every page (color / blank / size).
+    With the "structure" color method (PDF_COLOR_DETECTION), pages are
+    rendered only when their content stream is ambiguous. Renders follow the
+    PDF_RENDER_PIXEL_BUDGETS policy unless a fixed `dpi` is given.
+    Large documents are sharded across the page-analysis pool, and results
+    are cached by content hash so repeat uploads skip the work.
+    Pass `doc`, an open pdfium document of `source`, to analyze it instead
+    of parsing the source again.
+    Raises ValueError on invalid/encrypted/corrupted PDFs.
     """
-    Analyze a PDF document and return indices of non-blank pages.
-    A page is non-blank if it has > `text_threshold` chars or contains images.
+    cache = get_analysis_cache()
+    digest = digest or pdf_digest(source)
+    color_method = color_method or settings.PDF_COLOR_DETECTION
+    color_key = f"color-{_color_key(color_method, dpi, tolerance)}.json"
+    blank_key = f"blank-v2-{text_threshold}.json"
+
+    sizes = cache.get_json(digest, "sizes.json")
+    colors = cache.get_json(digest, color_key) if color else None
+    rendered = None
+    if colors is not None:
+        colors, rendered = colors["colors"], colors["rendered"]
+    blanks = cache.get_json(digest, blank_key) if blank else None
+
+    need_color = color and colors is None
+    need_blank = blank and blanks is None
+    if sizes is None or need_color or need_blank:
+        options = _ClassifyOptions(
+            dpi=dpi,
+            tolerance=tolerance,
+            text_threshold=text_threshold,
+            color=need_color,
+            blank=need_blank,
+            color_method=color_method,
+            pixel_budgets=tuple(settings.PDF_RENDER_PIXEL_BUDGETS),
+            saturation_margin=settings.PDF_RENDER_SATURATION_MARGIN,
+        )
+        pages = _analyze_document(source, options, doc)
+        sizes = [[page.width, page.height] for page in pages]
+        cache.set_json(digest, "sizes.json", sizes)
+        cache.set_json(digest, "page-count.json", len(pages))
+        if need_color:
+            colors = [page.is_color for page in pages]
+            rendered = [page.rendered for page in pages]
+            cache.set_json(digest, color_key, {"colors": colors, "rendered": rendered})
+        if need_blank:
+            blanks = [page.is_blank for page in pages]
+            cache.set_json(digest, blank_key, blanks)
+
+    return DocumentAnalysis(
+        pages=[
+            PageInfo(
+                index=i,
+                width=width,
+                height=height,
+                is_color=colors[i] if color else None,
+                is_blank=blanks[i] if blank else None,
+                rendered=rendered[i] if color else False,
+            )
+            for i, (width, height) in enumerate(sizes)
+        ]
+    )
+
+
+def color_page_map(
+    source: PdfSource,
+    dpi: Optional[int] = None,
+    tolerance: int = 5,
+    digest: Optional[str] = None,
+) -> dict:
+    """Color and grayscale page indices without building any output PDF."""
+    analysis = classify_pages(
+        source, dpi=dpi, tolerance=tolerance, blank=False, digest=digest
+    )
+    return {
+        "page_count": analysis.page_count,
+        "color_count": len(analysis.color_pages),
+        "grayscale_count": len(analysis.grayscale_pages),
+        "color_pages": analysis.color_pages,
+        "grayscale_pages": analysis.grayscale_pages,
+    }
+
+
+def blank_page_map(
+    source: PdfSource, text_threshold: int = 10, digest: Optional[str] = None
+) -> dict:
+    """Blank and non-blank page indices without building any output PDF."""
+    analysis = classify_pages(
+        source, text_threshold=text_threshold, color=False, digest=digest
+    )
+    return {
+        "page_count": analysis.page_count,
+        "non_blank_count": len(analysis.non_blank_pages),
+        "blank_count": len(analysis.blank_pages),
+        "non_blank_pages": analysis.non_blank_pages,
+        "blank_pages": analysis.blank_pages,
+    }
+
+
+def first_color_page(
+    source: PdfSource,
+    dpi: Optional[int] = None,
+    tolerance: int = 5,
+    digest: Optional[str] = None,
+) -> Optional[int]:
+    """
+    Index of the first color page, or None for an all-grayscale document.
+    Pages are checked in order and the scan stops at the first color page,
+    so a document-level verdict does not pay for classifying every page.
+    Raises ValueError on invalid/encrypted/corrupted PDFs.
     """
-    non_blank_indices = []
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        text = page.get_text("text").strip()
-        images = page.get_images(full=True)
+    cache = get_analysis_cache()
+    digest = digest or pdf_digest(source)
+    color_method = settings.PDF_COLOR_DETECTION
+    key = _color_key(color_method, dpi, tolerance)
+
+    # A full classification already answers the question.
+    colors = cache.get_json(digest, f"color-{key}.json")
+    if colors is not None:
+        return next((i for i, c in enumerate(colors["colors"]) if c), None)
+    cached = cache.get_json(digest, f"first-color-{key}.json")
+    if cached is not None:
+        return cached["index"]
+
+    options = _ClassifyOptions(
+        dpi=dpi,
+        tolerance=tolerance,
+        text_threshold=0,
+        color=True,
+        blank=False,
+        color_method=color_method,
+        pixel_budgets=tuple(settings.PDF_RENDER_PIXEL_BUDGETS),
+        saturation_margin=settings.PDF_RENDER_SATURATION_MARGIN,
+    )
+    doc = _open_pdfium(source)
+    try:
+        with PDFIUM_LOCK:
+            page_count = len(doc)
+        index = next(
+            (i for i in range(page_count) if _classify_page(doc, i, options).is_color),
+            None,
+        )
+    finally:
+        _close_pdfium(doc)
 
-        if len(text) > text_threshold or len(images) > 0:
-            non_blank_indices.append(page_num)
-    return non_blank_indices
+    cache.set_json(digest, f"first-color-{key}.json", {"index": index})
+    return index
+
+
+def _cached_output(
+    source: PdfSource,
+    name: str,
+    build: Callable[[str], None],
+    digest: Optional[str] = None,
+) -> OutputFile:
+    """
+    Return a generated PDF from the cache, building and storing it on a miss.
+    `build` writes the PDF to the path it is given.
+    """
+    cache = get_analysis_cache()
+    digest = digest or pdf_digest(source)
+    output = cache.get_file(digest, name)
+    if output is None:
+        output = cache.store_file(digest, name, _build_file(cache, build))
+    return output
+
+
+def _build_file(cache: AnalysisCache, build: Callable[[str], None]) -> str:
+    path = cache.new_file(".pdf")
+    try:
+        build(path)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
 
 
 def generate_summary(filename: str, total_pages: int, non_blank_pages: int) -> dict:
@@ -36,114 +648,365 @@ def generate_summary(filename: str, total_pages: int, non_blank_pages: int) -> d
     }
 
 
-def generate_filtered_pdf(doc: fitz.Document, non_blank_indices: list[int]) -> bytes:
-    """Create a new PDF containing only the specified page indices."""
+def _page_runs(indices: list[int]) -> list[tuple[int, int]]:
+    """Group sorted page indices into inclusive (first, last) runs."""
+    runs = []
+    for index in indices:
+        if runs and runs[-1][1] == index - 1:
+            runs[-1] = (runs[-1][0], index)
+        else:
+            runs.append((index, index))
+    return runs
+
+
+def generate_filtered_pdf(doc: fitz.Document, non_blank_indices: list[int], path: str):
+    """
+    Write a new PDF containing only the specified page indices to `path`,
+    copying each run of consecutive pages with a single insert_pdf call.
+    """
     new_doc = fitz.open()
     try:
-        for idx in non_blank_indices:
-            new_doc.insert_pdf(doc, from_page=idx, to_page=idx)
-        return new_doc.tobytes()
+        for first, last in _page_runs(non_blank_indices):
+            new_doc.insert_pdf(doc, from_page=first, to_page=last)
+        new_doc.save(path)
     finally:
         new_doc.close()
 
 
 def process_pdf_file(
     uploaded_file: UploadedFile, return_pdf: bool = False, text_threshold: int = 10
-) -> tuple[dict, Optional[bytes]]:
+) -> tuple[dict, Optional[OutputFile]]:
     """
     End-to-end PDF processing service.
-    Returns summary dict and optional filtered PDF bytes.
+    Returns summary dict and optional filtered PDF file.
     """
-    file_bytes = uploaded_file.read()
-    doc = fitz.open("pdf", file_bytes)
+    source, digest = spooled_source(uploaded_file)
+    return process_pdf_source(
+        source, uploaded_file.name or "unknown", return_pdf, text_threshold, digest
+    )
 
-    try:
-        total_pages = doc.page_count
-        non_blank_indices = extract_non_blank_pages(doc, text_threshold)
-        non_blank_count = len(non_blank_indices)
 
-        safe_filename = uploaded_file.name or "unknown"
-        summary = generate_summary(
-            filename=safe_filename,
-            total_pages=total_pages,
-            non_blank_pages=non_blank_count,
+def process_pdf_source(
+    source: PdfSource,
+    filename: str,
+    return_pdf: bool = False,
+    text_threshold: int = 10,
+    digest: Optional[str] = None,
+) -> tuple[dict, Optional[OutputFile]]:
+    """`process_pdf_file` for a path or bytes, e.g. on the CPU pool."""
+    analysis = classify_pages(
+        source, text_threshold=text_threshold, color=False, digest=digest
+    )
+    non_blank_indices = analysis.non_blank_pages
+
+    summary = generate_summary(
+        filename=filename,
+        total_pages=analysis.page_count,
+        non_blank_pages=len(non_blank_indices),
+    )
+
+    def build(path: str):
+        doc = _open_fitz(source)
+        try:
+            generate_filtered_pdf(doc, non_blank_indices, path)
+        finally:
+            doc.close()
+
+    filtered_pdf = None
+    if return_pdf:
+        filtered_pdf = _cached_output(
+            source, f"nonblank-v2-{text_threshold}.pdf", build, digest
         )
 
-        filtered_pdf_bytes = None
-        if return_pdf:
-            filtered_pdf_bytes = generate_filtered_pdf(doc, non_blank_indices)
+    return summary, filtered_pdf
 
-        return summary, filtered_pdf_bytes
 
-    finally:
-        if not doc.is_closed:
-            doc.close()
+def _fast_page_count(source: PdfSource) -> int:
+    if isinstance(source, (bytes, MappedFile)):
+        return fast_page_count(source)
+    with open(source, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            raise XrefError("Empty file")
+    with buffer:
+        return fast_page_count(buffer)
 
 
-def count_pdf_pages(pdf_bytes: bytes) -> int:
+def count_pdf_pages(source: PdfSource, digest: Optional[str] = None) -> int:
     """
-    Count pages in a PDF from raw bytes using pypdf.
+    Count pages in a PDF from raw bytes, a path or a mapped file.
     Raises ValueError on invalid/encrypted/corrupted PDFs.
+
+    The page tree is walked through the xref (on an mmap of the file for
+    paths) and checked against its /Count; encrypted or unusual files, and
+    trees whose /Count disagrees, go through pypdf, which counts leaf pages.
     """
+    cache = get_analysis_cache()
+    digest = digest or pdf_digest(source)
+    cached = cache.get_json(digest, "page-count.json")
+    if cached is not None:
+        return cached
+
+    try:
+        page_count = _fast_page_count(source)
+    except (XrefError, TypeError, ValueError, RecursionError):
+        # The reader checks what it reads; anything it still trips over is
+        # left to the full parser.
+        page_count = None
+    if page_count is not None:
+        cache.set_json(digest, "page-count.json", page_count)
+        return page_count
+
     try:
-        reader = PdfReader(io.BytesIO(pdf_bytes))
+        reader = PdfReader(_reader_input(source))
         if reader.is_encrypted:
             try:
                 reader.decrypt("")
             except Exception:
                 raise ValueError("Encrypted PDFs are not allowed.")
-        return len(reader.pages)
+        page_count = len(reader.pages)
     except (PdfReadError, ValueError, OSError, TypeError) as e:
         raise ValueError(f"Invalid or corrupted PDF: {str(e)}")
 
+    cache.set_json(digest, "page-count.json", page_count)
+    return page_count
 
-def _is_color_page(pil_img, tolerance: int = 5) -> bool:
-    if pil_img.mode in ("L", "1"):
-        return False
-    hsv = pil_img.convert("HSV")
-    _, s, _ = hsv.split()
-    return max(s.getdata()) > tolerance
 
+def _max_saturation(bitmap: pdfium.PdfBitmap) -> int:
+    """
+    Highest HSV saturation (0-255, as Pillow computes it) of any pixel.
+    Works on a NumPy view of the pdfium buffer, so no pixel data is copied.
+    """
+    if bitmap.n_channels == 1:
+        return 0
 
-def split_pdf_into_colored_pages(
-    pdf_bytes: bytes, dpi: int = 75, tolerance: int = 5
-) -> bytes:
-    """Return PDF with ONLY color pages (highly compressed)."""
-    src_render = pdfium.PdfDocument(pdf_bytes)
-    src_copy = PdfReader(BytesIO(pdf_bytes))
-    writer = PdfWriter()
+    pixels = bitmap.to_numpy()
+    c0, c1, c2 = pixels[:, :, 0], pixels[:, :, 1], pixels[:, :, 2]
+    high = np.maximum(np.maximum(c0, c1), c2)
+    chroma = high - np.minimum(np.minimum(c0, c1), c2)
+    if not chroma.any():
+        return 0
 
-    scale = dpi / 72.0
-    for i in range(len(src_render)):
-        bitmap = src_render[i].render(scale=scale)
-        pil_img = bitmap.to_pil()
-        if _is_color_page(pil_img, tolerance):
-            writer.add_page(src_copy.pages[i])
-        src_render[i].close()
-    src_render.close()
+    np.maximum(high, 1, out=high)
+    return int((chroma.astype(np.uint16) * 255 // high).max())
 
-    output = BytesIO()
-    writer.write(output)
-    return output.getvalue()
+
+def _is_color_bitmap(bitmap: pdfium.PdfBitmap, tolerance: int = 5) -> bool:
+    """True if any pixel's HSV saturation (0-255) exceeds `tolerance`."""
+    return _max_saturation(bitmap) > tolerance
+
+
+def _write_pages(doc: pdfium.PdfDocument, indices: list[int], path: str):
+    """
+    Copy the given pages of `doc` into a new PDF at `path`. pdfium imports
+    the page objects as they are, and pages that share fonts or images keep
+    referencing a single copy. No indices gives a PDF without pages.
+    """
+    with PDFIUM_LOCK:
+        output = pdfium.PdfDocument.new()
+        try:
+            # pdfium reads an empty page list as "every page".
+            if indices:
+                output.import_pages(doc, indices)
+            output.save(path)
+        finally:
+            output.close()
+
+
+def _split_output_name(kind: str, dpi: Optional[int], tolerance: int) -> str:
+    return f"{kind}-v2-{dpi or 'px'}-{tolerance}.pdf"
+
+
+def _split_outputs(
+    source: PdfSource,
+    kinds: list[str],
+    dpi: Optional[int],
+    tolerance: int,
+    digest: Optional[str],
+) -> tuple[list[OutputFile], Optional[DocumentAnalysis]]:
+    """
+    The "color" / "grayscale" outputs in `kinds`, from the cache or built
+    from a single pdfium parse of the source that serves both the page
+    analysis and the page copy. Also returns the analysis when anything had
+    to be built.
+    """
+    cache = get_analysis_cache()
+    digest = digest or pdf_digest(source)
+    names = [_split_output_name(kind, dpi, tolerance) for kind in kinds]
+    outputs = [cache.get_file(digest, name) for name in names]
+    missing = [i for i, output in enumerate(outputs) if output is None]
+    if not missing:
+        return outputs, None
+
+    doc = _open_pdfium(source)
+    try:
+        analysis = classify_pages(
+            source, dpi=dpi, tolerance=tolerance, blank=False, digest=digest, doc=doc
+        )
+        for i in missing:
+            pages = (
+                analysis.color_pages
+                if kinds[i] == "color"
+                else analysis.grayscale_pages
+            )
+            path = cache.new_file(".pdf")
+            try:
+                _write_pages(doc, pages, path)
+            except BaseException:
+                os.unlink(path)
+                raise
+            outputs[i] = cache.store_file(digest, names[i], path)
+    except BaseException:
+        for output in outputs:
+            if output is not None:
+                output.discard()
+        raise
+    finally:
+        _close_pdfium(doc)
+    return outputs, analysis
+
+
+def split_pdf_into_colored_pages(
+    source: PdfSource,
+    dpi: Optional[int] = None,
+    tolerance: int = 5,
+    digest: Optional[str] = None,
+) -> OutputFile:
+    """Return PDF with ONLY color pages (highly compressed)."""
+    outputs, _ = _split_outputs(source, ["color"], dpi, tolerance, digest)
+    return outputs[0]
 
 
 def split_pdf_into_black_and_white_pages(
-    pdf_bytes: bytes, dpi: int = 75, tolerance: int = 5
-) -> bytes:
+    source: PdfSource,
+    dpi: Optional[int] = None,
+    tolerance: int = 5,
+    digest: Optional[str] = None,
+) -> OutputFile:
     """Return PDF with ONLY grayscale pages (highly compressed)."""
-    src_render = pdfium.PdfDocument(pdf_bytes)
-    src_copy = PdfReader(BytesIO(pdf_bytes))
-    writer = PdfWriter()
-
-    scale = dpi / 72.0
-    for i in range(len(src_render)):
-        bitmap = src_render[i].render(scale=scale)
-        pil_img = bitmap.to_pil()
-        if not _is_color_page(pil_img, tolerance):
-            writer.add_page(src_copy.pages[i])
-        src_render[i].close()
-    src_render.close()
-
-    output = BytesIO()
-    writer.write(output)
-    return output.getvalue()
+    outputs, _ = _split_outputs(source, ["grayscale"], dpi, tolerance, digest)
+    return outputs[0]
+
+
+def split_pdf_by_color(
+    source: PdfSource,
+    dpi: Optional[int] = None,
+    tolerance: int = 5,
+    digest: Optional[str] = None,
+) -> OutputFile:
+    """
+    Return a zip with color.pdf, grayscale.pdf and a manifest.json mapping
+    source pages to each output. Pages are classified once and both PDFs
+    are built from the same parse of the source; outputs share the cache
+    entries of the single-output split functions.
+    """
+    digest = digest or pdf_digest(source)
+    outputs, analysis = _split_outputs(
+        source, ["color", "grayscale"], dpi, tolerance, digest
+    )
+    if analysis is None:
+        analysis = classify_pages(
+            source, dpi=dpi, tolerance=tolerance, blank=False, digest=digest
+        )
+
+    # Position i of each list is page i of that output.
+    manifest = {
+        "page_count": analysis.page_count,
+        "color": {"file": "color.pdf", "pages": analysis.color_pages},
+        "grayscale": {"file": "grayscale.pdf", "pages": analysis.grayscale_pages},
+    }
+
+    archive = new_temp_path(".zip")
+    try:
+        # PDFs are already compressed; storing them avoids a second deflate pass.
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf:
+            zf.write(outputs[0].path, "color.pdf")
+            zf.write(outputs[1].path, "grayscale.pdf")
+            zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+    except BaseException:
+        os.unlink(archive)
+        raise
+    finally:
+        for output in outputs:
+            output.discard()
+    return OutputFile(archive, temporary=True)
+
+
+def merge_pdfs(sources: list[tuple[str, PdfSource]]) -> OutputFile:
+    """
+    Concatenate (name, source) PDFs in order. Page objects are copied as
+    they are, without re-encoding content streams, and each source is closed
+    as soon as its pages are in; objects that several sources share (the
+    same font or image embedded in each) are stored once. Raises ValueError
+    naming the first source that is not a readable, unencrypted PDF.
+    """
+    merged = fitz.open()
+    try:
+        for name, source in sources:
+            try:
+                doc = _open_fitz(source)
+            except (RuntimeError, ValueError):
+                raise ValueError(f"{name}: invalid or corrupted PDF.")
+            try:
+                if doc.needs_pass and not doc.authenticate(""):
+                    raise ValueError(f"{name}: encrypted PDFs are not allowed.")
+                merged.insert_pdf(doc)
+            finally:
+                doc.close()
+
+        path = new_temp_path(".pdf")
+        try:
+            # garbage=4 merges identical objects across sources; streams are
+            # written as they were copied.
+            merged.save(path, garbage=4, deflate=False)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return OutputFile(path, temporary=True)
+    finally:
+        merged.close()
+
+
+def optimize_pdf(source: PdfSource, page_count: int) -> Optional[OutputFile]:
+    """
+    Rewrite a PDF losslessly for storage: unused objects dropped, identical
+    objects (fonts and images embedded more than once) merged, and
+    uncompressed streams deflated. The output is byte-for-byte the same for
+    the same input, so identical uploads still share a stored file.
+
+    Returns None, to keep the original, for encrypted or unreadable PDFs, if
+    the rewrite would not have `page_count` pages, or if it is no smaller.
+    """
+    try:
+        doc = _open_fitz(source)
+    except (RuntimeError, ValueError):
+        return None
+    try:
+        if doc.is_encrypted or doc.page_count != page_count:
+            return None
+        path = new_temp_path(".pdf")
+        try:
+            doc.save(
+                path,
+                garbage=4,
+                deflate=True,
+                deflate_images=True,
+                deflate_fonts=True,
+                use_objstms=settings.QUEUE_PDF_OBJECT_STREAMS,
+                no_new_id=True,
+            )
+        except BaseException:
+            os.unlink(path)
+            raise
+    finally:
+        doc.close()
+
+    if isinstance(source, (bytes, MappedFile)):
+        size = len(source)
+    else:
+        size = os.path.getsize(source)
+    if os.path.getsize(path) >= size:
+        os.unlink(path)
+        return None
+    return OutputFile(path, temporary=True)
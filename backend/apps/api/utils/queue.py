@@ -0,0 +1,148 @@
+import logging
+import os
+from decimal import Decimal
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+from ninja.files import UploadedFile
+
+from .executor import map_cpu
+from .output import OutputFile
+from .pdf import PdfSource, count_pdf_pages, optimize_pdf
+
+logger = logging.getLogger(__name__)
+
+COST_PER_PAGE = Decimal("1.0")
+
+
+class QueueUploadError(ValueError):
+    """Files that cannot be queued, as {"file": name, "error": message} items."""
+
+    def __init__(self, errors: list[dict]):
+        self.errors = errors
+        super().__init__(
+            "; ".join(f"{error['file']}: {error['error']}" for error in errors)
+        )
+
+
+def check_queue_upload(filename: Optional[str], size: Optional[int]):
+    """Raise ValueError unless the upload is a named, non-empty PDF."""
+    if not filename:
+        raise ValueError("Uploaded file has no name")
+    if not filename.lower().endswith(".pdf"):
+        raise ValueError(f"Only PDF files allowed. Invalid: {filename}")
+    if not size:
+        raise ValueError(f"File {filename} is empty.")
+
+
+def split_queue_uploads(
+    uploaded_files: list[UploadedFile],
+) -> tuple[list[UploadedFile], list[dict]]:
+    """
+    check_queue_upload for each upload: the uploads that pass, and an error
+    item for each one that does not.
+    """
+    accepted, errors = [], []
+    for uploaded_file in uploaded_files:
+        try:
+            check_queue_upload(uploaded_file.name, uploaded_file.size)
+        except ValueError as e:
+            errors.append({"file": uploaded_file.name or "", "error": str(e)})
+        else:
+            accepted.append(uploaded_file)
+    return accepted, errors
+
+
+def check_queue_uploads(uploaded_files: list[UploadedFile]):
+    """check_queue_upload for each upload, raising one QueueUploadError for all."""
+    _, errors = split_queue_uploads(uploaded_files)
+    if errors:
+        raise QueueUploadError(errors)
+
+
+def count_queue_pages(
+    filename: str, source: PdfSource, digest: Optional[str] = None
+) -> int:
+    """Page count of a file being queued. Raises ValueError if it has none."""
+    num_pages = count_pdf_pages(source, digest=digest)
+    if num_pages <= 0:
+        raise ValueError(f"No valid pages found in {filename}")
+    return num_pages
+
+
+def count_queue_files(files: list[tuple[str, PdfSource, Optional[str]]]) -> list[int]:
+    """
+    count_queue_pages for each (filename, source, digest), concurrently on the
+    CPU pool. Raises one QueueUploadError listing every file that failed.
+    """
+    results = map_cpu(count_queue_pages, files)
+    errors = []
+    for (filename, _, _), result in zip(files, results):
+        if isinstance(result, ValueError):
+            errors.append({"file": filename, "error": str(result)})
+        elif isinstance(result, Exception):
+            raise result
+    if errors:
+        raise QueueUploadError(errors)
+    return results
+
+
+class OptimizedUpload(File):
+    """
+    An optimized PDF in the shape file storage expects from a spooled upload,
+    so that it is moved into storage rather than copied.
+    """
+
+    def __init__(self, output: OutputFile, name: str):
+        super().__init__(None, name)
+        self._path = output.path
+
+    def temporary_file_path(self) -> str:
+        return self._path
+
+
+def optimize_queue_files(
+    files: list[tuple[str, PdfSource, int]],
+) -> list[Optional[OutputFile]]:
+    """
+    optimize_pdf for each (filename, source, page_count), concurrently on the
+    CPU pool, if QUEUE_OPTIMIZE_PDFS is set. None where the original is kept;
+    a file that fails to optimize is queued as it was uploaded.
+    """
+    if not settings.QUEUE_OPTIMIZE_PDFS:
+        return [None] * len(files)
+    results = map_cpu(
+        optimize_pdf, [(source, page_count) for _, source, page_count in files]
+    )
+    optimized = []
+    for (filename, _, _), result in zip(files, results):
+        if isinstance(result, Exception):
+            logger.warning("Could not optimize %s: %s", filename, result)
+            result = None
+        optimized.append(result)
+    return optimized
+
+
+def queue_file_fields(upload: File, size: int, optimized: Optional[OutputFile]) -> dict:
+    """Queue file fields for an upload of `size` bytes, stored optimized if it was."""
+    if optimized is None:
+        file, stored_size = upload, size
+    else:
+        file = OptimizedUpload(optimized, upload.name)
+        stored_size = os.path.getsize(optimized.path)
+    return {
+        "file": file,
+        "filename": upload.name,
+        "original_size": size,
+        "stored_size": stored_size,
+    }
+
+
+def queue_upload_summary(queue_ids: list[int], total_pages: int) -> dict:
+    return {
+        "message": f"{len(queue_ids)} file(s) queued successfully",
+        "total_pages": total_pages,
+        "queue_ids": queue_ids,
+        "total_charged_bdt": str(COST_PER_PAGE * total_pages),
+    }
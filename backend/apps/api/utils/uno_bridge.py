@@ -0,0 +1,154 @@
+"""
+UNO bridge for one long-lived LibreOffice instance.
+
+This script is NOT imported by the app: it runs under the system Python that
+has LibreOffice's UNO bindings (python3-uno), which the app's virtualenv
+cannot load. It starts a headless soffice with its own user profile, connects
+to it over a named pipe and then serves conversion requests read from stdin,
+one JSON object per line, answering each on stdout:
+
+    {"ping": true}                          -> {"ok": true}
+    {"input": "/a.docx", "output": "/a.pdf"} -> {"ok": true} | {"error": "..."}
+
+The first line written is {"ready": true} once soffice accepts connections.
+On EOF it shuts soffice down and exits.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import uno
+from com.sun.star.beans import PropertyValue
+from com.sun.star.connection import NoConnectException
+
+# Export filter per document type, checked in order.
+_PDF_FILTERS = (
+    ("com.sun.star.presentation.PresentationDocument", "impress_pdf_Export"),
+    ("com.sun.star.sheet.SpreadsheetDocument", "calc_pdf_Export"),
+    ("com.sun.star.drawing.DrawingDocument", "draw_pdf_Export"),
+    ("com.sun.star.text.GenericTextDocument", "writer_pdf_Export"),
+)
+
+
+def _property(name, value):
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+def _start_office(soffice, profile, pipe_name):
+    return subprocess.Popen(
+        [
+            soffice,
+            "--headless",
+            "--invisible",
+            "--nologo",
+            "--nodefault",
+            "--norestore",
+            "--nolockcheck",
+            "-env:UserInstallation=" + uno.systemPathToFileUrl(profile),
+            f"--accept=pipe,name={pipe_name};urp;StarOffice.ComponentContext",
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _connect(office, pipe_name, timeout):
+    local = uno.getComponentContext()
+    resolver = local.ServiceManager.createInstanceWithContext(
+        "com.sun.star.bridge.UnoUrlResolver", local
+    )
+    url = f"uno:pipe,name={pipe_name};urp;StarOffice.ComponentContext"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            context = resolver.resolve(url)
+            return context.ServiceManager.createInstanceWithContext(
+                "com.sun.star.frame.Desktop", context
+            )
+        except NoConnectException:
+            if office.poll() is not None:
+                raise RuntimeError(f"soffice exited with code {office.returncode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError("Timed out waiting for soffice to accept")
+            time.sleep(0.1)
+
+
+def _convert(desktop, source, target):
+    document = desktop.loadComponentFromURL(
+        uno.systemPathToFileUrl(source),
+        "_blank",
+        0,
+        (_property("Hidden", True), _property("ReadOnly", True)),
+    )
+    if document is None:
+        raise RuntimeError("Document could not be loaded")
+    try:
+        filter_name = next(
+            (
+                name
+                for service, name in _PDF_FILTERS
+                if document.supportsService(service)
+            ),
+            "writer_pdf_Export",
+        )
+        document.storeToURL(
+            uno.systemPathToFileUrl(target), (_property("FilterName", filter_name),)
+        )
+    finally:
+        document.close(True)
+
+
+def _reply(message):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--soffice", required=True)
+    parser.add_argument("--profile", required=True)
+    parser.add_argument("--pipe", required=True)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    office = _start_office(args.soffice, args.profile, args.pipe)
+    try:
+        desktop = _connect(office, args.pipe, args.startup_timeout)
+        _reply({"ready": True})
+
+        for line in sys.stdin:
+            request = json.loads(line)
+            if request.get("ping"):
+                # Touch the desktop so a hung or dead office fails the check.
+                desktop.getComponents()
+                _reply({"ok": True})
+                continue
+            try:
+                _convert(desktop, request["input"], request["output"])
+            except Exception as e:
+                if office.poll() is not None:
+                    raise
+                _reply({"error": str(e)})
+            else:
+                _reply({"ok": True})
+
+        try:
+            desktop.terminate()
+        except Exception:
+            pass
+    finally:
+        try:
+            office.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            office.kill()
+
+
+if __name__ == "__main__":
+    main()
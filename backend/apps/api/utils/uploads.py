@@ -0,0 +1,21 @@
+from typing import Optional, Union
+
+from ninja.files import UploadedFile
+
+
+def spooled_source(
+    uploaded_file: UploadedFile,
+) -> tuple[Union[bytes, str], Optional[str]]:
+    """
+    Return (source, digest) for an uploaded file.
+
+    Uploads spooled by HashingTemporaryFileUploadHandler are handed over as
+    their temporary path plus the digest computed while receiving; anything
+    else (e.g. an in-memory upload) falls back to its bytes.
+    """
+    if hasattr(uploaded_file, "temporary_file_path"):
+        return uploaded_file.temporary_file_path(), getattr(
+            uploaded_file, "sha256", None
+        )
+    uploaded_file.seek(0)
+    return uploaded_file.read(), None
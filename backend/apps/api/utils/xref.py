@@ -0,0 +1,546 @@
+"""
+Minimal PDF cross-reference reader.
+
+Just enough of the file structure to walk trailer -> /Root -> /Pages and
+its /Kids without loading page content: classic xref tables, xref streams,
+hybrid files, incremental updates (/Prev) and objects stored in object
+streams. Anything else (encryption, unsupported filters, broken offsets)
+raises XrefError so the caller can fall back to a full parser.
+"""
+
+import mmap
+import re
+import zlib
+from typing import Any, Callable, NamedTuple, Optional, Union
+
+Buffer = Union[bytes, mmap.mmap]
+
+_SPACE = re.compile(rb"(?:[ \t\r\n\f\x00]+|%[^\r\n]*)*")
+_NUMBER = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+_REF = re.compile(rb"(\d+)\s+(\d+)\s+R(?=[\s()<>\[\]{}/%]|\Z)")
+_NAME = re.compile(rb"/([^\s()<>\[\]{}/%\x00]*)")
+_KEYWORD = re.compile(rb"[A-Za-z]+")
+_OBJ_HEADER = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj")
+_XREF_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)")
+_XREF_ENTRY = re.compile(rb"(\d{10}) (\d{5}) ([nf])")
+_XREF_ENTRY_SIZE = 20
+# Tokens that open or close arrays, dictionaries and strings; hex strings are
+# matched whole so that their ">" is not read as half of ">>".
+_NESTED_DELIMITERS = re.compile(rb"<<|>>|<[^<>]*>|[\[\]()]")
+
+# How far from the end of the file to look for "startxref".
+_TAIL_SIZE = 2048
+# Deepest nesting of arrays and dictionaries, and of page tree levels,
+# accepted before giving up on a file.
+_MAX_NESTING = 64
+# Widest field of an xref stream entry, in bytes.
+_MAX_FIELD_WIDTH = 8
+
+
+class XrefError(Exception):
+    """The file cannot be read through its cross-reference data alone."""
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_count(value: Any) -> bool:
+    return _is_int(value) and value >= 0
+
+
+def _int_list(value: Any) -> bool:
+    return isinstance(value, list) and all(_is_count(item) for item in value)
+
+
+class Ref(NamedTuple):
+    num: int
+    gen: int
+
+
+class Stream(NamedTuple):
+    info: dict
+    start: int
+
+
+class _Parser:
+    """Parse direct PDF objects from `data` starting at `pos`."""
+
+    def __init__(self, data: Buffer, pos: int = 0, shallow: bool = False):
+        self.data = data
+        self.pos = pos
+        self.shallow = shallow
+        self.depth = 0
+
+    def skip_whitespace(self):
+        # Comments (%) run to the end of the line.
+        self.pos = _SPACE.match(self.data, self.pos).end()
+
+    def peek(self, length: int = 1) -> bytes:
+        return bytes(self.data[self.pos : self.pos + length])
+
+    def parse(self) -> Any:
+        self.skip_whitespace()
+        head = self.peek(2)
+        if not head:
+            raise XrefError("Unexpected end of data")
+
+        if head == b"<<":
+            if self.shallow and self.depth:
+                self._skip_nested()
+                return None
+            return self._nested(self._parse_dict)
+        if head[:1] == b"<":
+            end = self.data.find(b">", self.pos)
+            if end < 0:
+                raise XrefError("Unterminated hex string")
+            self.pos = end + 1
+            return b""
+        if head[:1] == b"[":
+            return self._nested(self._parse_array)
+        if head[:1] == b"(":
+            return self._parse_literal_string()
+        if head[:1] == b"/":
+            match = _NAME.match(self.data, self.pos)
+            self.pos = match.end()
+            return _decode_name(match.group(1))
+
+        match = _REF.match(self.data, self.pos)
+        if match:
+            self.pos = match.end()
+            return Ref(int(match.group(1)), int(match.group(2)))
+        match = _NUMBER.match(self.data, self.pos)
+        if match:
+            self.pos = match.end()
+            token = match.group()
+            return float(token) if b"." in token else int(token)
+
+        match = _KEYWORD.match(self.data, self.pos)
+        if match:
+            self.pos = match.end()
+            keyword = match.group()
+            if keyword == b"true":
+                return True
+            if keyword == b"false":
+                return False
+            if keyword == b"null":
+                return None
+        raise XrefError(f"Unexpected token at offset {self.pos}")
+
+    def _nested(self, parse: Callable[[], Any]) -> Any:
+        if self.depth >= _MAX_NESTING:
+            raise XrefError("Objects nested too deeply")
+        self.depth += 1
+        try:
+            return parse()
+        finally:
+            self.depth -= 1
+
+    def _parse_dict(self) -> dict:
+        self.pos += 2
+        result = {}
+        while True:
+            self.skip_whitespace()
+            if self.peek(2) == b">>":
+                self.pos += 2
+                return result
+            key = self.parse()
+            if not isinstance(key, str):
+                raise XrefError("Dictionary key is not a name")
+            result[key] = self.parse()
+
+    def _parse_array(self) -> Optional[list]:
+        if self.shallow:
+            self._skip_nested()
+            return None
+        self.pos += 1
+        result = []
+        while True:
+            self.skip_whitespace()
+            if self.peek() == b"]":
+                self.pos += 1
+                return result
+            result.append(self.parse())
+
+    def _skip_nested(self):
+        """Jump past a (possibly nested) array or dictionary without building it."""
+        depth = 0
+        while True:
+            match = _NESTED_DELIMITERS.search(self.data, self.pos)
+            if not match:
+                raise XrefError("Unterminated array or dictionary")
+            token = match.group()
+            if token == b"(":
+                self.pos = match.start()
+                self._parse_literal_string()
+                continue
+            self.pos = match.end()
+            if token in (b"<<", b"["):
+                depth += 1
+            elif token in (b">>", b"]"):
+                depth -= 1
+            if depth == 0:
+                return
+
+    def _parse_literal_string(self) -> bytes:
+        data, size = self.data, len(self.data)
+        depth = 0
+        while self.pos < size:
+            char = data[self.pos]
+            self.pos += 1
+            if char == 0x5C:  # backslash escapes the next byte
+                self.pos += 1
+            elif char == 0x28:
+                depth += 1
+            elif char == 0x29:
+                depth -= 1
+                if depth == 0:
+                    return b""
+        raise XrefError("Unterminated literal string")
+
+
+def _decode_name(raw: bytes) -> str:
+    if b"#" in raw:
+        raw = re.sub(rb"#([0-9A-Fa-f]{2})", lambda m: bytes([int(m.group(1), 16)]), raw)
+    return raw.decode("latin-1")
+
+
+class _Section:
+    """
+    One cross-reference section. Entries are decoded on lookup rather than
+    up front, since only a handful of objects are ever resolved.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        # (first object number, count, offset of the first entry in data)
+        self.subsections: list[tuple[int, int, int]] = []
+        self.fallback: Optional[_Section] = None
+
+    def find(self, num: int) -> Optional[tuple[int, int, int]]:
+        entry = None
+        for first, count, start in self.subsections:
+            if first <= num < first + count:
+                entry = self._entry(start, num - first)
+                break
+        if self.fallback is not None and (entry is None or entry[0] == 0):
+            return self.fallback.find(num) or entry
+        return entry
+
+    def _entry(self, start: int, index: int) -> tuple[int, int, int]:
+        raise NotImplementedError
+
+
+class _TableSection(_Section):
+    """A classic `xref` table of fixed 20-byte entries."""
+
+    def _entry(self, start: int, index: int) -> tuple[int, int, int]:
+        match = _XREF_ENTRY.match(self.data, start + _XREF_ENTRY_SIZE * index)
+        if not match:
+            raise XrefError("Invalid xref entry")
+        if match.group(3) == b"f":
+            return (0, 0, 0)
+        return (1, int(match.group(1)), int(match.group(2)))
+
+
+class _StreamSection(_Section):
+    """A decoded xref stream with /W field widths."""
+
+    def __init__(self, data: bytes, widths: list[int]):
+        super().__init__(data)
+        self.widths = widths
+
+    def _entry(self, start: int, index: int) -> tuple[int, int, int]:
+        pos = start + sum(self.widths) * index
+        fields = []
+        for width in self.widths:
+            fields.append(int.from_bytes(self.data[pos : pos + width], "big"))
+            pos += width
+        if pos > len(self.data):
+            raise XrefError("Truncated xref stream")
+        kind = fields[0] if self.widths[0] else 1
+        return (kind, fields[1], fields[2])
+
+
+class XrefReader:
+    """Resolve indirect objects of a PDF through its cross-reference data."""
+
+    def __init__(self, data: Buffer):
+        self.data = data
+        # Newest section first; entries are (type, field2, field3) as in xref
+        # streams: type 1 is (offset, generation), type 2 (object stream, index).
+        self.sections: list[_Section] = []
+        self.trailer: dict = {}
+        self._object_streams: dict[int, tuple[bytes, dict[int, int]]] = {}
+        self._load()
+
+    def _load(self):
+        tail_start = max(0, len(self.data) - _TAIL_SIZE)
+        marker = self.data.rfind(b"startxref", tail_start)
+        if marker < 0:
+            raise XrefError("startxref not found")
+        offset = _Parser(self.data, marker + len(b"startxref")).parse()
+        if not _is_int(offset):
+            raise XrefError("Invalid startxref offset")
+
+        seen = set()
+        while offset is not None:
+            if not _is_int(offset):
+                raise XrefError("Invalid /Prev offset")
+            if offset in seen or not 0 <= offset < len(self.data):
+                raise XrefError("Invalid or looping xref offset")
+            seen.add(offset)
+
+            section, trailer = self._read_section(offset)
+            self.sections.append(section)
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            offset = trailer.get("Prev")
+
+    def _read_section(self, offset: int) -> tuple[_Section, dict]:
+        parser = _Parser(self.data, offset)
+        parser.skip_whitespace()
+        if parser.peek(4) != b"xref":
+            return self._read_stream_section(offset)
+
+        parser.pos += 4
+        section, trailer = self._read_table(parser)
+        # Hybrid files list objects in object streams in a separate stream.
+        hybrid = trailer.get("XRefStm")
+        if _is_int(hybrid):
+            section.fallback, _ = self._read_stream_section(hybrid)
+        return section, trailer
+
+    def _read_table(self, parser: _Parser) -> tuple[_Section, dict]:
+        section = _TableSection(self.data)
+        while True:
+            parser.skip_whitespace()
+            if parser.peek(7) == b"trailer":
+                parser.pos += 7
+                trailer = parser.parse()
+                if not isinstance(trailer, dict):
+                    raise XrefError("Invalid trailer")
+                return section, trailer
+
+            match = _XREF_SUBSECTION.match(self.data, parser.pos)
+            if not match:
+                raise XrefError("Invalid xref subsection")
+            parser.pos = match.end()
+            parser.skip_whitespace()
+            first, count = int(match.group(1)), int(match.group(2))
+            section.subsections.append((first, count, parser.pos))
+            if count:
+                # Check the last entry so malformed (non 20-byte) tables are
+                # caught here instead of resolving to wrong offsets later.
+                section._entry(parser.pos, count - 1)
+            parser.pos += _XREF_ENTRY_SIZE * count
+
+    def _read_stream_section(self, offset: int) -> tuple[_Section, dict]:
+        stream = self._object_at(offset)
+        if not isinstance(stream, Stream) or stream.info.get("Type") != "XRef":
+            raise XrefError("Expected an xref stream")
+        info = stream.info
+
+        widths = info.get("W")
+        if not (
+            _int_list(widths)
+            and len(widths) == 3
+            and all(width <= _MAX_FIELD_WIDTH for width in widths)
+            and sum(widths)
+        ):
+            raise XrefError("Invalid /W in xref stream")
+        section = _StreamSection(self._decode_stream(stream), widths)
+
+        index = info.get("Index") or [0, info.get("Size", 0)]
+        if not (_int_list(index) and len(index) % 2 == 0):
+            raise XrefError("Invalid /Index or /Size in xref stream")
+        start = 0
+        for first, count in zip(index[::2], index[1::2]):
+            section.subsections.append((first, count, start))
+            start += sum(widths) * count
+        if start > len(section.data):
+            raise XrefError("Truncated xref stream")
+        return section, info
+
+    def _object_at(self, offset: int, expected: int = None, shallow=False) -> Any:
+        header = _OBJ_HEADER.match(self.data, offset)
+        if not header:
+            raise XrefError(f"No object at offset {offset}")
+        if expected is not None and int(header.group(1)) != expected:
+            raise XrefError(f"Object {expected} not found at its xref offset")
+
+        parser = _Parser(self.data, header.end(), shallow)
+        value = parser.parse()
+        parser.skip_whitespace()
+        if isinstance(value, dict) and parser.peek(6) == b"stream":
+            start = parser.pos + 6
+            if self.data[start : start + 2] == b"\r\n":
+                start += 2
+            elif self.data[start : start + 1] in (b"\n", b"\r"):
+                start += 1
+            return Stream(value, start)
+        return value
+
+    def _decode_stream(self, stream: Stream) -> bytes:
+        length = self.resolve(stream.info.get("Length"))
+        if not isinstance(length, int) or length < 0:
+            raise XrefError("Invalid stream /Length")
+        raw = bytes(self.data[stream.start : stream.start + length])
+
+        filters = stream.info.get("Filter")
+        filters = filters if isinstance(filters, list) else [filters] if filters else []
+        params = stream.info.get("DecodeParms")
+        if isinstance(params, list):
+            params = params[0] if params else None
+        if params is not None and not isinstance(params, dict):
+            raise XrefError("Invalid /DecodeParms")
+
+        if not filters:
+            return raw
+        if filters != ["FlateDecode"]:
+            raise XrefError(f"Unsupported stream filter: {filters}")
+        try:
+            decoded = zlib.decompress(raw)
+        except zlib.error as e:
+            raise XrefError(f"Corrupt stream: {e}")
+
+        predictor = params.get("Predictor", 1) if params else 1
+        if not _is_int(predictor):
+            raise XrefError("Invalid /Predictor")
+        if predictor >= 10:
+            columns = params.get("Columns", 1)
+            if not (_is_int(columns) and columns > 0):
+                raise XrefError("Invalid /Columns")
+            return _undo_png_predictor(decoded, columns)
+        if predictor != 1:
+            raise XrefError(f"Unsupported predictor: {predictor}")
+        return decoded
+
+    def lookup(self, num: int) -> Optional[tuple[int, int, int]]:
+        for section in self.sections:
+            entry = section.find(num)
+            if entry is not None:
+                return entry
+        return None
+
+    def resolve(self, value: Any, shallow: bool = False) -> Any:
+        """
+        Follow an indirect reference (if any) to its object. With `shallow`,
+        arrays and dictionaries inside the object are skipped and come back as
+        None.
+        """
+        if not isinstance(value, Ref):
+            return value
+
+        entry = self.lookup(value.num)
+        if entry is None or entry[0] == 0:
+            return None
+        kind, field2, _ = entry
+        if kind == 1:
+            obj = self._object_at(field2, expected=value.num, shallow=shallow)
+            return obj.info if isinstance(obj, Stream) else obj
+        if kind == 2:
+            return self._object_in_stream(field2, value.num, shallow)
+        raise XrefError(f"Unknown xref entry type {kind}")
+
+    def _object_in_stream(self, stream_num: int, num: int, shallow=False) -> Any:
+        cached = self._object_streams.get(stream_num)
+        if cached is None:
+            entry = self.lookup(stream_num)
+            if entry is None or entry[0] != 1:
+                raise XrefError(f"Object stream {stream_num} not found")
+            stream = self._object_at(entry[1], expected=stream_num)
+            if not isinstance(stream, Stream):
+                raise XrefError(f"Object {stream_num} is not a stream")
+            data = self._decode_stream(stream)
+
+            # The header is N pairs of "object-number offset" before /First.
+            first = stream.info.get("First", 0)
+            count = stream.info.get("N", 0)
+            if not (_is_count(first) and _is_count(count)):
+                raise XrefError(f"Invalid object stream {stream_num} header")
+            numbers = [int(n) for n in re.findall(rb"\d+", data[:first])]
+            if len(numbers) < 2 * count:
+                raise XrefError(f"Invalid object stream {stream_num} header")
+            offsets = {
+                numbers[i]: first + numbers[i + 1] for i in range(0, 2 * count, 2)
+            }
+            cached = self._object_streams[stream_num] = (data, offsets)
+
+        data, offsets = cached
+        if num not in offsets:
+            raise XrefError(f"Object {num} missing from object stream {stream_num}")
+        return _Parser(data, offsets[num], shallow).parse()
+
+
+def _undo_png_predictor(data: bytes, columns: int) -> bytes:
+    row_size = columns + 1
+    if len(data) % row_size:
+        raise XrefError("Invalid PNG predictor data")
+
+    output = bytearray()
+    previous = bytearray(columns)
+    for start in range(0, len(data), row_size):
+        kind = data[start]
+        row = bytearray(data[start + 1 : start + row_size])
+        if kind == 2:  # Up
+            for i in range(columns):
+                row[i] = (row[i] + previous[i]) & 0xFF
+        elif kind != 0:
+            raise XrefError(f"Unsupported PNG predictor type {kind}")
+        output += row
+        previous = row
+    return bytes(output)
+
+
+def _count_pages(reader: XrefReader, node: dict, depth: int, seen: set) -> int:
+    """
+    Leaf pages under a page tree node, counted through its /Kids. Each node's
+    /Count must agree, since a file can state any /Count it likes.
+    """
+    if depth >= _MAX_NESTING:
+        raise XrefError("Page tree nested too deeply")
+    kids = node.get("Kids")
+    if not isinstance(kids, list):
+        raise XrefError("Invalid /Kids in page tree")
+
+    total = 0
+    for kid in kids:
+        if not isinstance(kid, Ref) or kid in seen:
+            raise XrefError("Invalid or repeated page tree node")
+        seen.add(kid)
+        # Pages are only checked for /Kids; their arrays are not built.
+        child = reader.resolve(kid, shallow=True)
+        if not isinstance(child, dict):
+            raise XrefError("Invalid page tree node")
+        if "Kids" in child:
+            total += _count_pages(reader, reader.resolve(kid), depth + 1, seen)
+        else:
+            total += 1
+
+    count = reader.resolve(node.get("Count"))
+    if not _is_count(count) or count != total:
+        raise XrefError("/Count does not match the page tree")
+    return total
+
+
+def fast_page_count(data: Buffer) -> int:
+    """
+    Count the pages under /Root -> /Pages through the xref, reading each page
+    object's dictionary but nothing it refers to. Raises XrefError for
+    encrypted files, for a /Count that disagrees with the page tree, or for
+    anything else it cannot read.
+    """
+    reader = XrefReader(data)
+    if "Encrypt" in reader.trailer:
+        raise XrefError("Encrypted document")
+
+    root = reader.resolve(reader.trailer.get("Root"), shallow=True)
+    if not isinstance(root, dict):
+        raise XrefError("Missing document catalog")
+    pages_ref = root.get("Pages")
+    pages = reader.resolve(pages_ref)
+    if not isinstance(pages, dict):
+        raise XrefError("Missing page tree")
+    seen = {pages_ref} if isinstance(pages_ref, Ref) else set()
+    return _count_pages(reader, pages, 0, seen)
@@ -1,24 +1,24 @@
 # your_app/api.py
 from django.contrib.auth.models import User
-from django.shortcuts import get_object_or_404
+from django.shortcuts import aget_object_or_404
 from ninja import Router
 
 from apps.wallet.models import Wallet
 
-from ....auth import AuthBearer
+from ....auth import AsyncAuthBearer
 from ....decorators import admin_required
 from ....schemas.balance import BalanceResponse
 
 router = Router()
 
 
-@router.get("/{username}", auth=AuthBearer(), response=BalanceResponse)
+@router.get("/{username}", auth=AsyncAuthBearer(), response=BalanceResponse)
 @admin_required
-def get_user_balance(request, username: str):
+async def get_user_balance(request, username: str):
     """
     Returns the authenticated user's wallet balance.
     """
-    target_user = get_object_or_404(User, username=username)
+    target_user = await aget_object_or_404(User, username=username)
 
-    wallet = get_object_or_404(Wallet, user=target_user)
+    wallet = await aget_object_or_404(Wallet, user=target_user)
     return {"balance": str(wallet.balance)}
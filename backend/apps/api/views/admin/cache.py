@@ -0,0 +1,19 @@
+from ninja import Router
+
+from ...auth import AuthBearer
+from ...decorators import admin_required
+from ...http import HttpRequest
+from ...schemas.cache import CacheStatsResponse
+from ...utils.cache import get_analysis_cache
+
+router = Router(tags=["Admin Cache"])
+
+
+@router.get("", auth=AuthBearer(), response=CacheStatsResponse)
+@admin_required
+def get_cache_stats(request: HttpRequest):
+    """
+    Hit/miss counters of the PDF analysis cache across all processes, the
+    memory tier of this worker and the size of the disk tier.
+    """
+    return get_analysis_cache().stats()
@@ -0,0 +1,20 @@
+from ninja import Router
+
+from ...auth import AuthBearer
+from ...decorators import admin_required
+from ...http import HttpRequest
+from ...schemas.converter import ConverterStatsResponse
+from ...utils.docx import converter_stats
+
+router = Router(tags=["Admin Converter"])
+
+
+@router.get("", auth=AuthBearer(), response=ConverterStatsResponse)
+@admin_required
+def get_converter_stats(request: HttpRequest):
+    """
+    LibreOffice conversion counters across all processes: failures,
+    timeouts, client cancellations, forced kills and requests rejected as
+    busy.
+    """
+    return converter_stats.snapshot()
@@ -2,7 +2,7 @@ from ninja import Query, Router
 
 from apps.queue.models import Queue
 
-from ....auth import AuthBearer
+from ....auth import AsyncAuthBearer
 from ....decorators import admin_required
 from ....filters.queue import QueueFilter
 from ....http import HttpRequest
@@ -13,32 +13,35 @@ router = Router(tags=["Queue"])
 
 @router.get(
     "",
-    auth=AuthBearer(),
+    auth=AsyncAuthBearer(),
     response=QueueListResponse,
     summary="List queued files",
 )
 @admin_required
-def list_queue(
+async def list_queue(
     request: HttpRequest,
     query: Query[QueueFilter],
 ):
-    queryset = Queue.objects.all()
+    queryset = Queue.objects.select_related("user")
 
     if not query.include_processed:
-        queryset = Queue.objects.filter(processed=False)
+        queryset = queryset.filter(processed=False)
 
     items = [
         QueueFileResponse(
             id=item.pk,
             file=request.build_absolute_uri(item.file.url),
+            filename=item.filename,
             processed=item.processed,
             created_at=item.created_at.isoformat(),
             print_mode=item.print_mode,
             user=item.user.username,
             user_id=item.user.pk,
             page_count=item.page_count,
+            original_size=item.original_size,
+            stored_size=item.stored_size,
         )
-        for item in queryset
+        async for item in queryset
     ]
 
     return QueueListResponse(queue=items)
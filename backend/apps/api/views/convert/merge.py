@@ -1,29 +1,82 @@
-from django.http import HttpResponse
-from ninja import File, Router, UploadedFile
+from contextlib import ExitStack
+from typing import Optional
 
-from ...utils.pdf import (
-    split_pdf_into_black_and_white_pages,
-    split_pdf_into_colored_pages,
-)
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from ninja import File, Form, Router, UploadedFile
+from ninja.errors import HttpError
+
+from apps.queue.models import Queue
+
+from ...auth import OptionalAuthBearer
+from ...http import HttpRequest
+from ...utils.executor import run_cpu
+from ...utils.jobs import AsyncFlag, enqueue_job, job_accepted
+from ...utils.output import output_response
+from ...utils.pdf import merge_pdfs
+from ...utils.uploads import spooled_source
 
 router = Router(tags=["PDF"])
 
 
-@router.post("/color")
-def split_color(request, file: File[UploadedFile]):
-    file.seek(0)
-    pdf_bytes = file.read()
-    color_pdf = split_pdf_into_colored_pages(pdf_bytes)
-    response = HttpResponse(color_pdf, content_type="application/pdf")
-    response["Content-Disposition"] = 'inline; filename="color.pdf"'
-    return response
-
-
-@router.post("/grayscale")
-def split_grayscale(request, file: File[UploadedFile]):
-    file.seek(0)
-    pdf_bytes = file.read()
-    gray_pdf = split_pdf_into_black_and_white_pages(pdf_bytes)
-    response = HttpResponse(gray_pdf, content_type="application/pdf")
-    response["Content-Disposition"] = 'inline; filename="grayscale.pdf"'
-    return response
+async def _queue_items(user: Optional[User], queue_ids: list[int]) -> list[Queue]:
+    """The given queue items, in the order given."""
+    if user is None:
+        raise HttpError(401, "Authentication required to merge queue files.")
+
+    items = Queue.objects.filter(pk__in=queue_ids)
+    if not user.is_staff:
+        items = items.filter(user=user)
+    by_id = {item.pk: item async for item in items}
+
+    missing = [queue_id for queue_id in queue_ids if queue_id not in by_id]
+    if missing:
+        raise HttpError(404, f"Queue items not found: {missing}")
+    return [by_id[queue_id] for queue_id in queue_ids]
+
+
+@router.post("", auth=OptionalAuthBearer())
+async def merge(
+    request: HttpRequest,
+    files: File[list[UploadedFile]] = None,
+    queue_ids: Form[list[int]] = None,
+    run_async: AsyncFlag = False,
+):
+    """
+    Merge PDFs into one: the queue items in `queue_ids` (yours, or anyone's
+    for admins) in the order given, followed by the uploads in the order
+    sent. Pages are copied without re-encoding and shared fonts and images
+    are stored once. Set `async=true` to run it as a background job.
+    """
+    files = files or []
+    queue_ids = queue_ids or []
+    if len(files) + len(queue_ids) < 2:
+        raise HttpError(400, "Send at least two PDFs to merge.")
+    if len(files) + len(queue_ids) > settings.PDF_MERGE_MAX_FILES:
+        raise HttpError(400, f"At most {settings.PDF_MERGE_MAX_FILES} files per merge.")
+
+    # OptionalAuthBearer leaves AnonymousUser for requests without a token.
+    user = request.auth if isinstance(request.auth, User) else None
+    items = await _queue_items(user, queue_ids) if queue_ids else []
+
+    if run_async:
+        job = await sync_to_async(enqueue_job)(
+            "merge", files, {"queue_ids": queue_ids}, user=user
+        )
+        return job_accepted(job)
+
+    with ExitStack() as stack:
+        # Stored files are mapped rather than read (see apps.queue.storage).
+        sources = [
+            (item.filename, stack.enter_context(item.open_mapped())) for item in items
+        ]
+        for uploaded_file in files:
+            source, _ = spooled_source(uploaded_file)
+            sources.append((uploaded_file.name or "upload", source))
+
+        try:
+            merged = await run_cpu(merge_pdfs, sources)
+        except ValueError as e:
+            raise HttpError(400, str(e))
+    return output_response(merged, "merged.pdf", "application/pdf", attachment=True)
@@ -1,39 +1,70 @@
-from django.http import Http404, HttpResponse
+from typing import Literal
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
 from ninja import File, Form, Router
 from ninja.files import UploadedFile
 
 from ...http import HttpRequest
-from ...utils.pdf import process_pdf_file
+from ...utils.executor import run_cpu
+from ...utils.jobs import AsyncFlag, enqueue_job, job_accepted
+from ...utils.output import output_response
+from ...utils.pdf import blank_page_map, process_pdf_source
+from ...utils.uploads import spooled_source
 
 router = Router(tags=["PDF"])
 
 
 @router.post("")
-def count_nonblank_pages(
+async def count_nonblank_pages(
     request: HttpRequest,
     file: File[UploadedFile],
     return_pdf: Form[bool] = False,
+    mode: Form[Literal["summary", "map"]] = "summary",
+    run_async: AsyncFlag = False,
 ):
     """
     Upload a PDF to count non-blank pages.
-    Set `return_pdf=true` to download a version without blank pages.
+    Set `return_pdf=true` to download a version without blank pages, or
+    `mode=map` to get the blank and non-blank page indices as JSON.
+    Set `async=true` to run it as a background job.
     """
+    if run_async:
+        job = await sync_to_async(enqueue_job)(
+            "nonblank", [file], {"mode": mode, "return_pdf": return_pdf}
+        )
+        return job_accepted(job)
+
+    source, digest = spooled_source(file)
+    if mode == "map":
+        try:
+            return await run_cpu(
+                blank_page_map, source, text_threshold=10, digest=digest
+            )
+        except Exception as e:
+            raise Http404("Failed to process PDF. Ensure it's a valid PDF file.") from e
+
     try:
-        summary, pdf_bytes = process_pdf_file(
-            uploaded_file=file, return_pdf=return_pdf, text_threshold=10
+        summary, filtered_pdf = await run_cpu(
+            process_pdf_source,
+            source,
+            file.name or "unknown",
+            return_pdf=return_pdf,
+            text_threshold=10,
+            digest=digest,
         )
     except Exception as e:
         # In production, log the error and return a user-friendly message
         raise Http404("Failed to process PDF. Ensure it's a valid PDF file.") from e
 
-    if return_pdf and pdf_bytes is not None:
+    if return_pdf and filtered_pdf is not None:
         safe_name = (
             (getattr(file, "name", None) or "uploaded.pdf")
             .replace("/", "_")
             .replace("\\", "_")
         )
-        response = HttpResponse(pdf_bytes, content_type="application/pdf")
-        response["Content-Disposition"] = f'attachment; filename="nonblank_{safe_name}"'
-        return response
+        return output_response(
+            filtered_pdf, f"nonblank_{safe_name}", "application/pdf", attachment=True
+        )
 
     return summary
@@ -1,41 +1,80 @@
-import tempfile
+import asyncio
+import threading
 from pathlib import Path
 
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from ninja import File, Router
+from ninja.errors import HttpError
 from ninja.files import UploadedFile
 
 from ...http import HttpRequest
-from ...utils.docx import doc2pdf
+from ...utils.convert import convert_any_to_pdf, convert_batch_to_zip
+from ...utils.docx import ConversionError, ConverterBusyError
+from ...utils.jobs import AsyncFlag, enqueue_job, job_accepted
+from ...utils.output import iterate_in_thread, output_response
 
 router = Router(tags=["PDF"])
 
 
 @router.post("")
-def convert_to_pdf(request: HttpRequest, file: File[UploadedFile]):
+async def convert_to_pdf(
+    request: HttpRequest, file: File[UploadedFile], run_async: AsyncFlag = False
+):
+    """
+    Convert an upload to PDF. PDFs are returned untouched, images and plain
+    text are converted in-process, and only office documents go through
+    LibreOffice. A conversion is killed if the client disconnects.
+    Set `async=true` to run it as a background job.
+    """
+    if run_async:
+        job = await sync_to_async(enqueue_job)("convert_pdf", [file])
+        return job_accepted(job)
+
     filename = file.name or "temp.docx"
     stem = Path(filename).stem
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        input_path = Path(temp_dir) / filename
-        output_path = input_path.with_suffix(".pdf")
-
-        with open(input_path, "wb") as f:
-            for chunk in file.chunks():
-                f.write(chunk)
+    cancel = threading.Event()
+    try:
+        output, converter, cache_hit = await sync_to_async(
+            convert_any_to_pdf, thread_sensitive=False
+        )(file, cancel)
+    except asyncio.CancelledError:
+        # The ASGI handler cancels the view when the client goes away.
+        cancel.set()
+        raise
+    except ConverterBusyError as e:
+        raise HttpError(503, str(e))
+    except ConversionError:
+        return {"error": "PDF conversion failed"}
 
-        # Convert DOCX → PDF (this likely requires a real file)
-        doc2pdf(input_path)
+    response = output_response(
+        output, f"{stem}.pdf", "application/pdf", attachment=True
+    )
+    response["X-Converter"] = converter
+    if cache_hit is not None:
+        response["X-Conversion-Cache"] = "hit" if cache_hit else "miss"
+    return response
 
-        # Check if PDF was created
-        if not output_path.exists():
-            return {"error": "PDF conversion failed"}
 
-        # Read PDF and return as response
-        with open(output_path, "rb") as pdf_file:
-            pdf_bytes = pdf_file.read()
+@router.post("/batch")
+def convert_batch_to_pdf(request: HttpRequest, files: File[list[UploadedFile]]):
+    """
+    Convert many uploads at once. The zip is streamed as conversions finish;
+    its report.json lists each input with its output name or error.
+    """
+    if not files:
+        raise HttpError(400, "No files uploaded.")
+    if len(files) > settings.PDF_CONVERT_BATCH_MAX_FILES:
+        raise HttpError(
+            400, f"At most {settings.PDF_CONVERT_BATCH_MAX_FILES} files per batch."
+        )
 
-    # # TemporaryDirectory is now cleaned up (files deleted)
-    response = HttpResponse(pdf_bytes, content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{stem}.pdf"'
+    cancel = threading.Event()
+    response = StreamingHttpResponse(
+        iterate_in_thread(convert_batch_to_zip(files, cancel), cancel),
+        content_type="application/zip",
+    )
+    response["Content-Disposition"] = 'attachment; filename="converted.zip"'
     return response
@@ -2,20 +2,22 @@ from ninja import File, Router, UploadedFile
 from ninja.errors import HttpError
 
 from ....schemas.count import PageCountResponse
+from ....utils.executor import run_cpu
 from ....utils.pdf import count_pdf_pages
+from ....utils.uploads import spooled_source
 
 router = Router(tags=["PDF"])
 
 
 @router.post("/count-pages", response=PageCountResponse)
-def count_pages(request, file: File[UploadedFile]) -> PageCountResponse:
+async def count_pages(request, file: File[UploadedFile]) -> PageCountResponse:
     """
     Count the number of pages in an uploaded PDF file.
     Rejects encrypted, corrupted, or invalid PDFs.
     """
-    file_bytes = file.read()
+    source, digest = spooled_source(file)
     try:
-        page_count = count_pdf_pages(file_bytes)
+        page_count = await run_cpu(count_pdf_pages, source, digest=digest)
         return PageCountResponse(page_count=page_count)
     except ValueError as e:
         raise HttpError(400, str(e))
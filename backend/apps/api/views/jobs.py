@@ -0,0 +1,66 @@
+from uuid import UUID
+
+from django.shortcuts import get_object_or_404
+from ninja import Router
+from ninja.errors import HttpError
+
+from apps.jobs.models import Job
+
+from ..auth import OptionalAuthBearer
+from ..http import HttpRequest
+from ..schemas.jobs import JobResponse
+from ..utils.output import file_response
+
+router = Router(tags=["Jobs"])
+
+
+def _get_job(request: HttpRequest, job_id: UUID) -> Job:
+    """
+    The job id is the capability for anonymous jobs; jobs submitted on behalf
+    of a user are only visible to that user and to admins.
+    """
+    job = get_object_or_404(Job, pk=job_id)
+    if job.user_id is not None:
+        user = request.auth
+        if not getattr(user, "is_staff", False) and user.pk != job.user_id:
+            raise HttpError(404, "Job not found.")
+    return job
+
+
+@router.get("{job_id}", auth=OptionalAuthBearer(), response=JobResponse)
+def get_job(request: HttpRequest, job_id: UUID):
+    """Status of a job submitted with `async=true`."""
+    job = _get_job(request, job_id)
+    return JobResponse(
+        id=job.pk,
+        kind=job.kind,
+        status=job.status,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error or None,
+        result=job.result,
+        result_url=f"/api/jobs/{job.pk}/result" if job.output else None,
+    )
+
+
+@router.get("{job_id}/result", auth=OptionalAuthBearer())
+def get_job_result(request: HttpRequest, job_id: UUID):
+    """
+    The output of a succeeded job: the file the synchronous endpoint would
+    have returned, or its JSON body.
+    """
+    job = _get_job(request, job_id)
+    if job.status == Job.Status.FAILED:
+        raise HttpError(400, job.error)
+    if job.status != Job.Status.SUCCEEDED:
+        raise HttpError(409, "Job has not finished yet.")
+    if not job.output:
+        return job.result
+    return file_response(
+        job.output.open("rb"),
+        job.output_name,
+        job.output_content_type,
+        attachment=True,
+        size=job.output.size,
+    )
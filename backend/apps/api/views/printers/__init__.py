@@ -1,4 +1,4 @@
-from django.shortcuts import get_object_or_404
+from django.shortcuts import aget_object_or_404
 from ninja import Router
 
 from apps.printers.models import Printers
@@ -10,7 +10,7 @@ router = Router(tags=["Printers"])
 
 
 @router.get("", response=list[PrinterOutSchema])
-def printer_list(request):
+async def printer_list(request):
     printers = Printers.objects.all()
     data = [
         PrinterOutSchema(
@@ -22,17 +22,17 @@ def printer_list(request):
             duplex_charge=printer.duplex_charge,
             decomissioned=printer.decomissioned,
         )
-        for printer in printers
+        async for printer in printers
     ]
     return data
 
 
 @router.get("{printer_id}", response=PrinterOutSchema)
-def printer_get(
+async def printer_get(
     request: HttpRequest,
     printer_id: int,
 ):
-    printer = get_object_or_404(Printers, id=printer_id)
+    printer = await aget_object_or_404(Printers, id=printer_id)
     data = PrinterOutSchema(
         id=printer.pk,
         name=printer.name,
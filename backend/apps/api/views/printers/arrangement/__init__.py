@@ -10,14 +10,14 @@ router = Router(tags=["Printer Arrangements"])
 
 
 @router.get("", response=list[PrinterArrangementOutSchema])
-def list_arrangements(request):
+async def list_arrangements(request):
     arrangements = PrinterArrangements.objects.all()
     return [
         {
             "id": arr.pk,
             "decomissioned": arr.decomissioned,
-            "color_printer": arr.color_printer.id if arr.color_printer else None,
-            "bw_printer": arr.bw_printer.id if arr.bw_printer else None,
+            "color_printer": arr.color_printer_id,
+            "bw_printer": arr.bw_printer_id,
         }
-        for arr in arrangements
+        async for arr in arrangements
     ]
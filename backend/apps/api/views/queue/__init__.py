@@ -1,7 +1,4 @@
-from decimal import Decimal
-
 from django.contrib.auth.models import User
-from django.core.files.uploadedfile import SimpleUploadedFile
 from django.shortcuts import get_object_or_404
 from ninja import File, Form, Router
 from ninja.errors import HttpError
@@ -18,26 +15,50 @@ from ...schemas.queue import (
     ProcessStatusResponse,
     QueueDeleteResponse,
     QueueFileUpload,
+    QueueUploadErrorResponse,
     QueueUploadResponse,
 )
-from ...utils.pdf import count_pdf_pages
+from ...utils.jobs import AsyncFlag, enqueue_job, job_accepted
+from ...utils.queue import (
+    QueueUploadError,
+    check_queue_uploads,
+    count_queue_files,
+    optimize_queue_files,
+    queue_file_fields,
+    queue_upload_summary,
+    split_queue_uploads,
+)
+from ...utils.uploads import spooled_source
 
 router = Router(tags=["Queue"])
 
-COST_PER_PAGE = Decimal("1.0")
+
+def _upload_errors(error: QueueUploadError) -> QueueUploadErrorResponse:
+    return QueueUploadErrorResponse(
+        detail=f"{len(error.errors)} file(s) could not be queued.",
+        errors=error.errors,
+    )
 
 
 @router.post(
     "",
     auth=AuthBearer(),
-    response=QueueUploadResponse,
+    response={200: QueueUploadResponse, 400: QueueUploadErrorResponse},
     summary="Queue files for processing",
 )
 def queue_files(
     request: HttpRequest,
     files: File[list[UploadedFile]],
     payload: Form[QueueFileUpload],
+    run_async: AsyncFlag = False,
 ):
+    """
+    Count the pages of the uploaded PDFs, concurrently, and queue them,
+    stored optimized where that makes them smaller (QUEUE_OPTIMIZE_PDFS).
+    A 400 lists every file that was rejected and why. With `async=true` the
+    files are only checked by name and size here, and counted and queued by
+    a background job.
+    """
     current_user = request.auth
 
     # Determine target user
@@ -58,58 +79,70 @@ def queue_files(
         PrinterArrangements, id=payload.printer_arrangement
     )
 
-    total_pages = 0
-    file_data_list: list[tuple[str, bytes, int]] = []
-
-    for uploaded_file in files:
-        filename = uploaded_file.name
-        if not filename:
-            raise HttpError(400, "Uploaded file has no name")
-        if not filename.lower().endswith(".pdf"):
-            raise HttpError(400, f"Only PDF files allowed. Invalid: {filename}")
-
-        file_content = uploaded_file.read()
-        if not file_content:
-            raise HttpError(400, f"File {filename} is empty.")
-
+    if run_async:
         try:
-            num_pages = count_pdf_pages(file_content)
-        except ValueError as e:
-            raise HttpError(400, str(e))
-
-        if num_pages <= 0:
-            raise HttpError(400, f"No valid pages found in {filename}")
-
-        total_pages += num_pages
-        file_data_list.append((filename, file_content, num_pages))
+            check_queue_uploads(files)
+        except QueueUploadError as e:
+            return 400, _upload_errors(e)
+        job = enqueue_job(
+            "queue_files",
+            files,
+            {"printer_arrangement": printer_arrangement.pk},
+            user=target_user,
+        )
+        return job_accepted(job)
+
+    # Files that fail the name and size checks are still reported alongside
+    # those that fail to count, rather than instead of them.
+    files, errors = split_queue_uploads(files)
+    sources = [
+        (uploaded_file.name, *spooled_source(uploaded_file)) for uploaded_file in files
+    ]
+    page_counts = []
+    if sources:
+        try:
+            page_counts = count_queue_files(sources)
+        except QueueUploadError as e:
+            errors.extend(e.errors)
+    if errors:
+        return 400, _upload_errors(QueueUploadError(errors))
+    total_pages = sum(page_counts)
 
     if total_pages == 0:
         raise HttpError(400, "No valid pages found in uploaded files")
 
-    # Create Queue objects with page_count
-    queue_items = []
-    for filename, content, num_pages in file_data_list:
-        file_for_db = SimpleUploadedFile(
-            name=filename,
-            content=content,
-            content_type="application/pdf",
-        )
-        queue_items.append(
-            Queue(
-                file=file_for_db,
-                user=target_user,
-                page_count=num_pages,
-                printer_arrangement=printer_arrangement,
-            )
-        )
+    optimized = optimize_queue_files(
+        [
+            (name, source, num_pages)
+            for (name, source, _), num_pages in zip(sources, page_counts)
+        ]
+    )
 
-    created_items = Queue.objects.bulk_create(queue_items)
+    # Create Queue objects with page_count. Spooled uploads, or their
+    # optimized versions, are moved into storage from their temporary files
+    # rather than read and copied.
+    try:
+        created_items = Queue.objects.bulk_create(
+            [
+                Queue(
+                    **queue_file_fields(uploaded_file, uploaded_file.size, output),
+                    user=target_user,
+                    page_count=num_pages,
+                    printer_arrangement=printer_arrangement,
+                )
+                for uploaded_file, num_pages, output in zip(
+                    files, page_counts, optimized
+                )
+            ]
+        )
+    finally:
+        # Optimized files whose content was already stored are left behind.
+        for output in optimized:
+            if output is not None:
+                output.discard()
 
     return QueueUploadResponse(
-        message=f"{len(created_items)} file(s) queued successfully",
-        total_pages=total_pages,
-        queue_ids=[item.pk for item in created_items],
-        total_charged_bdt=str(COST_PER_PAGE * total_pages),
+        **queue_upload_summary([item.pk for item in created_items], total_pages)
     )
 
 
@@ -1,28 +1,101 @@
-from django.http import HttpResponse
-from ninja import File, Router, UploadedFile
+from typing import Any, Callable, Literal
+
+from asgiref.sync import sync_to_async
+from ninja import File, Form, Router, UploadedFile
+from ninja.errors import HttpError
 
 from ...http import HttpRequest
+from ...schemas.split import AnyColorResponse
+from ...utils.executor import run_cpu
+from ...utils.jobs import AsyncFlag, enqueue_job, job_accepted
+from ...utils.output import output_response
 from ...utils.pdf import (
+    color_page_map,
+    first_color_page,
+    split_pdf_by_color,
     split_pdf_into_black_and_white_pages,
     split_pdf_into_colored_pages,
 )
+from ...utils.uploads import spooled_source
 
 router = Router(tags=["PDF"])
 
+SplitMode = Literal["pdf", "map"]
+
+
+async def _run_on_upload(func: Callable[..., Any], file: UploadedFile) -> Any:
+    """`func(source, digest=...)` for the upload on the CPU pool; 400 if invalid."""
+    source, digest = spooled_source(file)
+    try:
+        return await run_cpu(func, source, digest=digest)
+    except ValueError as e:
+        raise HttpError(400, str(e))
+
 
 @router.post("/color")
-def split_color(request: HttpRequest, file: File[UploadedFile]):
-    pdf_bytes = file.read()
-    color_pdf = split_pdf_into_colored_pages(pdf_bytes)
-    response = HttpResponse(color_pdf, content_type="application/pdf")
-    response["Content-Disposition"] = 'inline; filename="color.pdf"'
-    return response
+async def split_color(
+    request: HttpRequest,
+    file: File[UploadedFile],
+    mode: Form[SplitMode] = "pdf",
+    run_async: AsyncFlag = False,
+):
+    """
+    Color pages of the upload as a PDF.
+    Set `mode=map` to get the page indices as JSON instead, and `async=true`
+    to run it as a background job.
+    """
+    if run_async:
+        job = await sync_to_async(enqueue_job)("split_color", [file], {"mode": mode})
+        return job_accepted(job)
+    if mode == "map":
+        return await _run_on_upload(color_page_map, file)
+    color_pdf = await _run_on_upload(split_pdf_into_colored_pages, file)
+    return output_response(color_pdf, "color.pdf", "application/pdf")
 
 
 @router.post("/grayscale")
-def split_grayscale(request: HttpRequest, file: File[UploadedFile]):
-    pdf_bytes = file.read()
-    gray_pdf = split_pdf_into_black_and_white_pages(pdf_bytes)
-    response = HttpResponse(gray_pdf, content_type="application/pdf")
-    response["Content-Disposition"] = 'inline; filename="grayscale.pdf"'
-    return response
+async def split_grayscale(
+    request: HttpRequest,
+    file: File[UploadedFile],
+    mode: Form[SplitMode] = "pdf",
+    run_async: AsyncFlag = False,
+):
+    """
+    Grayscale pages of the upload as a PDF.
+    Set `mode=map` to get the page indices as JSON instead, and `async=true`
+    to run it as a background job.
+    """
+    if run_async:
+        job = await sync_to_async(enqueue_job)(
+            "split_grayscale", [file], {"mode": mode}
+        )
+        return job_accepted(job)
+    if mode == "map":
+        return await _run_on_upload(color_page_map, file)
+    gray_pdf = await _run_on_upload(split_pdf_into_black_and_white_pages, file)
+    return output_response(gray_pdf, "grayscale.pdf", "application/pdf")
+
+
+@router.post("/both")
+async def split_both(
+    request: HttpRequest, file: File[UploadedFile], run_async: AsyncFlag = False
+):
+    """
+    Color and grayscale outputs of one upload in a single zip, with a
+    manifest.json listing which source pages went into each.
+    Set `async=true` to run it as a background job.
+    """
+    if run_async:
+        job = await sync_to_async(enqueue_job)("split_both", [file])
+        return job_accepted(job)
+    archive = await _run_on_upload(split_pdf_by_color, file)
+    return output_response(archive, "split.zip", "application/zip", attachment=True)
+
+
+@router.post("/any_color", response=AnyColorResponse)
+async def any_color(request: HttpRequest, file: File[UploadedFile]) -> AnyColorResponse:
+    """
+    Whether the upload has any color page at all. Stops at the first one.
+    """
+    index = await _run_on_upload(first_color_page, file)
+    return AnyColorResponse(any_color=index is not None, first_color_page=index)
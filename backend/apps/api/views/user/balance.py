@@ -1,20 +1,20 @@
-from django.shortcuts import get_object_or_404
+from django.shortcuts import aget_object_or_404
 from ninja import Router
 
 from apps.wallet.models import Wallet
 
-from ...auth import AuthBearer
+from ...auth import AsyncAuthBearer
 from ...http import HttpRequest
 from ...schemas.balance import BalanceResponse
 
 router = Router(tags=["User"])
 
 
-@router.get("", auth=AuthBearer(), response=BalanceResponse)
-def get_balance(request: HttpRequest):
+@router.get("", auth=AsyncAuthBearer(), response=BalanceResponse)
+async def get_balance(request: HttpRequest):
     """
     Returns the authenticated user's wallet balance.
     """
     user = request.auth
-    wallet = get_object_or_404(Wallet, user=user)
+    wallet = await aget_object_or_404(Wallet, user=user)
     return BalanceResponse(balance=str(wallet.balance))
@@ -1,4 +1,4 @@
-from django.contrib.auth import authenticate
+from django.contrib.auth import aauthenticate
 from django.http import Http404, HttpRequest
 from ninja import Router
 
@@ -9,8 +9,10 @@ router = Router(tags=["User"])
 
 
 @router.post("", response=LoginOutSchema)
-def post_user_login_info(request: HttpRequest, payload: LoginInSchema) -> Token:
-    user = authenticate(request, username=payload.username, password=payload.password)
+async def post_user_login_info(request: HttpRequest, payload: LoginInSchema) -> Token:
+    user = await aauthenticate(
+        request, username=payload.username, password=payload.password
+    )
 
     if user is None:
         raise Http404("No such user exists or invalid credentials")
@@ -18,5 +20,5 @@ def post_user_login_info(request: HttpRequest, payload: LoginInSchema) -> Token:
     if not user.is_active:
         raise Http404("User account is disabled")
 
-    token, _ = Token.objects.get_or_create(user=user)
+    token, _ = await Token.objects.aget_or_create(user=user)
     return token
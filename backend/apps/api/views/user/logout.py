@@ -3,15 +3,15 @@ from http import HTTPStatus
 from django.http import HttpResponse
 from ninja import Router
 
-from ...auth import AuthBearer
+from ...auth import AsyncAuthBearer
 from ...http import HttpRequest
 from ...models import Token
 
 router = Router(tags=["User"])
 
 
-@router.delete("", auth=AuthBearer())
-def post_user_logout_info(request: HttpRequest) -> HttpResponse:
-    token: Token = Token.objects.get(user=request.auth)
-    token.delete()
+@router.delete("", auth=AsyncAuthBearer())
+async def post_user_logout_info(request: HttpRequest) -> HttpResponse:
+    token: Token = await Token.objects.aget(user=request.auth)
+    await token.adelete()
     return HttpResponse("Successful", status=HTTPStatus.ACCEPTED)
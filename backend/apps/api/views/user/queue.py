@@ -1,10 +1,8 @@
-from django.contrib.auth.models import User
-from django.shortcuts import get_object_or_404
 from ninja import Router
 
 from apps.queue.models import Queue
 
-from ...auth import AuthBearer
+from ...auth import AsyncAuthBearer
 from ...decorators import login_required
 from ...http import HttpRequest
 from ...schemas.queue import QueueFileResponse, QueueListResponse
@@ -12,26 +10,28 @@ from ...schemas.queue import QueueFileResponse, QueueListResponse
 router = Router(tags=["Queue"])
 
 
-@router.get("", auth=AuthBearer(), response=QueueListResponse)
+@router.get("", auth=AsyncAuthBearer(), response=QueueListResponse)
 @login_required
-def list_queue_by_user(
+async def list_queue_by_user(
     request: HttpRequest,
 ):
-    target_user = get_object_or_404(User, id=request.auth.pk)
-    queryset = Queue.objects.filter(user=target_user)
+    queryset = Queue.objects.filter(user=request.auth).select_related("user")
 
     items = [
         QueueFileResponse(
             id=item.pk,
             file=request.build_absolute_uri(item.file.url),
+            filename=item.filename,
             processed=item.processed,
             created_at=item.created_at.isoformat(),
             user=item.user.username,
             user_id=item.user.pk,
             page_count=item.page_count,
+            original_size=item.original_size,
+            stored_size=item.stored_size,
             print_mode=item.print_mode,
         )
-        for item in queryset
+        async for item in queryset
     ]
 
     return QueueListResponse(queue=items)
@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from .models import Job, JobInput
+
+
+class JobInputInline(admin.TabularInline):
+    model = JobInput
+    extra = 0
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "attempts", "created_at", "finished_at")
+    list_filter = ("status", "kind")
+    readonly_fields = ("created_at", "started_at", "finished_at")
+    inlines = (JobInputInline,)
@@ -0,0 +1,209 @@
+"""
+Job handlers, one per `Job.kind`. Each does what the synchronous endpoint
+does, through the same utilities, and describes its result as a JobOutput.
+"""
+
+from contextlib import ExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from django.core.files import File
+from django.db import transaction
+
+from apps.api.utils.convert import convert_any_to_pdf
+from apps.api.utils.output import OutputFile
+from apps.api.utils.pdf import (
+    blank_page_map,
+    color_page_map,
+    merge_pdfs,
+    process_pdf_file,
+    split_pdf_by_color,
+    split_pdf_into_black_and_white_pages,
+    split_pdf_into_colored_pages,
+)
+from apps.api.utils.queue import (
+    count_queue_files,
+    optimize_queue_files,
+    queue_file_fields,
+    queue_upload_summary,
+)
+from apps.api.utils.uploads import spooled_source
+from apps.printers.models import PrinterArrangements
+from apps.queue.models import Queue
+
+from .models import Job, JobInput
+
+
+@dataclass(frozen=True)
+class JobOutput:
+    """JSON `result`, and/or a file to serve as the job's result."""
+
+    result: Optional[dict] = None
+    file: Optional[OutputFile] = None
+    filename: str = ""
+    content_type: str = ""
+
+
+class StoredUpload(File):
+    """
+    A job input in the shape `spooled_source`, the converters and file storage
+    expect from a spooled upload: its name, a path on disk and the digest
+    taken on receipt.
+    """
+
+    def __init__(self, item: JobInput):
+        super().__init__(None, item.name)
+        self.sha256 = item.sha256 or None
+        self._path = item.file.path
+
+    def temporary_file_path(self) -> str:
+        return self._path
+
+
+HANDLERS: dict[str, Callable[[Job], JobOutput]] = {}
+
+
+def handler(kind: str):
+    def register(func: Callable[[Job], JobOutput]):
+        HANDLERS[kind] = func
+        return func
+
+    return register
+
+
+def _single_input(job: Job) -> StoredUpload:
+    return StoredUpload(job.inputs.get())
+
+
+def _pdf(file: OutputFile, filename: str) -> JobOutput:
+    return JobOutput(file=file, filename=filename, content_type="application/pdf")
+
+
+@handler("split_color")
+def split_color(job: Job) -> JobOutput:
+    source, digest = spooled_source(_single_input(job))
+    if job.params.get("mode") == "map":
+        return JobOutput(result=color_page_map(source, digest=digest))
+    return _pdf(split_pdf_into_colored_pages(source, digest=digest), "color.pdf")
+
+
+@handler("split_grayscale")
+def split_grayscale(job: Job) -> JobOutput:
+    source, digest = spooled_source(_single_input(job))
+    if job.params.get("mode") == "map":
+        return JobOutput(result=color_page_map(source, digest=digest))
+    return _pdf(
+        split_pdf_into_black_and_white_pages(source, digest=digest), "grayscale.pdf"
+    )
+
+
+@handler("split_both")
+def split_both(job: Job) -> JobOutput:
+    source, digest = spooled_source(_single_input(job))
+    return JobOutput(
+        file=split_pdf_by_color(source, digest=digest),
+        filename="split.zip",
+        content_type="application/zip",
+    )
+
+
+@handler("nonblank")
+def nonblank(job: Job) -> JobOutput:
+    upload = _single_input(job)
+    if job.params.get("mode") == "map":
+        source, digest = spooled_source(upload)
+        return JobOutput(
+            result=blank_page_map(source, text_threshold=10, digest=digest)
+        )
+
+    summary, filtered_pdf = process_pdf_file(
+        uploaded_file=upload,
+        return_pdf=job.params.get("return_pdf", False),
+        text_threshold=10,
+    )
+    if filtered_pdf is None:
+        return JobOutput(result=summary)
+    safe_name = upload.name.replace("/", "_").replace("\\", "_")
+    return JobOutput(
+        result=summary,
+        file=filtered_pdf,
+        filename=f"nonblank_{safe_name}",
+        content_type="application/pdf",
+    )
+
+
+@handler("convert_pdf")
+def convert_pdf(job: Job) -> JobOutput:
+    upload = _single_input(job)
+    pdf, converter, cache_hit = convert_any_to_pdf(upload)
+    return JobOutput(
+        result={"converter": converter, "cache_hit": cache_hit},
+        file=pdf,
+        filename=f"{Path(upload.name).stem}.pdf",
+        content_type="application/pdf",
+    )
+
+
+@handler("queue_files")
+def queue_files(job: Job) -> JobOutput:
+    printer_arrangement = PrinterArrangements.objects.get(
+        id=job.params["printer_arrangement"]
+    )
+    items = list(job.inputs.all())
+    page_counts = count_queue_files(
+        [(item.name, item.file.path, item.sha256 or None) for item in items]
+    )
+    optimized = optimize_queue_files(
+        [
+            (item.name, item.file.path, num_pages)
+            for item, num_pages in zip(items, page_counts)
+        ]
+    )
+
+    # Stored inputs, or their optimized versions, are moved into the queue's
+    # storage rather than copied; inputs left behind (already stored) are
+    # deleted with the job's inputs.
+    try:
+        with transaction.atomic():
+            created_items = Queue.objects.bulk_create(
+                [
+                    Queue(
+                        **queue_file_fields(StoredUpload(item), item.file.size, output),
+                        user=job.user,
+                        page_count=num_pages,
+                        printer_arrangement=printer_arrangement,
+                    )
+                    for item, num_pages, output in zip(items, page_counts, optimized)
+                ]
+            )
+    finally:
+        for output in optimized:
+            if output is not None:
+                output.discard()
+
+    return JobOutput(
+        result=queue_upload_summary(
+            [item.pk for item in created_items], sum(page_counts)
+        )
+    )
+
+
+@handler("merge")
+def merge(job: Job) -> JobOutput:
+    queue_ids = job.params.get("queue_ids", [])
+    by_id = Queue.objects.in_bulk(queue_ids)
+    missing = [queue_id for queue_id in queue_ids if queue_id not in by_id]
+    if missing:
+        raise ValueError(f"Queue items not found: {missing}")
+
+    with ExitStack() as stack:
+        sources = [
+            (
+                by_id[queue_id].filename,
+                stack.enter_context(by_id[queue_id].open_mapped()),
+            )
+            for queue_id in queue_ids
+        ]
+        sources += [(item.name, item.file.path) for item in job.inputs.order_by("pk")]
+        return _pdf(merge_pdfs(sources), "merged.pdf")
@@ -0,0 +1,67 @@
+import signal
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.jobs.worker import (
+    claim_job,
+    purge_expired,
+    requeue_stale,
+    run_job,
+    worker_name,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued PDF jobs one at a time. Start as many workers as needed; "
+        "each claims its own job."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Exit when the queue is empty."
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=None,
+            help="Seconds to wait between polls of an empty queue.",
+        )
+
+    def handle(self, *args, once: bool, poll_interval: Optional[float], **options):
+        poll_interval = poll_interval or settings.JOBS_POLL_INTERVAL
+        worker = worker_name()
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        # Finish the current job on SIGTERM/SIGINT instead of abandoning it.
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f"Job worker {worker} started")
+        next_maintenance = 0.0
+        while not stopping:
+            close_old_connections()
+            if time.monotonic() >= next_maintenance:
+                requeue_stale()
+                purge_expired()
+                next_maintenance = time.monotonic() + settings.JOBS_MAINTENANCE_INTERVAL
+
+            job = claim_job(worker)
+            if job is None:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            run_job(job)
+            self.stdout.write(f"Job {job.pk} ({job.kind}): {job.status}")
+
+        self.stdout.write(f"Job worker {worker} stopped")
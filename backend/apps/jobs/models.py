@@ -0,0 +1,63 @@
+import uuid
+
+from django.contrib.auth.models import User
+from django.db import models
+
+
+class Job(models.Model):
+    """
+    A unit of heavy PDF work submitted with `async=true` and executed by the
+    `run_jobs` management command. Binary results are stored in `output`,
+    JSON results in `result`.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        SUCCEEDED = "succeeded", "Succeeded"
+        FAILED = "failed", "Failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=32)
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.QUEUED
+    )
+    params = models.JSONField(default=dict, blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+
+    result = models.JSONField(null=True, blank=True)
+    output = models.FileField(upload_to="jobs/output/", blank=True)
+    output_name = models.CharField(max_length=255, blank=True)
+    output_content_type = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched by the worker every JOBS_HEARTBEAT_INTERVAL while it runs the job.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} - {self.kind}: {self.status}"
+
+
+class JobInput(models.Model):
+    """An uploaded file a job works on, kept until the job finishes."""
+
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="inputs")
+    file = models.FileField(upload_to="jobs/input/", blank=True)
+    name = models.CharField(max_length=255)
+    sha256 = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.name} ({self.job_id})"
@@ -0,0 +1,138 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from apps.api.tests import CacheIsolationMixin, labelled_pdf, make_pdf, page_labels
+from apps.api.utils.executor import _reset_cpu_executor
+from apps.queue.models import Queue
+
+from .models import Job
+from .worker import claim_job, heartbeat, requeue_stale, run_job
+
+
+class JobQueueTests(CacheIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(_reset_cpu_executor)
+
+    def submit(self, data: bytes) -> str:
+        response = self.client.post(
+            "/api/convert/nonblank/",
+            {
+                "file": SimpleUploadedFile("document.pdf", data),
+                "mode": "map",
+                "async": "true",
+            },
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response["Location"], f"/api/jobs/{response.json()['job_id']}")
+        return response.json()["job_id"]
+
+    def run_queued(self):
+        job = claim_job("test-worker")
+        self.assertIsNotNone(job)
+        run_job(job)
+
+    def test_job_runs_and_serves_result(self):
+        job_id = self.submit(make_pdf(6))
+        self.assertEqual(
+            self.client.get(f"/api/jobs/{job_id}").json()["status"], "queued"
+        )
+        self.assertEqual(self.client.get(f"/api/jobs/{job_id}/result").status_code, 409)
+
+        self.run_queued()
+        self.assertIsNone(claim_job("test-worker"))
+        status = self.client.get(f"/api/jobs/{job_id}").json()
+        self.assertEqual(status["status"], "succeeded")
+        self.assertEqual(status["result"]["page_count"], 6)
+        result = self.client.get(f"/api/jobs/{job_id}/result").json()
+        self.assertEqual(result["blank_pages"], [3])
+        # Inputs are deleted once the job has finished.
+        self.assertFalse(Job.objects.get(pk=job_id).inputs.exclude(file="").exists())
+
+    def test_failed_job_reports_error(self):
+        job_id = self.submit(b"junk" * 100)
+        self.run_queued()
+        status = self.client.get(f"/api/jobs/{job_id}").json()
+        self.assertEqual(status["status"], "failed")
+        self.assertEqual(self.client.get(f"/api/jobs/{job_id}/result").status_code, 400)
+
+    def test_merge_job_reads_mapped_queue_files(self):
+        user = User.objects.create_user("alice")
+        items = [
+            Queue.objects.create(
+                file=SimpleUploadedFile(name, labelled_pdf(*labels)),
+                filename=name,
+                user=user,
+            )
+            for name, labels in (("a.pdf", ("a1", "a2")), ("b.pdf", ("b1",)))
+        ]
+        job = Job.objects.create(
+            kind="merge", params={"queue_ids": [items[1].pk, items[0].pk]}, user=user
+        )
+
+        with mock.patch.object(
+            Queue, "open_mapped", autospec=True, side_effect=Queue.open_mapped
+        ) as open_mapped:
+            self.run_queued()
+        self.assertEqual(open_mapped.call_count, 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        with job.output.open() as f:
+            self.assertEqual(page_labels(f.read()), ["b1", "a1", "a2"])
+
+
+@override_settings(JOBS_STALE_AFTER=60, JOBS_MAX_ATTEMPTS=2)
+class RequeueStaleTests(TestCase):
+    def running_job(self, started: int, heartbeat: int, attempts: int = 1) -> Job:
+        now = timezone.now()
+        return Job.objects.create(
+            kind="nonblank",
+            status=Job.Status.RUNNING,
+            worker="test-worker",
+            attempts=attempts,
+            started_at=now - timedelta(seconds=started),
+            heartbeat_at=now - timedelta(seconds=heartbeat),
+        )
+
+    def test_long_job_with_heartbeat_kept(self):
+        job = self.running_job(started=3600, heartbeat=5)
+        self.assertEqual(requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.RUNNING)
+
+    def test_job_without_heartbeat_requeued(self):
+        job = self.running_job(started=120, heartbeat=120)
+        self.assertEqual(requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.Status.QUEUED, ""))
+
+    def test_job_out_of_attempts_failed(self):
+        job = self.running_job(started=120, heartbeat=120, attempts=2)
+        requeue_stale()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+
+
+class HeartbeatTests(TransactionTestCase):
+    @override_settings(JOBS_HEARTBEAT_INTERVAL=0.05)
+    def test_heartbeat_recorded_while_running(self):
+        Job.objects.create(kind="nonblank")
+        job = claim_job("test-worker")
+        claimed_at = job.heartbeat_at
+
+        with heartbeat(job):
+            time.sleep(0.5)
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat_at, claimed_at)
+
+        # No more heartbeats once the block has exited.
+        last = job.heartbeat_at
+        time.sleep(0.2)
+        job.refresh_from_db()
+        self.assertEqual(job.heartbeat_at, last)
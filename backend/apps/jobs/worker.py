@@ -0,0 +1,150 @@
+import logging
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.api.utils.docx import ConversionError
+
+from .handlers import HANDLERS
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_job(worker: str) -> Optional[Job]:
+    """
+    Take the oldest queued job, or return None when there is none.
+
+    On Postgres, concurrent workers skip rows another worker has locked.
+    SQLite has no row locks (select_for_update is a no-op there), so the
+    claim itself is a conditional update that only one worker can win.
+    """
+    while True:
+        with transaction.atomic():
+            job = (
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(status=Job.Status.QUEUED)
+                .order_by("created_at")
+                .first()
+            )
+            if job is None:
+                return None
+            now = timezone.now()
+            claimed = Job.objects.filter(pk=job.pk, status=Job.Status.QUEUED).update(
+                status=Job.Status.RUNNING,
+                worker=worker,
+                started_at=now,
+                heartbeat_at=now,
+                attempts=F("attempts") + 1,
+            )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def _discard_inputs(job: Job):
+    for item in job.inputs.exclude(file=""):
+        item.file.delete()
+
+
+@contextmanager
+def heartbeat(job: Job):
+    """
+    Record a heartbeat for `job` every JOBS_HEARTBEAT_INTERVAL seconds, from
+    a thread with its own database connection, until the block exits.
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.JOBS_HEARTBEAT_INTERVAL):
+                try:
+                    Job.objects.filter(
+                        pk=job.pk, status=Job.Status.RUNNING, worker=job.worker
+                    ).update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    logger.warning("Could not record a heartbeat for job %s", job.pk)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"job-heartbeat-{job.pk}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job: Job):
+    """Run a claimed job and record its outcome. Never raises."""
+    try:
+        with heartbeat(job):
+            output = HANDLERS[job.kind](job)
+    except (ValueError, ConversionError) as e:
+        job.status = Job.Status.FAILED
+        job.error = str(e)
+    except Exception:
+        logger.exception("Job %s (%s) failed", job.pk, job.kind)
+        job.status = Job.Status.FAILED
+        job.error = "Job failed"
+    else:
+        if output.file is not None:
+            with output.file.open() as f:
+                job.output.save(output.filename, File(f), save=False)
+            job.output_name = output.filename
+            job.output_content_type = output.content_type
+        job.result = output.result
+        job.status = Job.Status.SUCCEEDED
+
+    job.finished_at = timezone.now()
+    job.save()
+    _discard_inputs(job)
+
+
+def requeue_stale() -> int:
+    """
+    Put back jobs whose worker died mid-run (no heartbeat for longer than
+    JOBS_STALE_AFTER), or fail them once they used up JOBS_MAX_ATTEMPTS.
+    A job that is merely slow keeps its heartbeat and is left alone.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.Status.RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=settings.JOBS_STALE_AFTER),
+    )
+    stale.filter(attempts__gte=settings.JOBS_MAX_ATTEMPTS).update(
+        status=Job.Status.FAILED,
+        error="Worker stopped before finishing",
+        finished_at=now,
+    )
+    return stale.update(status=Job.Status.QUEUED, worker="")
+
+
+def purge_expired() -> int:
+    """Delete finished jobs older than JOBS_RESULT_TTL, with their files."""
+    expired = Job.objects.filter(
+        status__in=[Job.Status.SUCCEEDED, Job.Status.FAILED],
+        finished_at__lt=timezone.now() - timedelta(seconds=settings.JOBS_RESULT_TTL),
+    )
+    count = 0
+    for job in expired:
+        _discard_inputs(job)
+        if job.output:
+            job.output.delete(save=False)
+        job.delete()
+        count += 1
+    return count
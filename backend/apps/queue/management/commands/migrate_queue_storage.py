@@ -0,0 +1,80 @@
+import hashlib
+import os
+import shutil
+
+from django.core.management.base import BaseCommand
+
+from apps.queue.models import Queue
+from apps.queue.storage import queue_storage
+
+
+def _sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        "Move queue files stored under their upload names into content-addressed "
+        "storage, keeping one copy of identical files, and report the space reclaimed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be moved and reclaimed without changing anything.",
+        )
+
+    def handle(self, *args, dry_run: bool, **options):
+        names = (
+            Queue.objects.exclude(file="")
+            .values_list("file", flat=True)
+            .distinct()
+            .iterator()
+        )
+        moved = duplicates = missing = reclaimed = 0
+        seen: set[str] = set()
+
+        for name in names:
+            if queue_storage.is_blob_name(name):
+                continue
+            path = queue_storage.path(name)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                missing += 1
+                self.stderr.write(f"Missing: {name}")
+                continue
+
+            blob = queue_storage.blob_name(_sha256(path), os.path.splitext(name)[1])
+            duplicate = blob in seen or queue_storage.exists(blob)
+            seen.add(blob)
+            if duplicate:
+                duplicates += 1
+                reclaimed += size
+            else:
+                moved += 1
+            if dry_run:
+                continue
+
+            # Link (or copy) first and repoint the rows before removing the
+            # old file, so an interrupted run can simply be repeated.
+            if not duplicate:
+                blob_path = queue_storage.path(blob)
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                try:
+                    os.link(path, blob_path)
+                except OSError:
+                    shutil.copyfile(path, blob_path)
+            rows = Queue.objects.filter(file=name)
+            rows.filter(filename="").update(filename=os.path.basename(name))
+            rows.update(file=blob)
+            os.unlink(path)
+
+        verb = "Would reclaim" if dry_run else "Reclaimed"
+        self.stdout.write(
+            f"{moved} file(s) moved, {duplicates} duplicate(s) removed, "
+            f"{missing} missing. {verb} {reclaimed} bytes "
+            f"({reclaimed / 1024**2:.1f} MiB)."
+        )
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:12
+
+import os
+
+from django.db import migrations, models
+
+import apps.queue.storage
+
+
+def fill_filenames(apps, schema_editor):
+    Queue = apps.get_model("queue", "Queue")
+    for item in Queue.objects.filter(filename="").only("pk", "file").iterator():
+        item.filename = os.path.basename(item.file.name)
+        item.save(update_fields=["filename"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queue', '0007_queue_printer_arrangement_alter_queue_page_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queue',
+            name='filename',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='queue',
+            name='file',
+            field=models.FileField(db_index=True, storage=apps.queue.storage.get_queue_storage, upload_to=''),
+        ),
+        migrations.RunPython(fill_filenames, migrations.RunPython.noop),
+    ]
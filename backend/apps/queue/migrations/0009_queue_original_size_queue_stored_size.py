@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:05
+
+from django.db import migrations, models
+
+
+def fill_sizes(apps, schema_editor):
+    Queue = apps.get_model("queue", "Queue")
+    for item in Queue.objects.exclude(file="").only("pk", "file").iterator():
+        try:
+            size = item.file.size
+        except OSError:
+            continue
+        item.original_size = item.stored_size = size
+        item.save(update_fields=["original_size", "stored_size"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queue', '0008_queue_filename_alter_queue_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queue',
+            name='original_size',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='queue',
+            name='stored_size',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.RunPython(fill_sizes, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,18 @@
 from django.contrib.auth.models import User
 from django.db import models
 
+from apps.api.utils.mapped import MappedFile
 from apps.printers.models import PrinterArrangements
 
+from .storage import get_queue_storage
+
 # Create your models here.
 
 
 class Queue(models.Model):
-    file = models.FileField()
+    # Content-addressed: identical uploads share one stored file.
+    file = models.FileField(storage=get_queue_storage, db_index=True)
+    filename = models.CharField(max_length=255, blank=True)
     processed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -24,7 +29,14 @@ class Queue(models.Model):
     )
 
     page_count = models.PositiveBigIntegerField(null=True)
+    # Bytes as uploaded, and as stored after optimization (QUEUE_OPTIMIZE_PDFS).
+    original_size = models.PositiveBigIntegerField(null=True)
+    stored_size = models.PositiveBigIntegerField(null=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
     def __str__(self):
         return f"Queue {self.pk} - Processed: {self.processed}"
+
+    def open_mapped(self) -> MappedFile:
+        """The stored file mapped into memory; close it, or use it in `with`."""
+        return self.file.storage.open_mapped(self.file.name)
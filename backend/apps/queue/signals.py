@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Queue
+
+
+@receiver(post_delete, sender=Queue)
+def release_queue_file(sender, instance: Queue, **kwargs):
+    """
+    Delete the stored file once no queue item refers to it. Identical
+    uploads share one file, so it outlives all but the last of them.
+    """
+    name = instance.file.name
+    if not name:
+        return
+
+    def release():
+        if not Queue.objects.filter(file=name).exists():
+            instance.file.storage.delete(name)
+
+    transaction.on_commit(release)
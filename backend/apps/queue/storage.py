@@ -0,0 +1,77 @@
+import hashlib
+import os
+import re
+import uuid
+from typing import Optional
+
+from django.core.files.storage import FileSystemStorage
+
+from apps.api.utils.mapped import MappedFile, map_file
+
+_BLOB_NAME = re.compile(r"[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$")
+
+
+def file_sha256(content) -> str:
+    """SHA-256 of a File, from the path of a spooled upload when it has one."""
+    if hasattr(content, "temporary_file_path"):
+        with open(content.temporary_file_path(), "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each distinct file once, under a name derived from its SHA-256
+    and sharded two levels deep: `<prefix>/ab/cd/abcd....pdf`. Saving content
+    that is already stored returns the existing name without writing.
+
+    Blobs are shared, so callers must only delete one when nothing refers to
+    it any more (see apps.queue.signals). Names saved before this storage was
+    used keep resolving, since the root directory is the same.
+    """
+
+    def __init__(self, prefix: str = "", **kwargs):
+        self.prefix = prefix
+        super().__init__(**kwargs)
+
+    def blob_name(self, digest: str, extension: str = "") -> str:
+        name = f"{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}"
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def is_blob_name(self, name: str) -> bool:
+        if self.prefix:
+            if not name.startswith(self.prefix + "/"):
+                return False
+            name = name[len(self.prefix) + 1 :]
+        return bool(_BLOB_NAME.match(name))
+
+    def save(self, name: Optional[str], content, max_length: Optional[int] = None):
+        # Uploads spooled by HashingTemporaryFileUploadHandler carry their digest.
+        digest = getattr(content, "sha256", None) or file_sha256(content)
+        blob = self.blob_name(digest, os.path.splitext(name or "")[1])
+        if self.exists(blob):
+            return blob
+
+        # Write beside the blob and rename it into place, so that concurrent
+        # saves of the same content cannot leave a partial file behind.
+        partial = super()._save(f"{blob}.{uuid.uuid4().hex}.part", content)
+        os.replace(self.path(partial), self.path(blob))
+        return blob
+
+    def open_mapped(self, name: str) -> MappedFile:
+        """
+        A stored file mapped into memory, which the PDF utilities accept in
+        place of bytes or a path. Blobs are never rewritten, and one deleted
+        while mapped stays readable until the mapping is closed.
+        """
+        return map_file(self.path(name))
+
+
+def get_queue_storage() -> ContentAddressedStorage:
+    return queue_storage
+
+
+queue_storage = ContentAddressedStorage(prefix="queue")
@@ -1,2 +1,170 @@
+from unittest import mock
 
-# Create your tests here.
+import fitz
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from pypdf import PdfReader
+
+from apps.api.models import Token
+from apps.api.tests import (
+    CacheIsolationMixin,
+    labelled_pdf,
+    make_pdf,
+    page_labels,
+)
+from apps.api.utils.executor import _reset_cpu_executor
+from apps.printers.models import PrinterArrangements
+
+from .models import Queue
+from .storage import queue_storage
+
+
+def _uncompressed(data: bytes) -> bytes:
+    """`data` rewritten with every stream inflated, as some exporters do."""
+    doc = fitz.open("pdf", data)
+    try:
+        return doc.tobytes(expand=255)
+    finally:
+        doc.close()
+
+
+class QueueUploadTests(CacheIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(_reset_cpu_executor)
+        self.user = User.objects.create_user("alice")
+        self.token = Token.objects.create(user=self.user).token
+        self.printer_arrangement = PrinterArrangements.objects.create()
+
+    def upload(self, files: list[tuple[str, bytes]]):
+        return self.client.post(
+            "/api/queue/",
+            {
+                "files": [SimpleUploadedFile(name, data) for name, data in files],
+                "printer_arrangement": self.printer_arrangement.pk,
+            },
+            headers={"Authorization": f"Bearer {self.token}"},
+        )
+
+    def test_queues_and_counts(self):
+        response = self.upload([("a.pdf", make_pdf(3)), ("b.pdf", make_pdf(5))])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total_pages"], 8)
+        self.assertEqual(
+            sorted(Queue.objects.values_list("filename", "page_count")),
+            [("a.pdf", 3), ("b.pdf", 5)],
+        )
+
+    def test_stores_optimized_pdf(self):
+        bloated = _uncompressed(make_pdf(6))
+        compact = make_pdf(3)
+        with self.settings(QUEUE_OPTIMIZE_PDFS=True):
+            response = self.upload([("bloated.pdf", bloated), ("compact.pdf", compact)])
+        self.assertEqual(response.status_code, 200)
+
+        item = Queue.objects.get(filename="bloated.pdf")
+        self.assertEqual(item.original_size, len(bloated))
+        self.assertLess(item.stored_size, len(bloated) * 0.8)
+        self.assertEqual(item.file.size, item.stored_size)
+        with item.file.open("rb") as f:
+            self.assertEqual(PdfReader(f).get_num_pages(), 6)
+
+        # Identical uploads still share the stored file once optimized.
+        with self.settings(QUEUE_OPTIMIZE_PDFS=True):
+            self.upload([("copy.pdf", bloated)])
+        self.assertEqual(
+            Queue.objects.get(filename="copy.pdf").file.name, item.file.name
+        )
+
+    def test_optimization_disabled(self):
+        bloated = _uncompressed(make_pdf(2))
+        with self.settings(QUEUE_OPTIMIZE_PDFS=False):
+            self.upload([("bloated.pdf", bloated)])
+        item = Queue.objects.get()
+        self.assertEqual((item.original_size, item.stored_size), (len(bloated),) * 2)
+
+    def test_reports_every_rejected_file(self):
+        response = self.upload(
+            [
+                ("a.pdf", make_pdf(3)),
+                ("notes.txt", b"not a pdf"),
+                ("empty.pdf", b""),
+                ("corrupt.pdf", b"junk" * 1000),
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [error["file"] for error in response.json()["errors"]],
+            ["notes.txt", "empty.pdf", "corrupt.pdf"],
+        )
+        self.assertFalse(Queue.objects.exists())
+
+
+class QueueStorageTests(CacheIsolationMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("alice")
+
+    def queue(self, name: str, data: bytes) -> Queue:
+        return Queue.objects.create(
+            file=SimpleUploadedFile(name, data), filename=name, user=self.user
+        )
+
+    def test_identical_files_stored_once(self):
+        data = make_pdf(2)
+        first = self.queue("a.pdf", data)
+        second = self.queue("copy of a.pdf", data)
+        other = self.queue("b.pdf", make_pdf(3))
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertNotEqual(first.file.name, other.file.name)
+        self.assertTrue(queue_storage.is_blob_name(first.file.name))
+        with queue_storage.open(first.file.name) as f:
+            self.assertEqual(f.read(), data)
+
+    def test_file_deleted_with_its_last_item(self):
+        data = make_pdf(2)
+        first = self.queue("a.pdf", data)
+        second = self.queue("copy of a.pdf", data)
+        name = first.file.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(queue_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(queue_storage.exists(name))
+
+    async def test_merge_reads_mapped_files(self):
+        first = await Queue.objects.acreate(
+            file=SimpleUploadedFile("a.pdf", labelled_pdf("a1", "a2")),
+            filename="a.pdf",
+            user=self.user,
+        )
+        second = await Queue.objects.acreate(
+            file=SimpleUploadedFile("b.pdf", labelled_pdf("b1")),
+            filename="b.pdf",
+            user=self.user,
+        )
+        token = await Token.objects.acreate(user=self.user)
+
+        with mock.patch.object(
+            Queue, "open_mapped", autospec=True, side_effect=Queue.open_mapped
+        ) as open_mapped:
+            response = await self.async_client.post(
+                "/api/convert/merge/",
+                {
+                    "queue_ids": [second.pk, first.pk],
+                    "files": SimpleUploadedFile("c.pdf", labelled_pdf("c1")),
+                },
+                headers={"Authorization": f"Bearer {token.token}"},
+            )
+        self.assertEqual(response.status_code, 200)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(page_labels(content), ["b1", "a1", "a2", "c1"])
+        self.assertEqual(
+            [call.args[0].pk for call in open_mapped.call_args_list],
+            [second.pk, first.pk],
+        )
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -50,6 +51,7 @@ INSTALLED_APPS = [
     "apps.wallet",
     "apps.queue",
     "apps.printers",
+    "apps.jobs",
 ]
 APPEND_SLASH = False
 CORS_ALLOW_ALL_ORIGINS = True  # CORS
@@ -150,4 +152,100 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# Spool every upload to disk and hash it while it is received, so views
+# work from a file path instead of holding the PDF in memory.
+FILE_UPLOAD_HANDLERS = ["apps.api.uploadhandlers.HashingTemporaryFileUploadHandler"]
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+
+# PDF page analysis
+# Backend is "process", "thread" or "auto" (threads on free-threaded builds).
+PDF_ANALYSIS_BACKEND = os.environ.get("PDF_ANALYSIS_BACKEND", "auto")
+PDF_ANALYSIS_WORKERS = int(os.environ.get("PDF_ANALYSIS_WORKERS", os.cpu_count() or 1))
+PDF_ANALYSIS_CHUNK_SIZE = int(os.environ.get("PDF_ANALYSIS_CHUNK_SIZE", "16"))
+# Async views run CPU-bound PDF work on a pool of PDF_CPU_WORKERS processes;
+# each shards a large document over its share of PDF_ANALYSIS_WORKERS.
+PDF_CPU_WORKERS = int(os.environ.get("PDF_CPU_WORKERS", "2"))
+# "structure" reads colors from the content stream and renders only ambiguous
+# pages; "render" rasterizes every page.
+PDF_COLOR_DETECTION = os.environ.get("PDF_COLOR_DETECTION", "structure")
+# Pages are rendered to a bounded number of pixels regardless of their size:
+# a thumbnail first, then the next budget only if the result is within
+# PDF_RENDER_SATURATION_MARGIN of the color tolerance.
+PDF_RENDER_PIXEL_BUDGETS = (40_000, 1_000_000)
+PDF_RENDER_SATURATION_MARGIN = 16
+
+# Content-addressed cache for page counts, page maps and generated PDFs.
+# A size of 0 disables that tier.
+PDF_CACHE_DIR = os.path.join(MEDIA_ROOT, "analysis-cache")
+PDF_CACHE_MEMORY_BYTES = int(os.environ.get("PDF_CACHE_MEMORY_BYTES", 64 * 1024**2))
+PDF_CACHE_DISK_BYTES = int(os.environ.get("PDF_CACHE_DISK_BYTES", 1024**3))
+
+# Cache and converter counters, shared by every process (web, CPU pool, jobs).
+PDF_STATS_DIR = os.path.join(MEDIA_ROOT, "stats")
+
+# Converted PDFs from /convert/pdf, keyed by input digest and converter version.
+PDF_CONVERSION_CACHE_DIR = os.path.join(MEDIA_ROOT, "conversion-cache")
+PDF_CONVERSION_CACHE_MEMORY_BYTES = int(
+    os.environ.get("PDF_CONVERSION_CACHE_MEMORY_BYTES", 32 * 1024**2)
+)
+PDF_CONVERSION_CACHE_DISK_BYTES = int(
+    os.environ.get("PDF_CONVERSION_CACHE_DISK_BYTES", 2 * 1024**3)
+)
+
+# LibreOffice conversion pool: long-lived headless instances, each with its own
+# profile, driven by apps/api/utils/uno_bridge.py under the system Python that
+# has the UNO bindings. A pool size of 0 runs one soffice process per request.
+LIBREOFFICE_POOL_SIZE = int(os.environ.get("LIBREOFFICE_POOL_SIZE", "2"))
+LIBREOFFICE_PYTHON = os.environ.get("LIBREOFFICE_PYTHON", "/usr/bin/python3")
+LIBREOFFICE_PROFILE_DIR = os.environ.get(
+    "LIBREOFFICE_PROFILE_DIR",
+    os.path.join(tempfile.gettempdir(), "printing-press-office"),
+)
+# Requests allowed to wait for a worker beyond the pool size, and for how long.
+LIBREOFFICE_QUEUE_SIZE = int(os.environ.get("LIBREOFFICE_QUEUE_SIZE", "16"))
+LIBREOFFICE_QUEUE_TIMEOUT = 30
+LIBREOFFICE_STARTUP_TIMEOUT = 60
+LIBREOFFICE_CONVERSION_TIMEOUT = 120
+# Restart a worker after this many conversions, and ping it before use when
+# it has been idle for longer than LIBREOFFICE_HEALTH_INTERVAL seconds.
+LIBREOFFICE_MAX_CONVERSIONS = int(os.environ.get("LIBREOFFICE_MAX_CONVERSIONS", "200"))
+LIBREOFFICE_HEALTH_INTERVAL = 60
+# Resource limits for converter processes (0 disables one), set through
+# prlimit(1) before they start. CPU seconds are per conversion: a pool
+# worker's limit is moved up before each one.
+LIBREOFFICE_RLIMIT_CPU_SECONDS = int(
+    os.environ.get("LIBREOFFICE_RLIMIT_CPU_SECONDS", "120")
+)
+LIBREOFFICE_RLIMIT_AS_BYTES = int(
+    os.environ.get("LIBREOFFICE_RLIMIT_AS_BYTES", 4 * 1024**3)
+)
+LIBREOFFICE_RLIMIT_NOFILE = int(os.environ.get("LIBREOFFICE_RLIMIT_NOFILE", "1024"))
+
+# /convert/pdf/batch: files per request, and conversions run at once (by
+# default one per LibreOffice worker).
+PDF_CONVERT_BATCH_MAX_FILES = int(os.environ.get("PDF_CONVERT_BATCH_MAX_FILES", "100"))
+PDF_CONVERT_BATCH_WORKERS = int(
+    os.environ.get("PDF_CONVERT_BATCH_WORKERS", max(1, LIBREOFFICE_POOL_SIZE))
+)
+
+# /convert/merge: uploads plus queue items per request.
+PDF_MERGE_MAX_FILES = int(os.environ.get("PDF_MERGE_MAX_FILES", "100"))
+
+# Queued PDFs are rewritten on upload (see apps.api.utils.pdf.optimize_pdf) and
+# stored that way when it makes them smaller. Object streams shrink files with
+# many small objects much further, but need PDF 1.5 support from the printer.
+QUEUE_OPTIMIZE_PDFS = os.environ.get("QUEUE_OPTIMIZE_PDFS", "1") == "1"
+QUEUE_PDF_OBJECT_STREAMS = os.environ.get("QUEUE_PDF_OBJECT_STREAMS", "0") == "1"
+
+# Background jobs (`async=true`), run by `manage.py run_jobs`. Workers record
+# a heartbeat every JOBS_HEARTBEAT_INTERVAL seconds while running a job; one
+# without a heartbeat for JOBS_STALE_AFTER seconds is taken to have died and
+# its job is retried, up to JOBS_MAX_ATTEMPTS times. Finished jobs are
+# deleted after JOBS_RESULT_TTL.
+JOBS_POLL_INTERVAL = float(os.environ.get("JOBS_POLL_INTERVAL", "1"))
+JOBS_HEARTBEAT_INTERVAL = float(os.environ.get("JOBS_HEARTBEAT_INTERVAL", "30"))
+JOBS_STALE_AFTER = int(os.environ.get("JOBS_STALE_AFTER", "300"))
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RESULT_TTL = int(os.environ.get("JOBS_RESULT_TTL", "86400"))
+JOBS_MAINTENANCE_INTERVAL = 60
@@ -0,0 +1,75 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+Run them from the backend directory, e.g.:
+    python scripts/benchmarks/color_detection.py
+"""
+
+import os
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+import fitz
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+
+def make_pdf(page_count: int = 50) -> bytes:
+    """Generate a mixed document: text, color text, blank and drawing pages."""
+    doc = fitz.open()
+    try:
+        for i in range(page_count):
+            page = doc.new_page()
+            kind = i % 5
+            if kind == 0:
+                page.insert_text((72, 72), "Grayscale paragraph " * 4)
+            elif kind == 1:
+                page.insert_text((72, 72), "Colored heading", color=(0.8, 0.1, 0.1))
+            elif kind == 2:
+                pass
+            elif kind == 3:
+                page.draw_rect(
+                    fitz.Rect(72, 72, 400, 400), color=(0, 0, 1), fill=(0, 1, 0)
+                )
+            else:
+                page.draw_rect(fitz.Rect(72, 72, 400, 400), fill=(0.3, 0.3, 0.3))
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def make_image_pdf(page_count: int) -> bytes:
+    """A page of distinct noise per page, alternating color and grayscale."""
+    rng = np.random.default_rng(0)
+    doc = fitz.open()
+    try:
+        for i in range(page_count):
+            shape = (256, 256, 3) if i % 2 else (256, 256)
+            image = Image.fromarray(rng.integers(0, 256, shape, dtype=np.uint8))
+            buffer = BytesIO()
+            image.save(buffer, "JPEG", quality=80)
+            page = doc.new_page()
+            page.insert_image(fitz.Rect(72, 72, 72 + 256, 72 + 256), stream=buffer)
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def timeit(func, repeat: int = 5) -> float:
+    """Best wall-clock time of `repeat` runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
@@ -0,0 +1,151 @@
+"""
+Concurrent request throughput: a batch of heavy split requests while one
+client polls the balance for as long as they run, through Django's ASGI request path. Runs
+against the async views and against sync copies of them (how they were
+served before: one thread for all sync views). Uses a throwaway test database.
+
+    python scripts/benchmarks/async_throughput.py [splits] [pages]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from _common import make_pdf
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import FileResponse
+from django.test import AsyncClient
+from django.urls import include, path
+from ninja import File, NinjaAPI, UploadedFile
+
+from apps.api.auth import AuthBearer
+from apps.api.utils.pdf import split_pdf_into_colored_pages
+from apps.api.utils.uploads import spooled_source
+
+sync_api = NinjaAPI(urls_namespace="benchmark-sync")
+
+
+@sync_api.get("/balance", auth=AuthBearer())
+def sync_balance(request):
+    from apps.wallet.models import Wallet
+
+    return {"balance": str(Wallet.objects.get(user=request.auth).balance)}
+
+
+@sync_api.post("/split")
+def sync_split(request, file: File[UploadedFile]):
+    source, digest = spooled_source(file)
+    return FileResponse(
+        split_pdf_into_colored_pages(source, digest=digest).open(),
+        content_type="application/pdf",
+    )
+
+
+urlpatterns = [
+    path("api/", include("apps.api.urls")),
+    path("sync/", sync_api.urls),
+]
+
+VARIANTS = {
+    "sync": ("/sync/split", "/sync/balance"),
+    "async": ("/api/split/pdf_colors/color", "/api/user/balance/"),
+}
+
+
+def _create_user() -> str:
+    from django.contrib.auth.models import User
+
+    from apps.api.models import Token
+    from apps.wallet.models import Wallet
+
+    user = User.objects.create_user("benchmark", password="benchmark")
+    Wallet.objects.create(user=user, balance=100)
+    return Token.objects.create(user=user).token
+
+
+async def _timed(request) -> float:
+    start = time.perf_counter()
+    response = await request
+    assert response.status_code == 200, response.status_code
+    return time.perf_counter() - start
+
+
+async def _poll(client: AsyncClient, url: str, headers: dict, done: asyncio.Event):
+    """One client issuing light requests back to back until `done` is set."""
+    timings = []
+    while not done.is_set():
+        timings.append(await _timed(client.get(url, headers=headers)))
+    return timings
+
+
+async def run(variant: str, documents: list[bytes], warmup: bytes, token: str):
+    split_url, balance_url = VARIANTS[variant]
+    client = AsyncClient()
+    headers = {"Authorization": f"Bearer {token}"}
+    done = asyncio.Event()
+
+    # Warm up: starts the CPU pool and opens the database connection.
+    await _timed(client.post(split_url, {"file": SimpleUploadedFile("a.pdf", warmup)}))
+    await _timed(client.get(balance_url, headers=headers))
+
+    async def splits():
+        try:
+            return await asyncio.gather(
+                *(
+                    _timed(
+                        client.post(
+                            split_url, {"file": SimpleUploadedFile("a.pdf", data)}
+                        )
+                    )
+                    for data in documents
+                )
+            )
+        finally:
+            done.set()
+
+    start = time.perf_counter()
+    _, light_timings = await asyncio.gather(
+        splits(), _poll(client, balance_url, headers, done)
+    )
+    wall = time.perf_counter() - start
+
+    light_ms = sorted(t * 1000 for t in light_timings)
+    p95 = light_ms[min(len(light_ms) - 1, int(len(light_ms) * 0.95))]
+    print(
+        f"{variant:<6} {wall:>8.2f} {len(documents) / wall:>9.2f}"
+        f" {len(light_ms):>7} {statistics.median(light_ms):>9.1f} {p95:>9.1f}"
+    )
+
+
+def main():
+    heavy = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    page_count = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    settings.ROOT_URLCONF = __name__
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        token = _create_user()
+        base = make_pdf(page_count)
+        print(
+            f"{heavy} concurrent splits of {page_count} pages while one client"
+            " polls the balance"
+        )
+        print(
+            f"{'views':<6} {'wall s':>8} {'splits/s':>9} {'polls':>7}"
+            f" {'p50 ms':>9} {'p95 ms':>9}"
+        )
+        for variant in VARIANTS:
+            # Distinct trailing comments keep the content-addressed cache cold.
+            documents = [base + f"\n%{variant}-{i}\n".encode() for i in range(heavy)]
+            warmup = make_pdf(5) + f"\n%{variant}\n".encode()
+            asyncio.run(run(variant, documents, warmup, token))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
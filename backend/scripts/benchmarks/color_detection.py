@@ -0,0 +1,45 @@
+"""
+Micro-benchmark: NumPy color detection vs. the previous Pillow HSV path.
+
+    python scripts/benchmarks/color_detection.py [pages] [dpi]
+"""
+
+import sys
+
+import pypdfium2 as pdfium
+from _common import make_pdf, timeit
+
+from apps.api.utils.pdf import _is_color_bitmap
+
+
+def _is_color_page_pillow(pil_img, tolerance: int = 5) -> bool:
+    """The original per-pixel Pillow implementation, kept for comparison."""
+    if pil_img.mode in ("L", "1"):
+        return False
+    hsv = pil_img.convert("HSV")
+    _, s, _ = hsv.split()
+    return max(s.getdata()) > tolerance
+
+
+def main():
+    page_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    dpi = int(sys.argv[2]) if len(sys.argv) > 2 else 75
+
+    doc = pdfium.PdfDocument(make_pdf(page_count))
+    bitmaps = [doc[i].render(scale=dpi / 72.0) for i in range(len(doc))]
+
+    pillow = [_is_color_page_pillow(b.to_pil()) for b in bitmaps]
+    numpy = [_is_color_bitmap(b) for b in bitmaps]
+    assert pillow == numpy, "NumPy and Pillow detectors disagree"
+
+    pillow_ms = timeit(lambda: [_is_color_page_pillow(b.to_pil()) for b in bitmaps])
+    numpy_ms = timeit(lambda: [_is_color_bitmap(b) for b in bitmaps])
+
+    print(f"{page_count} pages @ {dpi} dpi")
+    print(f"  pillow: {pillow_ms:8.1f} ms  ({pillow_ms / page_count:.2f} ms/page)")
+    print(f"  numpy:  {numpy_ms:8.1f} ms  ({numpy_ms / page_count:.2f} ms/page)")
+    print(f"  speedup: {pillow_ms / numpy_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
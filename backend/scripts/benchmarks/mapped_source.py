@@ -0,0 +1,99 @@
+"""
+Memory of several worker processes analyzing the same stored PDF at once,
+given the file read into bytes against the file mapped with
+ContentAddressedStorage.open_mapped. For each process, "private" is the
+memory it holds alone. "pss" also counts its share of the pages it shares
+with the other processes. Both are measured from just before the source is
+loaded (Linux only: they are read from /proc).
+
+    python scripts/benchmarks/mapped_source.py [pages] [workers]
+"""
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from _common import BACKEND_DIR, make_image_pdf
+from django.conf import settings
+
+from apps.api.utils.mapped import map_file
+from apps.api.utils.pdf import classify_pages, count_pdf_pages
+
+
+def _memory_mb() -> tuple[float, float]:
+    with open("/proc/self/smaps_rollup") as f:
+        status = f.read()
+    kb = {
+        key: int(re.search(rf"^{key}:\s+(\d+)", status, re.M).group(1))
+        for key in ("Private_Clean", "Private_Dirty", "Pss")
+    }
+    return (kb["Private_Clean"] + kb["Private_Dirty"]) / 1024, kb["Pss"] / 1024
+
+
+def measure(variant: str, document: str):
+    """
+    Analyze `document` in this process, then report once told to on stdin (when
+    every process has loaded it), and hold until stdin closes.
+    """
+    settings.PDF_CACHE_MEMORY_BYTES = 0
+    settings.PDF_CACHE_DISK_BYTES = 0
+    settings.PDF_ANALYSIS_WORKERS = 1
+
+    private, pss = _memory_mb()
+    source = Path(document).read_bytes() if variant == "bytes" else map_file(document)
+    count_pdf_pages(source)
+    classify_pages(source, blank=True)
+    print("ready", flush=True)
+    sys.stdin.readline()
+    after_private, after_pss = _memory_mb()
+    print(f"{after_private - private:.1f} {after_pss - pss:.1f}", flush=True)
+    # Stay alive, so that the other processes' shares are counted alongside.
+    sys.stdin.read()
+
+
+def main():
+    if sys.argv[1:2] == ["--variant"]:
+        measure(sys.argv[2], sys.argv[3])
+        return
+
+    page_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as document:
+        data = make_image_pdf(page_count)
+        document.write(data)
+        document.flush()
+        os.sync()
+        print(f"{page_count} pages, {len(data) / 1024**2:.1f} MiB, {workers} workers")
+        print(f"{'source':<8} {'private MiB':>12} {'pss MiB':>9}  (all workers)")
+        for variant in ("bytes", "mapped"):
+            processes = [
+                subprocess.Popen(
+                    [sys.executable, __file__, "--variant", variant, document.name],
+                    cwd=BACKEND_DIR,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    text=True,
+                )
+                for _ in range(workers)
+            ]
+            for process in processes:
+                # Skip anything printed on import, such as PyMuPDF's notices.
+                while process.stdout.readline().strip() != "ready":
+                    pass
+            for process in processes:
+                process.stdin.write("\n")
+                process.stdin.flush()
+            rows = [process.stdout.readline().split() for process in processes]
+            for process in processes:
+                process.stdin.close()
+                process.wait()
+            private = sum(float(row[0]) for row in rows)
+            pss = sum(float(row[1]) for row in rows)
+            print(f"{variant:<8} {private:>12.1f} {pss:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
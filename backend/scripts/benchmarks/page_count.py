@@ -0,0 +1,102 @@
+"""
+Page counting: xref fast path vs. pypdf, on a corpus of differently
+structured files (classic xref, xref/object streams, incremental updates,
+pypdf output, encrypted). Checks both agree before timing.
+
+    python scripts/benchmarks/page_count.py [pages]
+"""
+
+import sys
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+import fitz
+from _common import make_pdf, timeit
+from pypdf import PdfReader, PdfWriter
+
+from apps.api.utils.xref import XrefError, fast_page_count
+
+
+def _resave(data: bytes, **options) -> bytes:
+    doc = fitz.open("pdf", data)
+    try:
+        return doc.tobytes(**options)
+    finally:
+        doc.close()
+
+
+def _incremental(data: bytes) -> bytes:
+    """Append two pages as an incremental update (adds a /Prev section)."""
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+        f.write(data)
+        f.flush()
+        doc = fitz.open(f.name)
+        try:
+            doc.new_page()
+            doc.new_page()
+            doc.saveIncr()
+        finally:
+            doc.close()
+        return Path(f.name).read_bytes()
+
+
+def _pypdf(data: bytes, encrypt: bool = False) -> bytes:
+    writer = PdfWriter(clone_from=BytesIO(data))
+    if encrypt:
+        writer.encrypt("", algorithm="RC4-128")
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def corpus(page_count: int) -> dict[str, bytes]:
+    base = make_pdf(page_count)
+    return {
+        "classic xref": base,
+        "garbage-collected": _resave(base, garbage=4),
+        "object streams": _resave(base, garbage=3, use_objstms=1),
+        "incremental update": _incremental(base),
+        "incremental + objstm": _incremental(_resave(base, use_objstms=1)),
+        "pypdf writer": _pypdf(base),
+        "encrypted": _pypdf(base, encrypt=True),
+    }
+
+
+def pypdf_count(data: bytes) -> int:
+    reader = PdfReader(BytesIO(data))
+    if reader.is_encrypted:
+        reader.decrypt("")
+    return len(reader.pages)
+
+
+def fast_count(data: bytes):
+    try:
+        return fast_page_count(data)
+    except XrefError:
+        return None
+
+
+def main():
+    page_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    print(f"{'file':<22} {'pages':>6} {'pypdf ms':>10} {'xref ms':>10} {'speedup':>8}")
+    for name, data in corpus(page_count).items():
+        expected = pypdf_count(data)
+        fast = fast_count(data)
+        if fast is not None:
+            assert fast == expected, f"{name}: xref says {fast}, pypdf {expected}"
+
+        pypdf_ms = timeit(lambda: pypdf_count(data))
+        if fast is None:
+            print(f"{name:<22} {expected:>6} {pypdf_ms:>10.2f} {'fallback':>10}")
+            continue
+        fast_ms = timeit(lambda: fast_count(data))
+        print(
+            f"{name:<22} {expected:>6} {pypdf_ms:>10.2f} {fast_ms:>10.3f}"
+            f" {pypdf_ms / fast_ms:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
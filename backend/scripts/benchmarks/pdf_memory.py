@@ -0,0 +1,101 @@
+"""
+Per-request memory of the endpoints that return generated files, on a large
+image-heavy document. Each case runs in a fresh process with a cold cache and
+reports how far the request raised the peak RSS of the web process (the CPU
+pool workers that build the output are reported separately), with the body
+read chunk by chunk as a client would and, for comparison, collected in
+memory the way the old HttpResponse bodies were. The web figure includes
+the test client's in-memory copy of the upload.
+
+    python scripts/benchmarks/pdf_memory.py [pages]
+"""
+
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from _common import BACKEND_DIR, make_image_pdf
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
+from django.urls import include, path
+
+from apps.api.utils.executor import get_cpu_executor
+
+urlpatterns = [path("api/", include("apps.api.urls"))]
+
+CASES = {
+    "split color": ("/api/split/pdf_colors/color", {}),
+    "split both": ("/api/split/pdf_colors/both", {}),
+    "nonblank": ("/api/convert/nonblank/", {"return_pdf": "true"}),
+    "convert": ("/api/convert/pdf/", {}),
+}
+
+
+def _peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def measure(case: str, mode: str, document: Path):
+    """Run one case in this process and print its row."""
+    settings.ROOT_URLCONF = __name__
+    url, data = CASES[case]
+    client = Client()
+
+    # Warm up imports, the CPU pool and the database connection.
+    client.post(
+        "/api/convert/nonblank/",
+        {"file": SimpleUploadedFile("w.pdf", make_image_pdf(2))},
+    )
+    baseline = _peak_rss_mb()
+
+    upload = SimpleUploadedFile("a.pdf", document.read_bytes())
+    response = client.post(url, {"file": upload, **data})
+    assert response.status_code == 200, response.status_code
+    if mode == "buffered":
+        size = len(b"".join(response))
+    else:
+        size = sum(len(chunk) for chunk in response)
+    web = _peak_rss_mb() - baseline
+
+    get_cpu_executor().shutdown()
+    workers = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+    print(
+        f"{case:<12} {mode:<9} {size / 1024**2:>9.1f} {web:>9.1f} {workers:>11.1f}",
+        flush=True,
+    )
+
+
+def main():
+    if sys.argv[1:2] == ["--case"]:
+        _, _, case, mode, document = sys.argv
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # A cold cache per run, so every case builds its output.
+            settings.PDF_CACHE_DIR = cache_dir
+            settings.PDF_CONVERSION_CACHE_DIR = cache_dir
+            measure(case, mode, Path(document))
+        return
+
+    page_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as document:
+        data = make_image_pdf(page_count)
+        document.write(data)
+        document.flush()
+        print(f"{page_count} pages, {len(data) / 1024**2:.1f} MiB")
+        print(
+            f"{'endpoint':<12} {'body':<9} {'out MiB':>9} {'web MiB':>9}"
+            f" {'workers MiB':>11}"
+        )
+        for case in CASES:
+            for mode in ("streamed", "buffered"):
+                subprocess.run(
+                    [sys.executable, __file__, "--case", case, mode, document.name],
+                    check=True,
+                    cwd=BACKEND_DIR,
+                )
+
+
+if __name__ == "__main__":
+    main()
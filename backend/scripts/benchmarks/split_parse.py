@@ -0,0 +1,135 @@
+"""
+Split pipeline: one pdfium parse for both the page analysis and the page
+copy, against the previous pipeline that parsed the source a second time
+with pypdf to assemble the outputs. Each variant runs in a fresh process
+with the analysis cache disabled and builds color.pdf and grayscale.pdf.
+Peak RSS growth is measured from just before the split (Linux only: it resets the
+process's high-water mark through /proc).
+
+Runs on a scanned-style document of `pages` pages and a text and vector
+document ten times as long.
+
+    python scripts/benchmarks/split_parse.py [pages]
+"""
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import BACKEND_DIR, make_image_pdf, make_pdf
+from django.conf import settings
+from pypdf import PdfReader, PdfWriter
+
+from apps.api.utils.pdf import _open_pdfium, _write_pages, classify_pages
+
+
+def _pdfium_only(document: str, out_dir: str) -> float:
+    start = time.perf_counter()
+    doc = _open_pdfium(document)
+    parse = time.perf_counter() - start
+    try:
+        analysis = classify_pages(document, blank=False, doc=doc)
+        _write_pages(doc, analysis.color_pages, os.path.join(out_dir, "color.pdf"))
+        _write_pages(
+            doc, analysis.grayscale_pages, os.path.join(out_dir, "grayscale.pdf")
+        )
+    finally:
+        doc.close()
+    return parse
+
+
+def _pdfium_and_pypdf(document: str, out_dir: str) -> float:
+    start = time.perf_counter()
+    doc = _open_pdfium(document)
+    parse = time.perf_counter() - start
+    try:
+        analysis = classify_pages(document, blank=False, doc=doc)
+    finally:
+        doc.close()
+
+    start = time.perf_counter()
+    reader = PdfReader(document)
+    pages = reader.pages
+    len(pages)
+    parse += time.perf_counter() - start
+    for name, indices in (
+        ("color.pdf", analysis.color_pages),
+        ("grayscale.pdf", analysis.grayscale_pages),
+    ):
+        writer = PdfWriter()
+        for i in indices:
+            writer.add_page(pages[i])
+        writer.write(os.path.join(out_dir, name))
+    return parse
+
+
+def _reset_peak_rss():
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def _peak_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        return int(re.search(r"VmHWM:\s+(\d+)", f.read()).group(1)) / 1024
+
+
+VARIANTS = {"pdfium + pypdf": _pdfium_and_pypdf, "pdfium only": _pdfium_only}
+
+
+def measure(variant: str, document: str):
+    # Analyze in this process, without cached results, on every run.
+    settings.PDF_CACHE_MEMORY_BYTES = 0
+    settings.PDF_CACHE_DISK_BYTES = 0
+    settings.PDF_ANALYSIS_WORKERS = 1
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        _reset_peak_rss()
+        baseline = _peak_rss_mb()
+        start = time.perf_counter()
+        parse = VARIANTS[variant](document, out_dir)
+        total = time.perf_counter() - start
+        output = sum(
+            os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir)
+        )
+        peak = _peak_rss_mb() - baseline
+    print(
+        f"{variant:<15} {parse * 1000:>9.0f} {total * 1000:>9.0f}"
+        f" {peak:>9.1f} {output / 1024**2:>9.1f}",
+        flush=True,
+    )
+
+
+def main():
+    if sys.argv[1:2] == ["--variant"]:
+        measure(sys.argv[2], sys.argv[3])
+        return
+
+    page_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    documents = {
+        "scanned images": make_image_pdf(page_count),
+        # Many small objects: the shape in which a second object graph costs most.
+        "text and vector": make_pdf(page_count * 10),
+    }
+    for label, data in documents.items():
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as document:
+            document.write(data)
+            document.flush()
+            pages = page_count * (10 if label == "text and vector" else 1)
+            print(f"\n{label}: {pages} pages, {len(data) / 1024**2:.1f} MiB")
+            print(
+                f"{'pipeline':<15} {'parse ms':>9} {'total ms':>9}"
+                f" {'peak MiB':>9} {'out MiB':>9}"
+            )
+            for variant in VARIANTS:
+                subprocess.run(
+                    [sys.executable, __file__, "--variant", variant, document.name],
+                    check=True,
+                    cwd=BACKEND_DIR,
+                )
+
+
+if __name__ == "__main__":
+    main()